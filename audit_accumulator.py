@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Accumulators of audit results that use a fixed amount of memory per category
+in each process, however many problematic values the osm file has. Each
+category keeps the exact number of values added, the most frequent values
+with their frequencies (Space-Saving algorithm), and an approximate number of
+distinct values (HyperLogLog). The accumulators can be merged, without
+truncating the most frequent values of each chunk (see TopK), and converted
+to and from plain dicts, so the audit results of the chunks of a file audited
+in worker processes can be sent back and reduced.
+"""
+import base64
+import hashlib
+import math
+import pprint
+import struct
+import osm_variables as osmv
+
+def hash64(value):
+    """Get a 64 bit hash of a string, the same in every process and run"""
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return struct.unpack('>Q', hashlib.md5(value).digest()[:8])[0]
+
+class HyperLogLog(object):
+    """
+    Approximate count of distinct values, with a standard error of about
+    1.04 / sqrt(2**precision).
+    Args:
+        precision: number of bits of the hash used to select a register
+    """
+    def __init__(self, precision=osmv.AUDIT_HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        x = hash64(value)
+        i = x >> (64 - self.precision)
+        # Position of the leftmost 1 bit in the rest of the hash
+        rank = 64 - self.precision - (x & ((1 << (64 - self.precision)) - 1)).bit_length() + 1
+        if rank > self.registers[i]:
+            self.registers[i] = rank
+
+    def count(self):
+        """Get the estimated number of distinct values"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count('\x00')
+        # Use linear counting for small cardinalities
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        """Add the values of another HyperLogLog of the same precision"""
+        self.registers = bytearray(max(a, b) for a, b in 
+                                   zip(self.registers, other.registers))
+
+    def to_dict(self):
+        return {'precision': self.precision,
+                'registers': base64.b64encode(bytes(self.registers))}
+
+    @classmethod
+    def from_dict(cls, data):
+        hll = cls(data['precision'])
+        hll.registers = bytearray(base64.b64decode(data['registers']))
+        return hll
+
+class TopK(object):
+    """
+    Most frequent values and their frequencies, keeping at most k values
+    (Space-Saving algorithm). The frequencies are exact as long as no more
+    than k distinct values were added, else they may be overestimated by at
+    most the frequency of the value they replaced.
+    The values of merged TopK are all kept, with their frequencies summed,
+    so merging is associative and commutative, and the k most frequent
+    values are only selected by items. The result is the same as adding all
+    the values to one TopK as long as each merged TopK had no more than k
+    distinct values, else it is an approximation: a value frequent in the
+    whole file but never among the k most frequent values of a chunk is
+    missing, and the frequencies may be overestimated as above.
+    Args:
+        k: number of values kept
+    """
+    def __init__(self, k=osmv.AUDIT_TOP_K):
+        self.k = k
+        self.counts = {}
+
+    def add(self, value):
+        if value in self.counts or len(self.counts) < self.k:
+            self.counts[value] = self.counts.get(value, 0) + 1
+        else:
+            # Replace the least frequent value
+            least = min(self.counts, key=self.counts.get)
+            self.counts[value] = self.counts.pop(least) + 1
+
+    def sorted_counts(self):
+        """Get all the (value, frequency) pairs, most frequent first"""
+        return sorted(self.counts.items(), key=lambda x: (-x[1], x[0]))
+
+    def items(self):
+        """Get the k most frequent (value, frequency) pairs, most frequent first"""
+        return self.sorted_counts()[:self.k]
+
+    def merge(self, other):
+        """
+        Add the values of another TopK. The values are not truncated to k,
+        so the merged TopK has at most k values per TopK merged into it.
+        """
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+
+    def to_dict(self):
+        return {'k': self.k, 'counts': self.sorted_counts()}
+
+    @classmethod
+    def from_dict(cls, data):
+        top = cls(data['k'])
+        top.counts = dict((value, count) for value, count in data['counts'])
+        return top
+
+class Category(object):
+    """
+    Audit results of a category: exact count, top k values, and approximate
+    distinct count. Has the add method of a set, so the audit functions can
+    add values to it the same way.
+    """
+    def __init__(self):
+        self.count = 0
+        self.top = TopK()
+        self.distinct = HyperLogLog()
+
+    def add(self, value):
+        self.count += 1
+        self.top.add(value)
+        self.distinct.add(value)
+
+    def summary(self):
+        """Get the count, the distinct count, and the top values in a dict"""
+        return {'count': self.count,
+                'distinct': self.distinct.count(),
+                'top': self.top.items()}
+
+    def merge(self, other):
+        """Add the values of another category"""
+        self.count += other.count
+        self.top.merge(other.top)
+        self.distinct.merge(other.distinct)
+
+    def to_dict(self):
+        return {'count': self.count,
+                'top': self.top.to_dict(),
+                'distinct': self.distinct.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        category = cls()
+        category.count = data['count']
+        category.top = TopK.from_dict(data['top'])
+        category.distinct = HyperLogLog.from_dict(data['distinct'])
+        return category
+
+class AuditAccumulator(dict):
+    """
+    Dict of Category by category name, that creates a category the first time
+    it is used, like defaultdict(set).
+    """
+    def __missing__(self, key):
+        self[key] = Category()
+        return self[key]
+
+    def summary(self):
+        """Get the summary of each category in a dict"""
+        return dict((key, category.summary()) for key, category in self.items())
+
+    def merge(self, other):
+        """Add the categories of another AuditAccumulator"""
+        for key, category in other.items():
+            self[key].merge(category)
+
+    def to_dict(self):
+        return dict((key, category.to_dict()) for key, category in self.items())
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls((key, Category.from_dict(c)) for key, c in data.items())
+
+class Audit(object):
+    """
+    Audit results of one kind of tag value, kept in an AuditAccumulator for 
+    each group of problems. Each instance has its own results, so audits can
+    run in worker processes, and their results can be merged.
+    Subclasses set the groups and implement audit(value), that audits a tag
+    value.
+    """
+    groups = ()
+
+    def __init__(self):
+        self.results = dict((group, AuditAccumulator()) for group in self.groups)
+
+    def display(self):
+        """Display the summary of the results of each group"""
+        for group in self.groups:
+            print "Problematic {}:".format(group)
+            pprint.pprint(self.results[group].summary())
+
+    def merge(self, other):
+        """
+        Add the results of another audit of the same class. Merging is 
+        associative, so the results of the chunks of a file can be reduced in
+        any grouping. The counts are exact, the distinct counts and the most
+        frequent values are approximations (see HyperLogLog and TopK).
+        Returns:
+            this audit
+        """
+        for group in self.groups:
+            self.results[group].merge(other.results[group])
+        return self
+
+    def to_dict(self):
+        """Convert the results to a dict of lists, strings and numbers"""
+        return dict((group, self.results[group].to_dict()) for group in self.groups)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create an audit from the results converted by to_dict"""
+        audit = cls()
+        for group in cls.groups:
+            audit.results[group] = AuditAccumulator.from_dict(data[group])
+        return audit
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Audit and clean street names, city names, and zip codes in a single pass over
+the osm file. The file is parsed once and each tag is sent to every registered
+auditor (or cleaner) of its key. Display each auditor's result, the time each
+auditor takes, and the time it takes to process the file. The chunks of the
+file can also be audited in a pool of processes, and the results of the chunks
+merged into the same report.
+"""
+import multiprocessing
+import time
+from collections import defaultdict
+import osm_variables as osmv
+import osm_functions as osmf
+import clean_cache
+import osm_stats
+import audit_city_name
+import audit_postcode
+import audit_street_name
+import clean_city_name
+import clean_postcode
+import clean_street_name
+
+class Auditor(object):
+    """
+    An auditor or a cleaner that is registered to the engine.
+    Args:
+        name: auditor name, displayed in the report
+        key: tag key the auditor is registered for (e.g. addr:street)
+        results: Audit object that keeps the auditor results
+        process: function that takes a tag value, results.audit if None
+    """
+    def __init__(self, name, key, results, process=None):
+        self.name = name
+        self.key = key
+        self.results = results
+        self.process = process or results.audit
+        self.count = 0
+        self.elapsed = 0.0
+        # Function that created the auditor, set by AuditEngine.add
+        self.factory = None
+
+    def display(self):
+        self.results.display()
+
+    def merge(self, results, count, elapsed):
+        """
+        Add the results of the same auditor run on another chunk of the file.
+        Args:
+            results: results converted by Audit.to_dict
+            count: number of values processed
+            elapsed: time the auditor took
+        """
+        self.results.merge(self.results.from_dict(results))
+        self.count += count
+        self.elapsed += elapsed
+
+class AuditEngine(object):
+    """
+    Send tag values to every auditor registered to the tag key, reading the
+    osm file only once.
+    """
+    def __init__(self):
+        self.auditors = []
+        self.routes = defaultdict(list)
+        self.elapsed = 0.0
+        # Time spent processing the file, summed over the worker processes
+        # of run_chunks
+        self.process_time = 0.0
+        self.processes = 1
+
+    def add(self, factory):
+        """
+        Create an auditor and register it to the engine. The auditors added
+        this way can be created again in worker processes, see run_chunks.
+        Args:
+            factory: function that creates the auditor
+        Returns:
+            the registered auditor
+        """
+        auditor = self.register(factory())
+        auditor.factory = factory
+        return auditor
+
+    def register(self, auditor):
+        """
+        Register an auditor to the engine.
+        Args:
+            auditor: Auditor object
+        Returns:
+            the registered auditor
+        """
+        self.auditors.append(auditor)
+        self.routes[auditor.key].append(auditor)
+        return auditor
+
+    def run(self, osm_file):
+        """
+        Send each tag value in the osm file to the auditors registered to the
+        tag key, and keep the time each auditor takes.
+        Args:
+            osm_file: osm file path or file object
+        """
+        routes = self.routes
+        timer = time.time
+        start = timer()
+        for key, value in self.get_tags(osm_file):
+            for auditor in routes[key]:
+                t = timer()
+                auditor.process(value)
+                auditor.elapsed += timer() - t
+                auditor.count += 1
+        self.elapsed = timer() - start
+        self.process_time = self.elapsed
+        self.processes = 1
+
+    def run_chunks(self, osm_file, processes):
+        """
+        Split the osm file into chunks, audit the chunks in a pool of 
+        processes, and merge the results of the chunks into the auditors of
+        the engine. The auditors must have been added with add.
+        Args:
+            osm_file: osm file path of an uncompressed osm file
+            processes: number of processes
+        """
+        factories = [auditor.factory for auditor in self.auditors]
+        if None in factories:
+            raise ValueError("Auditors registered without a factory cannot "
+                             "run in worker processes")
+        start = time.time()
+        tasks = [(osm_file, chunk_start, chunk_end, factories)
+                 for chunk_start, chunk_end in osmf.get_chunks(osm_file, processes * 4)]
+        self.process_time = 0.0
+        self.processes = processes
+        pool = multiprocessing.Pool(processes)
+        try:
+            for results, elapsed, collected, stats in pool.imap(run_chunk, tasks):
+                for auditor, (r, count, auditor_elapsed) in zip(self.auditors, results):
+                    auditor.merge(r, count, auditor_elapsed)
+                self.process_time += elapsed
+                clean_cache.merge(collected)
+                osm_stats.merge(stats)
+        finally:
+            pool.close()
+            pool.join()
+        self.elapsed = time.time() - start
+
+    def get_tags(self, osm_file):
+        """
+        Yield the key and the value of each tag in the osm file that has
+        registered auditors. Use the tag scanner if osmv.USE_TAG_SCANNER is
+        set, else parse the elements.
+        Args:
+            osm_file: osm file path
+        """
+        if osmv.USE_TAG_SCANNER:
+            for _, _, k, v in osmf.get_tags(osm_file, self.routes.__contains__):
+                yield k, v
+        else:
+            for elem in osmf.get_element(osm_file):
+                for tag in elem.iter("tag"):
+                    if tag.attrib['k'] in self.routes:
+                        yield tag.attrib['k'], tag.attrib['v']
+
+    def display(self):
+        """
+        Display the result and the time each auditor takes, and the total
+        time it takes to process the file. After run_chunks, the auditor and
+        parsing times are summed over the worker processes, and can be more 
+        than the time elapsed.
+        """
+        summed = " (summed over {} processes)".format(self.processes) \
+                 if self.processes > 1 else ""
+        for auditor in self.auditors:
+            print auditor.name
+            auditor.display()
+            print "Values processed: " + str(auditor.count)
+            print "Auditor time{}: {} seconds".format(summed, auditor.elapsed)
+            print ''
+        audit_time = sum(auditor.elapsed for auditor in self.auditors)
+        print "Parsing time{}: {} seconds".format(summed, self.process_time - audit_time)
+        print "Time elapsed: " + str(self.elapsed) + " seconds"
+
+def run_chunk(args):
+    """
+    Audit a byte range of the osm file. Used by the worker processes of
+    AuditEngine.run_chunks.
+    Args:
+        args: (osm file path, start offset, end offset, auditor factories)
+    Returns:
+        (results converted by Audit.to_dict, count, elapsed) of each auditor,
+        the time the chunk took, the statistics and the values of the 
+        cleaning cache, and the statistics of the stages (see 
+        osm_stats.collect)
+    """
+    osm_file, start, end, factories = args
+    engine = AuditEngine()
+    for factory in factories:
+        engine.add(factory)
+    engine.run(osmf.FileRange(osm_file, start, end))
+    return ([(auditor.results.to_dict(), auditor.count, auditor.elapsed)
+             for auditor in engine.auditors],
+            engine.elapsed, clean_cache.collect(), osm_stats.collect())
+
+# ================================================== #
+#               Registered Auditors                  #
+# ================================================== #
+def street_name_auditor():
+    """Auditor that audits street names"""
+    return Auditor("Auditing street names", "addr:street",
+                   audit_street_name.StreetNameAudit())
+
+def city_name_auditor():
+    """Auditor that audits city names"""
+    return Auditor("Auditing city names", "addr:city",
+                   audit_city_name.CityNameAudit())
+
+def zipcode_auditor():
+    """Auditor that audits zip codes"""
+    return Auditor("Auditing zip codes", "addr:postcode",
+                   audit_postcode.ZipcodeAudit())
+
+def street_name_cleaner():
+    """Auditor that cleans street names, then audits cleaned street names"""
+    results = audit_street_name.StreetNameAudit()
+    def process(s):
+        results.audit(clean_street_name.clean_street_name(s))
+    return Auditor("Cleaning and auditing street names", "addr:street", 
+                   results, process)
+
+def city_name_cleaner():
+    """Auditor that cleans city names, then audits cleaned city names"""
+    results = audit_city_name.CityNameAudit()
+    def process(c):
+        c = clean_city_name.clean_city_name(c)
+        if c:
+            results.audit(c)
+    return Auditor("Cleaning and auditing city names", "addr:city", 
+                   results, process)
+
+def zipcode_cleaner():
+    """Auditor that cleans zip codes, then audits cleaned zip codes"""
+    results = audit_postcode.ZipcodeAudit()
+    def process(z):
+        z = clean_postcode.clean_zipcode(z)
+        if z:
+            results.audit(z)
+    return Auditor("Cleaning and auditing zip codes", "addr:postcode", 
+                   results, process)
+
+AUDITORS = [street_name_auditor,
+            city_name_auditor,
+            zipcode_auditor,
+            street_name_cleaner,
+            city_name_cleaner,
+            zipcode_cleaner]
+
+def audit(auditors=AUDITORS, processes=1):
+    """
+    Run the auditors in a single pass over the osm file, display the results
+    and the time it takes to audit the file
+    Args:
+        auditors: list of functions that create the auditors to register
+        processes: number of processes, the file is audited in chunks in a 
+                   pool of processes if more than 1
+    """
+    osm_stats.start()
+    print "Auditing and cleaning " + osmv.OSM_PATH
+    engine = AuditEngine()
+    for auditor in auditors:
+        engine.add(auditor)
+    # Compressed files and stdin can only be read from the start
+    if processes > 1 and osmf.is_plain_file(osmv.OSM_PATH):
+        engine.run_chunks(osmv.OSM_PATH, processes)
+    else:
+        engine.run(osmv.OSM_PATH)
+    clean_cache.save()
+    engine.display()
+    clean_cache.display_stats()
+    # The time of each auditor is a stage of the run report
+    for auditor in engine.auditors:
+        name = auditor.factory.__name__ if auditor.factory else auditor.name
+        osm_stats.add(name, auditor.elapsed, auditor.count, auditor.count)
+    print ''
+    osm_stats.display()
+    report = osm_stats.save_report('audit_engine', osm_file=osmv.OSM_PATH,
+                                   processes=processes)
+    if report:
+        print ''
+        print 'Run report: ' + report
+
+if __name__ == "__main__":
+    audit(processes=osmv.PROCESSES)
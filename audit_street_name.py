@@ -1,144 +1,163 @@
-# -*- coding: utf-8 -*-
-""" 
-Audit street names in the osm file, check wether a street name contains problematic 
-charachters, abbreviated points, street type, or highway name. Display the result 
-and the time it takes to audit the file.
-"""
-
-import pprint
-from collections import defaultdict
-import time
-import osm_variables as osmv
-import osm_functions as osmf
-
-problematic_chars = defaultdict(set)
-problematic_building_numbers = defaultdict(set)
-problematic_points = defaultdict(set)
-problematic_street_types = defaultdict(set)
-problematic_highways = defaultdict(set)
-
-def audit_char(s):
-    """
-    Check wether street name has the following problemetic characters: "'S", ",",
-    ";", or ordinal number with capital letter. If it does, add street name into
-    problematic_chars set.
-    Args:
-        s: street name
-    """
-    # problematic "'S"
-    if "'S" in s:
-        problematic_chars["'S"].add(s)
-    # comma in street name
-    if "," in s:
-        problematic_chars[","].add(s)
-    # semicollon in street name
-    if ";" in s:
-        problematic_chars[";"].add(s)
-    # ordinal number with capital letter such as in 5Th
-    p = osmv.ordinal_number_re.search(s)
-    if p:
-        ordinal = p.group().strip(" ")
-        if any(x.isupper() for x in ordinal):
-            problematic_chars[ordinal].add(s)
-
-
-def audit_building_number_type(s):
-    """
-    Check wether street name has building (suite) number. If it does add street 
-    name into problematic_building_numbers set.
-    Args:
-        s: street name
-    """
-    p = osmv.building_no_type_re.search(s)
-    if p:
-        bn = p.group().strip(" ").strip(".")
-        if bn not in osmv.EXPECTED_BUILDING_NUMBER_TYPES:
-            problematic_building_numbers[bn].add(s)
-
-def audit_point(s):
-    """
-    Check wether street name has an abbreviated point (e.g S, E, N, W). 
-    If it does add street name into problematic_points set.
-    Args:
-        s: street name
-    """
-    p = osmv.audit_point.search(s)
-    if p:
-        point = p.group().strip(" ")
-        problematic_points[point].add(s)            
-
-def audit_stret_type(s):
-    """
-    Check wether street name has an expected type (e.g Street, Road, Lane). 
-    If it does not, add street name into problematic_street_types set.
-    Args:
-        s: street name
-    """
-    if not any(p in s for p in osmv.EXPECTED_STREET_TYPES):
-        street_type = s
-        if " " in s:
-            street_type = street_type[street_type.rindex(" "):]
-        problematic_street_types[street_type].add(s)
-
-
-def audit_highway(s):
-    """
-    Check wether street name has a number that could be a highway number 
-    (e.g. FM 121, Interstate 30). If the number is not highway number or 
-    the highway name is not consistent with the mapping, add street name into 
-    problematic_highways set.
-    Args:
-        s: street name
-    """
-    p = osmv.highway_re.search(s)
-    if p:
-        hwy = p.group().strip(" ").strip(".")
-        if hwy not in osmv.HIGHWAY_MAPPING \
-        or osmv.HIGHWAY_MAPPING[hwy] not in s:
-            if "Suite" not in s:
-                problematic_highways[hwy].add(s)
-
-def audit_street_name(s):
-    """
-    Audit street name for problematic characters, building number, abbreviated
-    points, street type, and highway name and number. 
-    """
-    audit_char(s)
-    audit_building_number_type(s)
-    audit_point(s)
-    audit_stret_type(s)
-    audit_highway(s)
-    
-def display_audit_street_name_result():
-    """
-    Display the results of auditing street names in the osm file.
-    """
-    print "Problematic Characters:"
-    pprint.pprint(dict(problematic_chars))
-    print "Problematic Building Numbers:"
-    pprint.pprint(dict(problematic_building_numbers))    
-    print "Problematic Points:"
-    pprint.pprint(dict(problematic_points))    
-    print "Problematic Street Types:"
-    pprint.pprint(dict(problematic_street_types))    
-    print "Problematic Highway Name:"
-    pprint.pprint(dict(problematic_highways))            
-    
-def audit():
-    """ 
-    Audit street names in the osm file, display the results and the time it takes
-    to audit the file
-    """
-    print "Auditing street names in " + osmv.OSM_PATH
-    start = time.time()
-    for elem in osmf.get_element(osmv.OSM_PATH):
-        for tag in elem.iter("tag"):
-            if osmf.is_street_name(tag):
-                name = tag.attrib['v']
-                audit_street_name(name)
-    end = time.time()
-    display_audit_street_name_result()
-    print "Time elapsed: " + str(end - start) + " seconds"
-
-if __name__ == "__main__":
+# -*- coding: utf-8 -*-
+""" 
+Audit street names in the osm file, check wether a street name contains problematic 
+charachters, abbreviated points, street type, or highway name. Display the result 
+and the time it takes to audit the file.
+"""
+
+import pprint
+from audit_accumulator import Audit
+import time
+import osm_variables as osmv
+import osm_functions as osmf
+
+def audit_char(s, problematic_chars):
+    """
+    Check wether street name has the following problemetic characters: "'S", ",",
+    ";", or ordinal number with capital letter. If it does, add street name into
+    problematic_chars set. The ordinal numbers are added into the 
+    'capitalized ordinal' category, so the number of categories is fixed.
+    Args:
+        s: street name
+        problematic_chars: AuditAccumulator to add street name into
+    """
+    # problematic "'S"
+    if "'S" in s:
+        problematic_chars["'S"].add(s)
+    # comma in street name
+    if "," in s:
+        problematic_chars[","].add(s)
+    # semicollon in street name
+    if ";" in s:
+        problematic_chars[";"].add(s)
+    # ordinal number with capital letter such as in 5Th
+    p = osmv.ordinal_number_re.search(s)
+    if p:
+        ordinal = p.group().strip(" ")
+        if any(x.isupper() for x in ordinal):
+            problematic_chars['capitalized ordinal'].add(ordinal)
+
+
+def audit_building_number_type(s, problematic_building_numbers):
+    """
+    Check wether street name has building (suite) number. If it does add street 
+    name into problematic_building_numbers set.
+    Args:
+        s: street name
+        problematic_building_numbers: AuditAccumulator to add street name into
+    """
+    p = osmv.building_no_type_re.search(s)
+    if p:
+        bn = p.group().strip(" ").strip(".")
+        if bn not in osmv.expected_building_number_types:
+            problematic_building_numbers[bn].add(s)
+
+def audit_point(s, problematic_points):
+    """
+    Check wether street name has an abbreviated point (e.g S, E, N, W). 
+    If it does add street name into problematic_points set.
+    Args:
+        s: street name
+        problematic_points: AuditAccumulator to add street name into
+    """
+    p = osmv.audit_point.search(s)
+    if p:
+        point = p.group().strip(" ")
+        problematic_points[point].add(s)            
+
+def audit_stret_type(s, problematic_street_types):
+    """
+    Check wether street name has an expected type (e.g Street, Road, Lane). 
+    If it does not, add its last word into the 'unexpected' category of 
+    problematic_street_types. The last words are the values of one category,
+    not categories, since almost every street name without an expected type
+    has a different last word, and each category takes a fixed amount of
+    memory.
+    Args:
+        s: street name
+        problematic_street_types: AuditAccumulator to add street type into
+    """
+    if not osmf.street_type_matcher.search(s):
+        street_type = s
+        if " " in s:
+            street_type = street_type[street_type.rindex(" "):]
+        problematic_street_types['unexpected'].add(street_type.strip(" "))
+
+
+def audit_highway(s, problematic_highways):
+    """
+    Check wether street name has a number that could be a highway number 
+    (e.g. FM 121, Interstate 30). If the number is not highway number or 
+    the highway name is not consistent with the mapping, add the number into 
+    the 'unmapped highway number' or 'inconsistent highway name' category of
+    problematic_highways, so the number of categories is fixed.
+    Args:
+        s: street name
+        problematic_highways: AuditAccumulator to add highway number into
+    """
+    p = osmv.highway_re.search(s)
+    if p:
+        hwy = p.group().strip(" ").strip(".")
+        if "Suite" not in s:
+            if hwy not in osmv.HIGHWAY_MAPPING:
+                problematic_highways['unmapped highway number'].add(hwy)
+            elif osmv.HIGHWAY_MAPPING[hwy] not in s:
+                problematic_highways['inconsistent highway name'].add(hwy)
+
+def audit_street_name(s, results):
+    """
+    Audit street name for problematic characters, building number, abbreviated
+    points, street type, and highway name and number. 
+    Args:
+        s: street name
+        results: dict of the AuditAccumulators to add street name into
+    """
+    audit_char(s, results['chars'])
+    audit_building_number_type(s, results['building numbers'])
+    audit_point(s, results['points'])
+    audit_stret_type(s, results['street types'])
+    audit_highway(s, results['highways'])
+    
+def display_audit_street_name_result(results):
+    """
+    Display the results of auditing street names in the osm file.
+    Args:
+        results: dict of the AuditAccumulators of problematic street names
+    """
+    print "Problematic Characters:"
+    pprint.pprint(results['chars'].summary())
+    print "Problematic Building Numbers:"
+    pprint.pprint(results['building numbers'].summary())    
+    print "Problematic Points:"
+    pprint.pprint(results['points'].summary())    
+    print "Problematic Street Types:"
+    pprint.pprint(results['street types'].summary())    
+    print "Problematic Highway Name:"
+    pprint.pprint(results['highways'].summary())            
+
+class StreetNameAudit(Audit):
+    """Audit results of street names"""
+    groups = ('chars', 'building numbers', 'points', 'street types', 'highways')
+
+    def audit(self, s):
+        audit_street_name(s, self.results)
+
+    def display(self):
+        display_audit_street_name_result(self.results)
+    
+def audit():
+    """ 
+    Audit street names in the osm file, display the results and the time it takes
+    to audit the file
+    """
+    print "Auditing street names in " + osmv.OSM_PATH
+    results = StreetNameAudit()
+    start = time.time()
+    for name in osmf.get_tag_values(osmv.OSM_PATH, 'addr:street'):
+        results.audit(name)
+    end = time.time()
+    results.display()
+    print "Time elapsed: " + str(end - start) + " seconds"
+
+if __name__ == "__main__":
     audit()
\ No newline at end of file
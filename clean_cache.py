@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Memoize the cleaning functions. The same street names, city names, and zip
+codes repeat many times in the osm file, so each distinct value is cleaned
+once and the cleaned value is kept in a bounded LRU cache. The cleaned values
+can also be saved into a cache file (osmv.CLEAN_CACHE_PATH), so that a repeat
+run does not clean the values again until the cleaning rules in osm_variables
+change.
+"""
+import collections
+import hashlib
+import json
+import os
+import osm_stats
+import osm_variables as osmv
+
+# Bump when a cleaning function changes, so the cache file is not used
+CACHE_VERSION = 1
+
+def _from_json(s):
+    """
+    Convert a string loaded from JSON to str if it is ascii, the same way
+    ElementTree returns attribute values
+    """
+    if isinstance(s, unicode):
+        try:
+            return s.encode('ascii')
+        except UnicodeEncodeError:
+            return s
+    return s
+
+def get_rules_hash():
+    """
+    Get a hash of the cleaning rules in osm_variables: the mapping tables, the
+    expected values, and the regular expressions.
+    Returns:
+        hex digest
+    """
+    rules = {'version': CACHE_VERSION}
+    for name, value in vars(osmv).items():
+        if name.startswith('_'):
+            continue
+        if name.endswith('_MAPPING') or name.startswith('EXPECTED_'):
+            rules[name] = value
+        elif hasattr(value, 'pattern') and hasattr(value, 'flags'):
+            rules[name] = [value.pattern, value.flags]
+    return hashlib.md5(json.dumps(rules, sort_keys=True)).hexdigest()
+
+class CleanMemo(object):
+    """
+    Cleaning function with a bounded LRU cache of the cleaned values. Values
+    loaded from the cache file are looked up after the LRU cache.
+    Args:
+        name: name of the cleaned values, used in the cache file
+        clean: cleaning function that takes a tag value
+        maxsize: number of cleaned values kept in the LRU cache
+    """
+    def __init__(self, name, clean, maxsize=osmv.CLEAN_CACHE_SIZE):
+        self.name = name
+        self.clean = clean
+        self.maxsize = maxsize
+        self.cache = collections.OrderedDict()
+        self.stored = {}
+        self.new = {}
+        self.hits = 0
+        self.misses = 0
+        self.__doc__ = clean.__doc__
+
+    def __call__(self, value):
+        try:
+            result = self.cache.pop(value)
+            self.hits += 1
+        except KeyError:
+            if value in self.stored:
+                result = self.stored[value]
+                self.hits += 1
+            else:
+                result = self.clean(value)
+                self.misses += 1
+                if osmv.CLEAN_CACHE_PATH:
+                    self.new[value] = result
+            if len(self.cache) >= self.maxsize:
+                self.cache.popitem(last=False)
+        self.cache[value] = result
+        return result
+
+    def clear(self):
+        """Clear the LRU cache and the statistics"""
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+memos = collections.OrderedDict()
+
+def memoize(name, clean):
+    """
+    Memoize a cleaning function, and load its values from the cache file if
+    osmv.CLEAN_CACHE_PATH is set. The time it takes to clean the values that
+    are not cached is recorded in the stage of the function (see osm_stats).
+    Args:
+        name: name of the cleaned values
+        clean: cleaning function
+    Returns:
+        CleanMemo object
+    """
+    memo = CleanMemo(name, osm_stats.timed(clean.__name__, clean))
+    memos[name] = memo
+    if osmv.CLEAN_CACHE_PATH:
+        memo.stored = load(osmv.CLEAN_CACHE_PATH).get(name, {})
+    return memo
+
+def load(path):
+    """
+    Load the cleaned values from a cache file.
+    Args:
+        path: cache file path
+    Returns:
+        dict of {value: cleaned value} by name, empty if the file does not
+        exist or the cleaning rules have changed
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'rb') as f:
+        try:
+            data = json.load(f)
+        except ValueError:
+            return {}
+    if data.get('hash') != get_rules_hash():
+        return {}
+    return dict((str(name), dict((_from_json(v), _from_json(c)) for v, c in values))
+                for name, values in data['values'].items())
+
+def collect():
+    """
+    Get the statistics and the values cleaned since the last call, and reset
+    them. Used to send the work of a worker process back to the main process.
+    Returns:
+        dict of (hits, misses, {value: cleaned value}) by name
+    """
+    collected = {}
+    for name, memo in memos.items():
+        collected[name] = (memo.hits, memo.misses, memo.new)
+        memo.hits, memo.misses, memo.new = 0, 0, {}
+    return collected
+
+def merge(collected):
+    """
+    Add the statistics and the values cleaned in another process, see collect.
+    Args:
+        collected: dict of (hits, misses, {value: cleaned value}) by name
+    """
+    for name, (hits, misses, new) in collected.items():
+        memos[name].hits += hits
+        memos[name].misses += misses
+        memos[name].new.update(new)
+
+def save(path=None):
+    """
+    Save the cleaned values into the cache file, if osmv.CLEAN_CACHE_PATH is
+    set and values were cleaned since the cache file was loaded.
+    Args:
+        path: cache file path, osmv.CLEAN_CACHE_PATH if None
+    """
+    path = path or osmv.CLEAN_CACHE_PATH
+    if not path or not any(memo.new for memo in memos.values()):
+        return
+    values = load(path)
+    for name, memo in memos.items():
+        memo.stored.update(memo.new)
+        memo.new = {}
+        values.setdefault(name, {}).update(memo.stored)
+    data = {'hash': get_rules_hash(),
+            'values': dict((name, v.items()) for name, v in values.items())}
+    # Write a temporary file then rename it, so the cache file is never partial
+    with open(path + '.tmp', 'wb') as f:
+        json.dump(data, f)
+    os.rename(path + '.tmp', path)
+
+def clean_values(values, clean, clean_series=None):
+    """
+    Clean an array of values, cleaning each distinct value only once and 
+    mapping the cleaned values back to the array.
+    Args:
+        values: list, numpy array, or pandas Series of tag values
+        clean: cleaning function that takes a tag value
+        clean_series: optional function that cleans a pandas Series of the 
+                      distinct values with vectorized string operations
+    Returns:
+        cleaned values, a pandas Series (with NaN for missing or removed 
+        values) if values is a Series, else a list (with None for removed
+        values)
+    """
+    # pandas Series: clean the distinct values, then map them back
+    if hasattr(values, 'unique') and hasattr(values, 'map'):
+        unique = values.dropna().unique()
+        if clean_series is not None:
+            cleaned = clean_series(values.__class__(unique))
+            mapping = dict(zip(unique, cleaned))
+        else:
+            mapping = dict((v, clean(v)) for v in unique)
+        return values.map(mapping)
+    cleaned = {}
+    result = []
+    for v in values:
+        try:
+            result.append(cleaned[v])
+        except KeyError:
+            cleaned[v] = clean(v)
+            result.append(cleaned[v])
+    return result
+
+def display_stats():
+    """Display the hits and misses of each memoized cleaning function"""
+    print '{:<10} {:>10} {:>10} {:>8}'.format('Cleaner', 'Hits', 'Misses', 'Hit %')
+    for name, memo in memos.items():
+        total = memo.hits + memo.misses
+        print '{:<10} {:>10} {:>10} {:>8.1f}'.format(
+            name, memo.hits, memo.misses, 100.0 * memo.hits / total if total else 0)
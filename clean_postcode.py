@@ -1,49 +1,69 @@
-# -*- coding: utf-8 -*-
-"""
-Clean zip codes in the osm file, clean zip codes that contain non-digit 
-charachters, wrong number of digit, or zip code from area outside Dallas. Audit
-cleaned zip codes, and display the result and the time it takes to clean and 
-audit the file.
-"""
-
-import time
-import audit_postcode as audit
-import osm_variables as osmv
-import osm_functions as osmf
-
-def clean_zipcode(z):
-    """
-    Clean zip code value from non-digit characters, returns None if the value is
-    not in the correct format (5 digits) or if it does not start with 75 or 76 
-    (Dallas area zip codes start with 75 or 76)
-    Args:
-        z: zip code value
-    Return:
-        z: cleaned zip code value or None
-    """
-    p = osmv.zip_re.search(z)
-    if p:
-        zipcode = p.group()
-        return zipcode
-    return None
-    
-def clean():
-    """
-    Clean zip codes in the osm file then audit cleaned zip codes, display the 
-    result and the time it takes to clean and to audit the file
-    """
-    print "Cleaning and auditing zip codes in " + osmv.OSM_PATH
-    start = time.time()
-    for elem in osmf.get_element(osmv.OSM_PATH):
-        for tag in elem.iter("tag"):
-            if osmf.is_zipcode(tag):
-                zipcode = tag.attrib['v']
-                zipcode = clean_zipcode(zipcode)
-                if zipcode:
-                    audit.audit_zipcode(zipcode)
-    end = time.time()
-    audit.display_audit_zipcodes_result()
-    print "Time elapsed: " + str(end - start) + " seconds"
-
-if __name__ == "__main__":
+# -*- coding: utf-8 -*-
+"""
+Clean zip codes in the osm file, clean zip codes that contain non-digit 
+charachters, wrong number of digit, or zip code from area outside Dallas. Audit
+cleaned zip codes, and display the result and the time it takes to clean and 
+audit the file.
+"""
+
+import time
+import audit_postcode as audit
+import osm_variables as osmv
+import osm_functions as osmf
+import clean_cache
+
+def clean_zipcode(z):
+    """
+    Clean zip code value from non-digit characters, returns None if the value is
+    not in the correct format (5 digits) or if it does not start with 75 or 76 
+    (Dallas area zip codes start with 75 or 76)
+    Args:
+        z: zip code value
+    Return:
+        z: cleaned zip code value or None
+    """
+    p = osmv.zip_re.search(z)
+    if p:
+        zipcode = p.group()
+        return zipcode
+    return None
+
+# Clean each distinct zip code only once
+clean_zipcode = clean_cache.memoize('zipcode', clean_zipcode)
+
+def extract_zipcodes(series):
+    """Clean a pandas Series of zip codes with a vectorized regex search"""
+    return series.str.extract('(' + osmv.zip_re.pattern + ')', expand=False)
+
+def clean_zipcodes(values):
+    """
+    Clean an array of zip codes, cleaning each distinct zip code once. The 
+    zip codes in a pandas Series are cleaned with vectorized string operations.
+    Args:
+        values: list, numpy array, or pandas Series of zip codes
+    Return:
+        cleaned zip codes (None or NaN for removed zip codes), a list or a 
+        pandas Series
+    """
+    return clean_cache.clean_values(values, clean_zipcode, extract_zipcodes)
+    
+def clean():
+    """
+    Clean zip codes in the osm file then audit cleaned zip codes, display the 
+    result and the time it takes to clean and to audit the file
+    """
+    print "Cleaning and auditing zip codes in " + osmv.OSM_PATH
+    results = audit.ZipcodeAudit()
+    start = time.time()
+    for zipcode in osmf.get_tag_values(osmv.OSM_PATH, 'addr:postcode'):
+        zipcode = clean_zipcode(zipcode)
+        if zipcode:
+            results.audit(zipcode)
+    end = time.time()
+    clean_cache.save()
+    results.display()
+    clean_cache.display_stats()
+    print "Time elapsed: " + str(end - start) + " seconds"
+
+if __name__ == "__main__":
     clean()
\ No newline at end of file
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Apply an OpenStreetMap change file (.osc) to the database built by load_db or
+write_csvs, instead of processing the whole osm file again. The created and
+modified elements are shaped and cleaned the same way as in write_csvs, and
+replace the rows of the elements in the tables. The deleted elements are
+removed from the tables. All the changes are applied in a single transaction.
+"""
+import collections
+import sqlite3 as sq3
+import time
+import xml.etree.cElementTree as ET
+import clean_cache
+import load_db
+import osm_functions as osmf
+import osm_stats
+import osm_variables as osmv
+import schema_validator
+import write_csvs
+
+ACTIONS = ('create', 'modify', 'delete')
+# Tables of the rows of each element type, their id column is the element id
+ELEMENT_TABLES = {'node': ['nodes', 'nodes_tags'],
+                  'relation': ['relations', 'relations_nodes', 'relations_relations',
+                               'relations_tags', 'relations_ways'],
+                  'way': ['ways', 'ways_nodes', 'ways_tags']}
+
+def get_changes(osc_file):
+    """
+    Get the last change of each element of a change file, in file order.
+    Args:
+        osc_file: change file path (.osc, .osc.gz, or .osc.bz2)
+    Returns:
+        OrderedDict of (action, XML element) by (element type, element id)
+    """
+    changes = collections.OrderedDict()
+    f = osmf.open_osm_file(osc_file)
+    try:
+        action = None
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if elem.tag in ACTIONS:
+                action = elem.tag if event == 'start' else None
+            elif event == 'end' and action and elem.tag in ELEMENT_TABLES:
+                key = (elem.tag, elem.attrib['id'])
+                # A later change of the same element replaces the earlier one
+                changes.pop(key, None)
+                changes[key] = (action, elem)
+    finally:
+        f.close()
+    return changes
+
+def delete_rows(cur, keys):
+    """
+    Delete the rows of elements from every table of their element type.
+    Args:
+        cur: database cursor
+        keys: iterable of (element type, element id)
+    """
+    ids = collections.defaultdict(list)
+    for element_type, element_id in keys:
+        ids[element_type].append((int(element_id),))
+    for element_type, element_ids in ids.items():
+        for table in ELEMENT_TABLES[element_type]:
+            cur.executemany("DELETE FROM {} WHERE id = ?".format(load_db.get_rows_table(table)),
+                            element_ids)
+
+def apply_changes(osc_file, db_path=osmv.DB_PATH, validate=False):
+    """
+    Apply a change file to the database in a single transaction. The rows of
+    every changed element are deleted, then the rows of the created and
+    modified elements are inserted, so the database has the last version of
+    each element.
+    Args:
+        osc_file: change file path
+        db_path: database file path
+        validate: validate the shaped elements, see write_csvs.write_rows
+    Returns:
+        dict of the number of changed elements by (action, element type), and
+        the ValidationSummary object or None
+    """
+    osm_stats.start()
+    start = osm_stats.timer()
+    changes = get_changes(osc_file)
+    osm_stats.add('get_changes', osm_stats.timer() - start, len(changes))
+    counts = collections.Counter((action, key[0]) for key, (action, _) in changes.items())
+    con = sq3.connect(db_path)
+    # Insert the utf-8 strings of the shaped rows without decoding them
+    con.text_factory = str
+    try:
+        cur = con.cursor()
+        start = osm_stats.timer()
+        delete_rows(cur, changes.keys())
+        osm_stats.add('delete_rows', osm_stats.timer() - start, len(changes))
+        writers = osm_stats.timed_writers(load_db.get_table_writers(cur), load_db.tables)
+        elements = (elem for action, elem in changes.values() if action != 'delete')
+        summary = write_csvs.write_rows(elements, writers, validate)
+        con.commit()
+    except:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+    return dict(counts), summary
+
+if __name__ == '__main__':
+    print 'Change file: {}'.format(osmv.OSC_PATH)
+    start = time.time()
+    counts, summary = apply_changes(
+        osmv.OSC_PATH, osmv.DB_PATH,
+        validate=schema_validator.ValidationPolicy(**osmv.VALIDATION_POLICY))
+    clean_cache.save()
+    print "Time elapsed: " + str(time.time() - start) + " seconds"
+    print '{:<10} {:<10} {:>10}'.format('Action', 'Type', 'Elements')
+    for (action, element_type), count in sorted(counts.items()):
+        print '{:<10} {:<10} {:>10}'.format(action, element_type, count)
+    print ''
+    summary.display()
+    print ''
+    clean_cache.display_stats()
+    print ''
+    osm_stats.display()
+    report = osm_stats.save_report('load_changes', osc_file=osmv.OSC_PATH,
+                                   db_path=osmv.DB_PATH, changes=sum(counts.values()),
+                                   validation=summary.to_dict())
+    if report:
+        print ''
+        print 'Run report: ' + report
\ No newline at end of file
@@ -1,215 +1,603 @@
-# -*- coding: utf-8 -*-
-"""
-Build a database system from .csv files that were created from the osm files 
-and were shaped to follow the schema.py data structures.
-"""
-
-import csv
-import sqlite3 as sq3
-import osm_variables as osmv
-
-create_nodes_query = """
-CREATE TABLE nodes (
-    id INTEGER PRIMARY KEY NOT NULL,
-    lat REAL,
-    lon REAL,
-    user TEXT,
-    uid INTEGER,
-    version INTEGER,
-    changeset INTEGER,
-    timestamp TEXT
-);
-"""
-
-create_nodes_tags_query = """
-CREATE TABLE nodes_tags (
-    id INTEGER,
-    key TEXT,
-    value TEXT,
-    type TEXT,
-    FOREIGN KEY (id) REFERENCES nodes(id)
-);
-"""
-
-create_relations_query = """
-CREATE TABLE relations (
-    id INTEGER PRIMARY KEY NOT NULL,
-    user TEXT,
-    uid INTEGER,
-    version TEXT,
-    changeset INTEGER,
-    timestamp TEXT
-);
-"""
-
-create_relations_nodes_query = """
-CREATE TABLE relations_nodes (
-    id INTEGER NOT NULL,
-    node_id INTEGER NOT NULL,
-    position INTEGER NOT NULL,
-    role TEXT,
-    FOREIGN KEY (id) REFERENCES relations(id),
-    FOREIGN KEY (node_id) REFERENCES nodes(id)
-);
-"""
-
-create_relations_relations_query = """
-CREATE TABLE relations_relations (
-    id INTEGER NOT NULL,
-    relation_id INTEGER NOT NULL,
-    position INTEGER NOT NULL,
-    role TEXT,
-    FOREIGN KEY (id) REFERENCES relations(id),
-    FOREIGN KEY (relation_id) REFERENCES relations(id)
-);
-"""
-
-create_relations_tags_query = """
-CREATE TABLE relations_tags (
-    id INTEGER NOT NULL,
-    key TEXT NOT NULL,
-    value TEXT NOT NULL,
-    type TEXT,
-    FOREIGN KEY (id) REFERENCES ways(id)
-);
-"""
-
-create_relations_ways_query = """
-CREATE TABLE relations_ways (
-    id INTEGER NOT NULL,
-    way_id INTEGER NOT NULL,
-    position INTEGER NOT NULL,
-    role TEXT,
-    FOREIGN KEY (id) REFERENCES relations(id),
-    FOREIGN KEY (way_id) REFERENCES ways(id)
-);
-"""
-
-create_ways_query = """
-CREATE TABLE ways (
-    id INTEGER PRIMARY KEY NOT NULL,
-    user TEXT,
-    uid INTEGER,
-    version TEXT,
-    changeset INTEGER,
-    timestamp TEXT
-);
-"""
-
-create_ways_nodes_query = """
-CREATE TABLE ways_nodes (
-    id INTEGER NOT NULL,
-    node_id INTEGER NOT NULL,
-    position INTEGER NOT NULL,
-    FOREIGN KEY (id) REFERENCES ways(id),
-    FOREIGN KEY (node_id) REFERENCES nodes(id)
-);
-"""
-
-create_ways_tags_query = """
-CREATE TABLE ways_tags (
-    id INTEGER NOT NULL,
-    key TEXT NOT NULL,
-    value TEXT NOT NULL,
-    type TEXT,
-    FOREIGN KEY (id) REFERENCES ways(id)
-);
-"""
-
-insert_nodes_query = """
-INSERT INTO nodes (id, lat, lon, user, uid, version, changeset, timestamp)
-VALUES (:id, :lat, :lon, :user, :uid, :version, :changeset, :timestamp)
-"""
-insert_nodes_tags_query = """
-INSERT INTO nodes_tags (id, key, value, type)
-VALUES (:id, :key, :value, :type)
-"""
-insert_relations_query = """
-INSERT INTO relations (id, user, uid, version, changeset, timestamp)
-VALUES (:id, :user, :uid, :version, :changeset, :timestamp)
-"""
-insert_relations_nodes_query = """
-INSERT INTO relations_nodes (id, node_id, position, role)
-VALUES (:id, :node_id, :position, :role)
-"""
-insert_relations_relations_query = """
-INSERT INTO relations_relations (id, relation_id, position, role)
-VALUES (:id, :relation_id, :position, :role)
-"""
-insert_relations_tags_query = """
-INSERT INTO relations_tags (id, key, value, type)
-VALUES (:id, :key, :value, :type)
-"""
-insert_relations_ways_query = """
-INSERT INTO relations_ways (id, way_id, position, role)
-VALUES (:id, :way_id, :position, :role)
-"""
-insert_ways_query = """
-INSERT INTO ways (id, user, uid, version, changeset, timestamp)
-VALUES (:id, :user, :uid, :version, :changeset, :timestamp)
-"""
-insert_ways_nodes_query = """
-INSERT INTO ways_nodes (id, node_id, position)
-VALUES (:id, :node_id, :position)
-"""
-insert_ways_tags_query = """
-INSERT INTO ways_tags (id, key, value, type)
-VALUES (:id, :key, :value, :type)
-"""
-
-def create_tables():
-    """
-    Create database tables for each csv file
-    """
-    with sq3.connect(osmv.DB_PATH) as con:
-        cur = con.cursor()
-        cur.execute(create_nodes_query)
-        cur.execute(create_nodes_tags_query)
-        cur.execute(create_relations_query)
-        cur.execute(create_relations_nodes_query)
-        cur.execute(create_relations_relations_query)
-        cur.execute(create_relations_tags_query)
-        cur.execute(create_relations_ways_query)
-        cur.execute(create_ways_query)
-        cur.execute(create_ways_nodes_query)
-        cur.execute(create_ways_tags_query)
-        con.commit()
-
-def UnicodeDictReader(utf8_data, **kwargs):
-    csv_reader = csv.DictReader(utf8_data, **kwargs)
-    for row in csv_reader:
-        yield {key: unicode(value, 'utf-8') for key, value in row.iteritems()}
-
-def import_csv(csv_file, query):
-    """
-    Import the .csv file into the corresponding database table
-    """        
-    with open (csv_file, 'rb') as csvfile:
-        csv_reader = UnicodeDictReader(csvfile)
-        with sq3.connect(osmv.DB_PATH) as conn:
-            cur = conn.cursor()
-            cur.executemany(query, csv_reader)
-        
-if __name__ == '__main__':
-    create_tables()
-    print "Tables Created"
-    import_csv(osmv.NODES_PATH, insert_nodes_query)
-    print "Done inserting nodes"
-    import_csv(osmv.NODE_TAGS_PATH, insert_nodes_tags_query)
-    print "Done insterting nodes_tags"
-    import_csv(osmv.RELATIONS_PATH, insert_relations_query)
-    print "Done insterting relations"
-    import_csv(osmv.RELATION_NODES_PATH, insert_relations_nodes_query)
-    print "Done insterting relations_nodes"
-    import_csv(osmv.RELATION_RELATIONS_PATH, insert_relations_relations_query)
-    print "Done insterting relations_relations"
-    import_csv(osmv.RELATION_TAGS_PATH, insert_relations_tags_query)
-    print "Done insterting relations_tags"
-    import_csv(osmv.RELATION_WAYS_PATH, insert_relations_ways_query)
-    print "Done insterting relations_ways"
-    import_csv(osmv.WAYS_PATH, insert_ways_query)
-    print "Done insterting ways"
-    import_csv(osmv.WAY_NODES_PATH, insert_ways_nodes_query)
-    print "Done insterting way_nodes"
-    import_csv(osmv.WAY_TAGS_PATH, insert_ways_tags_query)
-    print "Done insterting way_tags"
\ No newline at end of file
+# -*- coding: utf-8 -*-
+"""
+Build a database system from .csv files that were created from the osm files 
+and were shaped to follow the schema.py data structures. write_csvs can also 
+insert the shaped rows straight into the database with TableWriter (see 
+write_csvs.write_db).
+"""
+
+import csv
+import os
+import sqlite3 as sq3
+from operator import itemgetter
+import osm_compressed
+import osm_functions as osmf
+import osm_index
+import osm_packed
+import osm_stats
+import osm_variables as osmv
+
+create_nodes_query = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY NOT NULL,
+    lat REAL,
+    lon REAL,
+    user TEXT,
+    uid INTEGER,
+    version INTEGER,
+    changeset INTEGER,
+    timestamp TEXT
+);
+"""
+
+create_nodes_tags_query = """
+CREATE TABLE IF NOT EXISTS nodes_tags (
+    id INTEGER,
+    key TEXT,
+    value TEXT,
+    type TEXT,
+    FOREIGN KEY (id) REFERENCES nodes(id)
+);
+"""
+
+create_relations_query = """
+CREATE TABLE IF NOT EXISTS relations (
+    id INTEGER PRIMARY KEY NOT NULL,
+    user TEXT,
+    uid INTEGER,
+    version TEXT,
+    changeset INTEGER,
+    timestamp TEXT
+);
+"""
+
+create_relations_nodes_query = """
+CREATE TABLE IF NOT EXISTS relations_nodes (
+    id INTEGER NOT NULL,
+    node_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    role TEXT,
+    FOREIGN KEY (id) REFERENCES relations(id),
+    FOREIGN KEY (node_id) REFERENCES nodes(id)
+);
+"""
+
+create_relations_relations_query = """
+CREATE TABLE IF NOT EXISTS relations_relations (
+    id INTEGER NOT NULL,
+    relation_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    role TEXT,
+    FOREIGN KEY (id) REFERENCES relations(id),
+    FOREIGN KEY (relation_id) REFERENCES relations(id)
+);
+"""
+
+create_relations_tags_query = """
+CREATE TABLE IF NOT EXISTS relations_tags (
+    id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    type TEXT,
+    FOREIGN KEY (id) REFERENCES ways(id)
+);
+"""
+
+create_relations_ways_query = """
+CREATE TABLE IF NOT EXISTS relations_ways (
+    id INTEGER NOT NULL,
+    way_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    role TEXT,
+    FOREIGN KEY (id) REFERENCES relations(id),
+    FOREIGN KEY (way_id) REFERENCES ways(id)
+);
+"""
+
+create_ways_query = """
+CREATE TABLE IF NOT EXISTS ways (
+    id INTEGER PRIMARY KEY NOT NULL,
+    user TEXT,
+    uid INTEGER,
+    version TEXT,
+    changeset INTEGER,
+    timestamp TEXT
+);
+"""
+
+create_ways_nodes_query = """
+CREATE TABLE IF NOT EXISTS ways_nodes (
+    id INTEGER NOT NULL,
+    node_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    FOREIGN KEY (id) REFERENCES ways(id),
+    FOREIGN KEY (node_id) REFERENCES nodes(id)
+);
+"""
+
+create_ways_tags_query = """
+CREATE TABLE IF NOT EXISTS ways_tags (
+    id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    type TEXT,
+    FOREIGN KEY (id) REFERENCES ways(id)
+);
+"""
+
+# Csv file imported into each table, so that the table is skipped when 
+# load_db runs again
+create_load_progress_query = """
+CREATE TABLE IF NOT EXISTS load_progress (
+    table_name TEXT PRIMARY KEY NOT NULL,
+    csv_file TEXT,
+    size INTEGER,
+    mtime REAL
+);
+"""
+
+# Tables of the csv files, in the same order as osmv.csv_files
+tables = ['nodes', 'nodes_tags', 'relations', 'relations_nodes', 
+          'relations_relations', 'relations_tags', 'relations_ways', 'ways',
+          'ways_nodes', 'ways_tags']
+create_tables_queries = [create_nodes_query, create_nodes_tags_query, 
+                         create_relations_query, create_relations_nodes_query,
+                         create_relations_relations_query, create_relations_tags_query,
+                         create_relations_ways_query, create_ways_query,
+                         create_ways_nodes_query, create_ways_tags_query]
+
+# Compact schema (osmv.COMPACT_DB): the user names, tag keys and tag types are
+# stored once in the users, tag_keys and tag_types tables, and the rows refer
+# to them by integer ids. The nodes, ways, relations and *_tags tables are 
+# replaced by views with the same columns, whose triggers encode the inserted 
+# rows and delete the encoded rows, so the tables are used the same way with
+# both schemas. The member tables are the same.
+create_users_query = """
+CREATE TABLE IF NOT EXISTS users (
+    uid INTEGER PRIMARY KEY NOT NULL,
+    user TEXT
+);
+"""
+
+create_tag_keys_query = """
+CREATE TABLE IF NOT EXISTS tag_keys (
+    key_id INTEGER PRIMARY KEY NOT NULL,
+    key TEXT UNIQUE NOT NULL
+);
+"""
+
+create_tag_types_query = """
+CREATE TABLE IF NOT EXISTS tag_types (
+    type_id INTEGER PRIMARY KEY NOT NULL,
+    type TEXT UNIQUE NOT NULL
+);
+"""
+
+create_nodes_data_query = """
+CREATE TABLE IF NOT EXISTS nodes_data (
+    id INTEGER PRIMARY KEY NOT NULL,
+    lat REAL,
+    lon REAL,
+    uid INTEGER,
+    version INTEGER,
+    changeset INTEGER,
+    timestamp TEXT
+);
+"""
+
+create_relations_data_query = """
+CREATE TABLE IF NOT EXISTS relations_data (
+    id INTEGER PRIMARY KEY NOT NULL,
+    uid INTEGER,
+    version TEXT,
+    changeset INTEGER,
+    timestamp TEXT
+);
+"""
+
+create_ways_data_query = """
+CREATE TABLE IF NOT EXISTS ways_data (
+    id INTEGER PRIMARY KEY NOT NULL,
+    uid INTEGER,
+    version TEXT,
+    changeset INTEGER,
+    timestamp TEXT
+);
+"""
+
+create_data_queries = {'nodes': create_nodes_data_query,
+                       'relations': create_relations_data_query,
+                       'ways': create_ways_data_query}
+
+# The user of an element is stored by its uid, the first user name of a uid
+# is kept
+create_element_view_query = """
+CREATE VIEW IF NOT EXISTS {table} AS
+SELECT {columns}
+FROM {table}_data LEFT JOIN users ON users.uid = {table}_data.uid;
+"""
+
+create_element_insert_trigger_query = """
+CREATE TRIGGER IF NOT EXISTS {table}_insert INSTEAD OF INSERT ON {table}
+BEGIN
+    INSERT OR IGNORE INTO users (uid, user)
+    SELECT NEW.uid, NEW.user WHERE NEW.uid IS NOT NULL AND NEW.uid != '';
+    INSERT INTO {table}_data ({fields}) VALUES ({values});
+END;
+"""
+
+create_element_delete_trigger_query = """
+CREATE TRIGGER IF NOT EXISTS {table}_delete INSTEAD OF DELETE ON {table}
+BEGIN
+    DELETE FROM {table}_data WHERE id = OLD.id;
+END;
+"""
+
+# The tags are stored in primary key order without rowid, so the tags of an
+# element are found without an index
+create_tags_data_query = """
+CREATE TABLE IF NOT EXISTS {table}_data (
+    id INTEGER NOT NULL,
+    type_id INTEGER NOT NULL,
+    key_id INTEGER NOT NULL,
+    value TEXT,
+    PRIMARY KEY (id, type_id, key_id)
+) WITHOUT ROWID;
+"""
+
+create_tags_view_query = """
+CREATE VIEW IF NOT EXISTS {table} AS
+SELECT {table}_data.id AS id, tag_keys.key AS key, {table}_data.value AS value,
+       tag_types.type AS type
+FROM {table}_data
+JOIN tag_keys ON tag_keys.key_id = {table}_data.key_id
+JOIN tag_types ON tag_types.type_id = {table}_data.type_id;
+"""
+
+create_tags_insert_trigger_query = """
+CREATE TRIGGER IF NOT EXISTS {table}_insert INSTEAD OF INSERT ON {table}
+BEGIN
+    INSERT OR IGNORE INTO tag_keys (key) VALUES (NEW.key);
+    INSERT OR IGNORE INTO tag_types (type) VALUES (NEW.type);
+    INSERT INTO {table}_data (id, type_id, key_id, value)
+    VALUES (NEW.id,
+            (SELECT type_id FROM tag_types WHERE type = NEW.type),
+            (SELECT key_id FROM tag_keys WHERE key = NEW.key),
+            NEW.value);
+END;
+"""
+
+create_tags_delete_trigger_query = """
+CREATE TRIGGER IF NOT EXISTS {table}_delete INSTEAD OF DELETE ON {table}
+BEGIN
+    DELETE FROM {table}_data 
+    WHERE id = OLD.id
+      AND type_id = (SELECT type_id FROM tag_types WHERE type = OLD.type)
+      AND key_id = (SELECT key_id FROM tag_keys WHERE key = OLD.key);
+END;
+"""
+
+# Packed way node lists (osmv.PACK_WAY_NODES): the node ids of each way are
+# packed into one blob (see osm_packed), and ways_nodes is a view that expands
+# the blobs into rows. Reading the rows through the view is slow, the node ids
+# of a way are read with osm_packed.get_way_nodes.
+create_ways_nodes_packed_query = """
+CREATE TABLE IF NOT EXISTS ways_nodes_packed (
+    id INTEGER PRIMARY KEY NOT NULL,
+    node_ids BLOB NOT NULL,
+    FOREIGN KEY (id) REFERENCES ways(id)
+);
+"""
+
+# Value of the byte of the blob at the position i of its hex string h
+byte_value = ("(instr('0123456789ABCDEF', substr(h, {i}, 1)) * 16 "
+              "+ instr('0123456789ABCDEF', substr(h, {i} + 1, 1)) - 17)")
+# Zigzag decoded value of the varint that ends with the byte b
+zigzag_value = ("CASE WHEN (value + b * shift) & 1 THEN -((value + b * shift + 1) >> 1) "
+                "ELSE (value + b * shift) >> 1 END")
+
+# Each step of the recursion reads the byte b of a blob, and adds it to the 
+# varint value, or decodes the next node id if it is the last byte of the varint
+create_ways_nodes_view_query = """
+CREATE VIEW IF NOT EXISTS ways_nodes AS
+WITH RECURSIVE packed (id, h, i, b, value, shift, node_id, position, done) AS (
+    SELECT id, h, 1, {first_byte}, 0, 1, 0, -1, 0
+    FROM (SELECT id, hex(node_ids) AS h FROM ways_nodes_packed)
+    UNION ALL
+    SELECT id, h, i + 2, {next_byte},
+           CASE WHEN b < 128 THEN 0 ELSE value + (b - 128) * shift END,
+           CASE WHEN b < 128 THEN 1 ELSE shift * 128 END,
+           CASE WHEN b < 128 THEN node_id + {zigzag} ELSE node_id END,
+           position + (b < 128),
+           b < 128
+    FROM packed WHERE i <= length(h)
+)
+SELECT id, node_id, position FROM packed WHERE done;
+""".format(first_byte=byte_value.format(i=1), next_byte=byte_value.format(i='i + 2'),
+           zigzag=zigzag_value)
+
+# Indexes created after the rows are inserted
+create_indexes_queries = [
+    "CREATE INDEX IF NOT EXISTS relations_nodes_id ON relations_nodes (id);",
+    "CREATE INDEX IF NOT EXISTS relations_relations_id ON relations_relations (id);",
+    "CREATE INDEX IF NOT EXISTS relations_ways_id ON relations_ways (id);",
+]
+# Not created with packed way node lists
+create_ways_nodes_indexes_queries = [
+    "CREATE INDEX IF NOT EXISTS ways_nodes_id ON ways_nodes (id);",
+    "CREATE INDEX IF NOT EXISTS ways_nodes_node_id ON ways_nodes (node_id);",
+]
+# Not created with the compact schema, its tag tables are ordered by id
+create_tags_indexes_queries = [
+    "CREATE INDEX IF NOT EXISTS nodes_tags_id ON nodes_tags (id);",
+    "CREATE INDEX IF NOT EXISTS relations_tags_id ON relations_tags (id);",
+    "CREATE INDEX IF NOT EXISTS ways_tags_id ON ways_tags (id);",
+]
+
+insert_nodes_query = """
+INSERT INTO nodes (id, lat, lon, user, uid, version, changeset, timestamp)
+VALUES (:id, :lat, :lon, :user, :uid, :version, :changeset, :timestamp)
+"""
+insert_nodes_tags_query = """
+INSERT INTO nodes_tags (id, key, value, type)
+VALUES (:id, :key, :value, :type)
+"""
+insert_relations_query = """
+INSERT INTO relations (id, user, uid, version, changeset, timestamp)
+VALUES (:id, :user, :uid, :version, :changeset, :timestamp)
+"""
+insert_relations_nodes_query = """
+INSERT INTO relations_nodes (id, node_id, position, role)
+VALUES (:id, :node_id, :position, :role)
+"""
+insert_relations_relations_query = """
+INSERT INTO relations_relations (id, relation_id, position, role)
+VALUES (:id, :relation_id, :position, :role)
+"""
+insert_relations_tags_query = """
+INSERT INTO relations_tags (id, key, value, type)
+VALUES (:id, :key, :value, :type)
+"""
+insert_relations_ways_query = """
+INSERT INTO relations_ways (id, way_id, position, role)
+VALUES (:id, :way_id, :position, :role)
+"""
+insert_ways_query = """
+INSERT INTO ways (id, user, uid, version, changeset, timestamp)
+VALUES (:id, :user, :uid, :version, :changeset, :timestamp)
+"""
+insert_ways_nodes_query = """
+INSERT INTO ways_nodes (id, node_id, position)
+VALUES (:id, :node_id, :position)
+"""
+insert_ways_tags_query = """
+INSERT INTO ways_tags (id, key, value, type)
+VALUES (:id, :key, :value, :type)
+"""
+
+def get_compact_queries():
+    """
+    Get the queries that create the compact schema: the dictionary tables, 
+    the tables of the encoded rows with their views and triggers, and the 
+    member tables
+    """
+    queries = [create_users_query, create_tag_keys_query, create_tag_types_query]
+    for table, fields, query in zip(tables, osmv.csv_fields, create_tables_queries):
+        if table in create_data_queries:
+            data_fields = [field for field in fields if field != 'user']
+            columns = ['users.user AS user' if field == 'user' else
+                       '{0}_data.{1} AS {1}'.format(table, field) for field in fields]
+            queries.append(create_data_queries[table])
+            queries.append(create_element_view_query.format(
+                table=table, columns=', '.join(columns)))
+            queries.append(create_element_insert_trigger_query.format(
+                table=table, fields=', '.join(data_fields), 
+                values=', '.join('NEW.' + field for field in data_fields)))
+            queries.append(create_element_delete_trigger_query.format(table=table))
+        elif table.endswith('_tags'):
+            for tags_query in (create_tags_data_query, create_tags_view_query,
+                               create_tags_insert_trigger_query, 
+                               create_tags_delete_trigger_query):
+                queries.append(tags_query.format(table=table))
+        else:
+            queries.append(query)
+    return queries
+
+def create_tables(db_path=osmv.DB_PATH, compact=osmv.COMPACT_DB, 
+                  packed=osmv.PACK_WAY_NODES):
+    """
+    Create database tables for each csv file
+    Args:
+        db_path: database file path
+        compact: create the compact schema, see get_compact_queries
+        packed: pack the node lists of the ways, see osm_packed
+    """
+    queries = get_compact_queries() if compact else list(create_tables_queries)
+    if packed:
+        i = queries.index(create_ways_nodes_query)
+        queries[i:i + 1] = [create_ways_nodes_packed_query, create_ways_nodes_view_query]
+    with sq3.connect(db_path) as con:
+        cur = con.cursor()
+        for query in queries:
+            cur.execute(query)
+        cur.execute(create_load_progress_query)
+        con.commit()
+
+def create_indexes(db_path=osmv.DB_PATH, compact=osmv.COMPACT_DB, 
+                   packed=osmv.PACK_WAY_NODES):
+    """
+    Create the indexes of the tables, after the rows are inserted
+    """
+    queries = list(create_indexes_queries)
+    if not packed:
+        queries += create_ways_nodes_indexes_queries
+    if not compact:
+        queries += create_tags_indexes_queries
+    with sq3.connect(db_path) as con:
+        cur = con.cursor()
+        for query in queries:
+            cur.execute(query)
+        con.commit()
+
+def get_insert_query(table, fields):
+    """
+    Get the query that inserts a row of values in the order of fields
+    """
+    return "INSERT INTO {} ({}) VALUES ({})".format(
+        table, ', '.join(fields), ', '.join('?' * len(fields)))
+
+def connect(db_path=osmv.DB_PATH):
+    """
+    Connect to a new database to insert rows into, the database file is
+    replaced if it exists. The rows are inserted in a single transaction, 
+    which is committed by the caller.
+    Returns:
+        sqlite3 connection
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    create_tables(db_path)
+    con = sq3.connect(db_path)
+    # Insert the utf-8 strings of the shaped rows without decoding them
+    con.text_factory = str
+    # A failed build is simply run again, so nothing is synced to the disk
+    con.execute("PRAGMA synchronous = OFF")
+    con.execute("PRAGMA journal_mode = MEMORY")
+    return con
+
+def get_rows_table(table, packed=osmv.PACK_WAY_NODES):
+    """
+    Get the table to delete the rows of a table from, ways_nodes_packed 
+    instead of the ways_nodes view if the node lists of the ways are packed
+    """
+    return 'ways_nodes_packed' if packed and table == 'ways_nodes' else table
+
+def get_table_writers(cursor, packed=osmv.PACK_WAY_NODES):
+    """
+    Get the writers of the tables, in the same order as osmv.csv_files.
+    Args:
+        cursor: cursor of the database connection
+        packed: write the rows of ways_nodes with osm_packed.PackedWayNodesWriter
+    Returns:
+        list of TableWriter (or PackedWayNodesWriter) objects
+    """
+    writers = []
+    for table, fields in zip(tables, osmv.csv_fields):
+        if packed and table == 'ways_nodes':
+            writers.append(osm_packed.PackedWayNodesWriter(cursor))
+        else:
+            writers.append(TableWriter(cursor, table, fields))
+    return writers
+
+class TableWriter(object):
+    """
+    Insert rows into a database table, with the writerows method of 
+    csv.writer so that write_csvs can write its rows to the database.
+    Args:
+        cursor: cursor of the database connection
+        table: table name
+        fields: fields of the values of each row
+    """
+    def __init__(self, cursor, table, fields):
+        self.cursor = cursor
+        self.query = get_insert_query(table, fields)
+        self.count = 0
+
+    def writerows(self, rows):
+        self.cursor.executemany(self.query, rows)
+        self.count += len(rows)
+
+def UnicodeDictReader(utf8_data, **kwargs):
+    csv_reader = csv.DictReader(utf8_data, **kwargs)
+    for row in csv_reader:
+        yield {key: unicode(value, 'utf-8') for key, value in row.iteritems()}
+
+def open_csv(csv_file):
+    """
+    Open a csv file for reading, a .csv.gz file is decompressed in the 
+    background while it is read
+    """
+    if csv_file.endswith('.gz'):
+        return osm_compressed.open_gzip(csv_file)
+    return open(csv_file, 'rb')
+
+def is_imported(table, csv_file):
+    """
+    Check whether the csv file was imported into the table, and has not 
+    changed since
+    """
+    with sq3.connect(osmv.DB_PATH) as conn:
+        row = conn.execute("SELECT csv_file, size, mtime FROM load_progress "
+                           "WHERE table_name = ?", (table,)).fetchone()
+    size, mtime = osm_index.get_file_stat(csv_file)
+    return row is not None and tuple(row) == (os.path.abspath(csv_file), size, mtime)
+
+def import_csv(csv_file, query, table=None, packed=osmv.PACK_WAY_NODES):
+    """
+    Import the .csv (or .csv.gz) file into the corresponding database table.
+    If table is set, the import is recorded in load_progress in the same 
+    transaction as the rows, and the table is skipped if the csv file was
+    already imported. If the import stops, its transaction is rolled back, 
+    so the table is imported again when load_db runs again. If packed is 
+    True, the rows of ways_nodes are packed into ways_nodes_packed.
+    The rows are counted in the import_csv stage, and the import of the table
+    in its import_<table> stage (see osm_stats).
+    Returns:
+        True if the csv file was imported, False if it was skipped
+    """        
+    if table is not None and is_imported(table, csv_file):
+        return False
+    size, mtime = osm_index.get_file_stat(csv_file)
+    stage = osm_stats.get_stage('import_csv')
+    start, count = osm_stats.timer(), stage.elements
+    csvfile = open_csv(csv_file)
+    try:
+        csv_reader = osm_stats.counted('import_csv', UnicodeDictReader(csvfile), 'rows')
+        with sq3.connect(osmv.DB_PATH) as conn:
+            cur = conn.cursor()
+            if table is not None:
+                # Rows of a csv file imported before, that has changed since
+                cur.execute("DELETE FROM {}".format(get_rows_table(table, packed)))
+            if packed and table == 'ways_nodes':
+                fields = itemgetter(*osmv.WAY_NODES_FIELDS)
+                osm_packed.PackedWayNodesWriter(cur).writerows(
+                    fields(row) for row in csv_reader)
+            else:
+                cur.executemany(query, csv_reader)
+            if table is not None:
+                cur.execute("INSERT OR REPLACE INTO load_progress VALUES (?, ?, ?, ?)",
+                            (table, os.path.abspath(csv_file), size, mtime))
+    finally:
+        csvfile.close()
+    seconds, count = osm_stats.timer() - start, stage.elements - count
+    stage.add(seconds, 0)
+    if table is not None:
+        osm_stats.add('import_' + table, seconds, count)
+    return True
+        
+if __name__ == '__main__':
+    osm_stats.start()
+    csv_paths = osmf.get_csv_paths(osmv.COMPRESS_CSVS)
+    insert_queries = [insert_nodes_query, insert_nodes_tags_query, 
+                      insert_relations_query, insert_relations_nodes_query,
+                      insert_relations_relations_query, insert_relations_tags_query,
+                      insert_relations_ways_query, insert_ways_query,
+                      insert_ways_nodes_query, insert_ways_tags_query]
+    create_tables()
+    print "Tables Created"
+    for csv_path, query, table in zip(csv_paths, insert_queries, tables):
+        if import_csv(csv_path, query, table):
+            print "Done inserting " + table
+        else:
+            print "Skipped {}, {} is already imported".format(table, csv_path)
+    start = osm_stats.timer()
+    create_indexes()
+    osm_stats.add('create_indexes', osm_stats.timer() - start, 0)
+    print "Indexes Created"
+    print ''
+    osm_stats.display()
+    report = osm_stats.save_report('load_db', db_path=osmv.DB_PATH, 
+                                   csv_files=csv_paths)
+    if report:
+        print ''
+        print 'Run report: ' + report
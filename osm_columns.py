@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar binary export of the numeric columns of nodes and ways_nodes. Each
+column is written to a .npy file (e.g. columns/nodes.lat.npy) while the rows
+are written to the csvs, so the columns can be loaded with numpy.load and
+memory mapping instead of parsing the csvs. The .npy files are written with
+the struct module as little endian 64 bit values on every platform, numpy is
+only needed to load them.
+"""
+import os
+import shutil
+import struct
+import osm_compressed
+import osm_variables as osmv
+
+# Columns of each table: (field, struct format character of the values)
+COLUMNS = {'nodes': [('id', 'q'), ('lat', 'd'), ('lon', 'd')],
+           'ways_nodes': [('id', 'q'), ('node_id', 'q'), ('position', 'q')]}
+# Table of each csv file with columns
+TABLES = {osmv.NODES_PATH: 'nodes', osmv.WAY_NODES_PATH: 'ways_nodes'}
+# The .npy header is padded to a fixed size, so it can be written again with
+# the final shape once all the values are written
+HEADER_SIZE = 128
+NPY_MAGIC = '\x93NUMPY\x01\x00'
+# Number of values buffered before they are written to a column file
+BUFFER_SIZE = 2**16
+
+def get_itemsize(typecode):
+    """Get the size in bytes of a value of a struct format character"""
+    return struct.calcsize('<' + typecode)
+
+def get_descr(typecode):
+    """Get the numpy dtype description of a struct format character"""
+    kind = 'f' if typecode == 'd' else 'i'
+    return '<{}{}'.format(kind, get_itemsize(typecode))
+
+def npy_header(typecode, count):
+    """
+    Get the .npy header of a one dimensional array, padded to HEADER_SIZE.
+    Args:
+        typecode: struct format character of the values
+        count: number of values
+    """
+    header = "{{'descr': '{}', 'fortran_order': False, 'shape': ({},), }}".format(
+        get_descr(typecode), count)
+    size = HEADER_SIZE - len(NPY_MAGIC) - 2
+    return NPY_MAGIC + struct.pack('<H', size) + header.ljust(size - 1) + '\n'
+
+def column_path(columns_dir, table, field):
+    """Get the path of the .npy file of a column"""
+    return os.path.join(columns_dir, '{}.{}.npy'.format(table, field))
+
+def to_float(value):
+    """Convert a csv value to float, missing values are NaN"""
+    return float(value) if value is not None and value != '' else float('nan')
+
+class NpyWriter(object):
+    """
+    Write values to a .npy file of one column.
+    Args:
+        path: .npy file path
+        typecode: struct format character of the values
+        position: if set, append to the file after truncating it to this
+                  position (see tell)
+    """
+    def __init__(self, path, typecode, position=None):
+        self.path = path
+        self.typecode = typecode
+        self.convert = to_float if typecode == 'd' else int
+        self.values = []
+        self.f = osm_compressed.open_at(path, position)
+        if position is None:
+            self.count = 0
+            self.f.write(npy_header(typecode, 0))
+        else:
+            self.count = (position - HEADER_SIZE) // get_itemsize(typecode)
+
+    def extend(self, values):
+        self.values.extend(map(self.convert, values))
+        if len(self.values) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.count += len(self.values)
+        self.f.write(struct.pack('<{}{}'.format(len(self.values), self.typecode),
+                                 *self.values))
+        self.values = []
+        self.f.flush()
+
+    def tell(self):
+        """Get the position of the end of the written values, see flush"""
+        return self.f.tell()
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        """Write the remaining values and the final header"""
+        self.flush()
+        self.f.seek(0)
+        self.f.write(npy_header(self.typecode, self.count))
+        self.f.close()
+
+class ColumnWriter(object):
+    """
+    Write the rows of a table to the .npy files of its columns, with the
+    writerows method of csv.writer.
+    Args:
+        columns_dir: directory of the .npy files
+        table: table name, a key of COLUMNS
+        fields: fields of the values of each row
+        positions: dict of the positions to resume the .npy files at, by path
+    """
+    def __init__(self, columns_dir, table, fields, positions=None):
+        positions = positions or {}
+        self.indexes = [fields.index(field) for field, _ in COLUMNS[table]]
+        self.writers = []
+        for field, typecode in COLUMNS[table]:
+            path = column_path(columns_dir, table, field)
+            self.writers.append(NpyWriter(path, typecode, positions.get(path)))
+
+    def writerows(self, rows):
+        if not rows:
+            return
+        values = zip(*rows)
+        for i, writer in zip(self.indexes, self.writers):
+            writer.extend(values[i])
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+class TeeWriter(object):
+    """Write rows with several writers"""
+    def __init__(self, writers):
+        self.writers = writers
+
+    def writerows(self, rows):
+        for writer in self.writers:
+            writer.writerows(rows)
+
+def add_column_writers(writers, columns_dir, positions=None):
+    """
+    Write the rows of the tables with columns to their .npy files too.
+    Args:
+        writers: writers of the tables, in the same order as osmv.csv_files
+        columns_dir: directory of the .npy files, created if needed
+        positions: dict of the positions to resume the .npy files at, by path
+    Returns:
+        list of writers, and list of ColumnWriter to close
+    """
+    if not os.path.isdir(columns_dir):
+        os.makedirs(columns_dir)
+    writers = list(writers)
+    column_writers = []
+    for i, path in enumerate(osmv.csv_files):
+        if path in TABLES:
+            column_writer = ColumnWriter(columns_dir, TABLES[path], 
+                                         osmv.csv_fields[i], positions)
+            column_writers.append(column_writer)
+            writers[i] = TeeWriter([writers[i], column_writer])
+    return writers, column_writers
+
+def merge_columns(shard_dirs, columns_dir):
+    """
+    Concatenate the column files of the chunks of a file in order, and
+    remove the shard directories.
+    Args:
+        shard_dirs: list of the column directories of each chunk, in file order
+        columns_dir: directory of the merged .npy files
+    """
+    if not os.path.isdir(columns_dir):
+        os.makedirs(columns_dir)
+    for table, columns in COLUMNS.items():
+        for field, typecode in columns:
+            paths = [column_path(d, table, field) for d in shard_dirs]
+            size = sum(os.path.getsize(p) - HEADER_SIZE for p in paths)
+            count = size // get_itemsize(typecode)
+            with open(column_path(columns_dir, table, field), 'wb') as f:
+                f.write(npy_header(typecode, count))
+                for path in paths:
+                    with open(path, 'rb') as shard:
+                        shard.seek(HEADER_SIZE)
+                        shutil.copyfileobj(shard, f, 2**20)
+    for d in shard_dirs:
+        shutil.rmtree(d)
+
+def load_columns(table, columns_dir=osmv.COLUMNS_PATH, mmap_mode='r'):
+    """
+    Load the columns of a table with numpy.
+    Args:
+        table: 'nodes' or 'ways_nodes'
+        columns_dir: directory of the .npy files
+        mmap_mode: memory mapping mode of numpy.load, None to read the arrays
+                   into memory
+    Returns:
+        dict of numpy arrays by field, e.g. pandas.DataFrame(load_columns('nodes'))
+    """
+    import numpy as np
+    return dict((field, np.load(column_path(columns_dir, table, field), mmap_mode=mmap_mode))
+                for field, _ in COLUMNS[table])
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+Read compressed osm files (.osm.bz2 and .osm.gz) as a stream. The file is
+decompressed in a background thread while it is being parsed, and the streams
+of a multi-stream bz2 file (e.g. compressed with pbzip2) are decompressed in
+parallel in a pool of processes. Write gzip files (e.g. the csvs of 
+write_csvs) whose blocks are compressed in parallel in a pool of threads.
+"""
+import bz2
+import collections
+import mmap
+import multiprocessing
+import multiprocessing.pool
+import os
+import Queue
+import re
+import threading
+import osm_variables as osmv
+import zlib
+
+# Magic bytes at the start of a bz2 stream: 'BZh', block size, block magic
+bz2_stream_re = re.compile(r'BZh[1-9]1AY&SY')
+
+class StreamReader(object):
+    """
+    Read-only file object over decompressed data that is produced in a
+    background thread. The thread stays at most maxsize chunks ahead of the
+    reader.
+    Args:
+        chunks: iterable of decompressed data chunks
+        maxsize: number of chunks to decompress ahead
+    """
+    def __init__(self, chunks, maxsize=16):
+        self.queue = Queue.Queue(maxsize)
+        self.buffer = ''
+        self.pos = 0
+        self.done = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._produce, args=(chunks,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _produce(self, chunks):
+        try:
+            for chunk in chunks:
+                if not self._put(chunk):
+                    return
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def read(self, size=-1):
+        while not self.done and (size < 0 or len(self.buffer) - self.pos < size):
+            chunk = self.queue.get()
+            if chunk is None:
+                self.done = True
+            elif isinstance(chunk, Exception):
+                self.done = True
+                raise chunk
+            else:
+                self.buffer = self.buffer[self.pos:] + chunk
+                self.pos = 0
+        if size < 0:
+            size = len(self.buffer) - self.pos
+        data = self.buffer[self.pos:self.pos + size]
+        self.pos += len(data)
+        return data
+
+    def __iter__(self):
+        """Iterate over the lines of the data, e.g. for csv.reader"""
+        rest = ''
+        while True:
+            data = self.read(2**20)
+            if not data:
+                break
+            lines = (rest + data).split('\n')
+            rest = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        if rest:
+            yield rest
+
+    def close(self):
+        self.stopped.set()
+
+def gzip_chunks(path, buffer_size=2**20):
+    """
+    Yield the decompressed data of a gzip file, including every member of a
+    multi-member file.
+    Args:
+        path: gzip file path
+        buffer_size: number of compressed bytes read at a time
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(buffer_size)
+            if not data:
+                break
+            while data:
+                yield decompressor.decompress(data)
+                # Start a new decompressor at the start of the next member
+                data = decompressor.unused_data
+                if data:
+                    yield decompressor.flush()
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        yield decompressor.flush()
+
+def bz2_chunks(path, start=0, end=None, buffer_size=2**20):
+    """
+    Yield the decompressed data of a byte range of a bz2 file, including every
+    stream of a multi-stream file.
+    Args:
+        path: bz2 file path
+        start: offset of the first stream of the range
+        end: offset after the last stream of the range, the end of the file
+             if None
+        buffer_size: number of compressed bytes read at a time
+    """
+    decompressor = bz2.BZ2Decompressor()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start if end is not None else -1
+        while remaining != 0:
+            size = buffer_size if remaining < 0 else min(buffer_size, remaining)
+            data = f.read(size)
+            if not data:
+                break
+            remaining -= len(data)
+            while data:
+                try:
+                    chunk = decompressor.decompress(data)
+                except EOFError:
+                    # The previous stream ended at the end of the last read
+                    decompressor = bz2.BZ2Decompressor()
+                    continue
+                yield chunk
+                # Start a new decompressor at the start of the next stream
+                data = decompressor.unused_data
+                if data:
+                    decompressor = bz2.BZ2Decompressor()
+
+def decompress_bz2_range(args):
+    """
+    Decompress a byte range of a bz2 file. Used by the worker processes of
+    parallel_bz2_chunks.
+    Args:
+        args: (bz2 file path, start offset, end offset)
+    """
+    path, start, end = args
+    return ''.join(bz2_chunks(path, start, end))
+
+def find_bz2_streams(path, min_size=2**20):
+    """
+    Split a bz2 file into byte ranges that start at bz2 streams.
+    Args:
+        path: bz2 file path
+        min_size: minimum number of compressed bytes of a range
+    Returns:
+        list of (start, end) byte offsets, in file order
+    """
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            size = len(data)
+            starts = [0]
+            p = bz2_stream_re.search(data, min_size)
+            while p:
+                starts.append(p.start())
+                p = bz2_stream_re.search(data, p.start() + min_size)
+        finally:
+            data.close()
+    return zip(starts, starts[1:] + [size])
+
+def parallel_bz2_chunks(path, ranges, pool, processes):
+    """
+    Yield the decompressed data of a multi-stream bz2 file, decompressing
+    ranges of streams in a pool of processes. At most two ranges per process
+    are decompressed ahead of the reader. The pool is terminated at the end.
+    Args:
+        path: bz2 file path
+        ranges: byte ranges of the streams, see find_bz2_streams
+        pool: multiprocessing.Pool, created by the caller
+        processes: number of processes of the pool
+    """
+    try:
+        pending = collections.deque()
+        for start, end in ranges:
+            pending.append(pool.apply_async(decompress_bz2_range,
+                                            ((path, start, end),)))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def open_bz2(path, processes=1):
+    """
+    Open a bz2 file as a stream of decompressed data. A multi-stream file is
+    decompressed in a pool of processes if processes is more than 1, else the
+    file is decompressed in a background thread.
+    """
+    if processes > 1:
+        ranges = find_bz2_streams(path)
+        if len(ranges) > 1:
+            # The pool is created in the calling thread, forking from the
+            # background thread of StreamReader could copy locks held by 
+            # other threads into the worker processes
+            pool = multiprocessing.Pool(processes)
+            return StreamReader(parallel_bz2_chunks(path, ranges, pool, processes),
+                                maxsize=2)
+    return StreamReader(bz2_chunks(path))
+
+def open_gzip(path):
+    """Open a gzip file as a stream of decompressed data"""
+    return StreamReader(gzip_chunks(path))
+
+def open_at(path, position=None, buffering=-1):
+    """
+    Open a file for writing. If position is set, the file is truncated to
+    position and the data is appended to it, else the file is created.
+    """
+    if position is None:
+        return open(path, 'wb', buffering)
+    f = open(path, 'r+b', buffering)
+    f.truncate(position)
+    f.seek(position)
+    return f
+
+def gzip_block(data, level=6):
+    """
+    Compress data into a complete gzip member. The members of a gzip file
+    can be compressed independently and concatenated.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+_thread_pool = None
+_thread_pool_pid = None
+
+def get_thread_pool():
+    """
+    Get the pool of threads that compresses the gzip blocks. A forked process
+    (e.g. a worker of write_csvs.process_map) inherits a copy of the pool 
+    without its threads, so each process creates its own pool.
+    """
+    global _thread_pool, _thread_pool_pid
+    if _thread_pool is None or _thread_pool_pid != os.getpid():
+        _thread_pool = multiprocessing.pool.ThreadPool(osmv.COMPRESS_THREADS)
+        _thread_pool_pid = os.getpid()
+    return _thread_pool
+
+class GzipWriter(object):
+    """
+    Write-only file object that writes a gzip file. The data is split into
+    blocks that are compressed as independent gzip members in a pool of 
+    threads (zlib releases the GIL while it compresses), and the members are
+    written in order. At most two blocks per thread are compressed ahead of 
+    the file.
+    Args:
+        path: gzip file path
+        block_size: number of uncompressed bytes in a block
+        level: compression level
+        position: if set, append to the file after truncating it to this 
+                  position, which must be the end of a gzip member (see tell)
+    """
+    def __init__(self, path, block_size=2**20, level=6, position=None):
+        self.file = open_at(path, position)
+        self.block_size = block_size
+        self.level = level
+        self.buffer = []
+        self.size = 0
+        self.pending = collections.deque()
+        self.pool = get_thread_pool()
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.size += len(data)
+        if self.size >= self.block_size:
+            self._compress()
+
+    def _compress(self):
+        """Send the buffered data to be compressed as a block"""
+        if self.buffer:
+            self.pending.append(self.pool.apply_async(
+                gzip_block, (''.join(self.buffer), self.level)))
+            self.buffer = []
+            self.size = 0
+        while len(self.pending) > osmv.COMPRESS_THREADS * 2:
+            self.file.write(self.pending.popleft().get())
+
+    def flush(self):
+        """Compress the buffered data, and write every block to the file"""
+        self._compress()
+        while self.pending:
+            self.file.write(self.pending.popleft().get())
+        self.file.flush()
+
+    def tell(self):
+        """Get the position of the end of the written blocks, see flush"""
+        return self.file.tell()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        """Compress the rest of the data, and write every block"""
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,73 +1,457 @@
-# -*- coding: utf-8 -*-
-"""
-This file contains helper functions to process the OSM files. 
-"""
-import xml.etree.cElementTree as ET
-import os
-
-def get_element(osm_file, tags=('node', 'way', 'relation')):
-    """
-    Yield element if it is the right type of tag
-    """
-    context = ET.iterparse(osm_file, events=('start', 'end'))
-    _, root = next(context)
-    for event, elem in context:
-        if event == 'end' and elem.tag in tags:
-            yield elem
-            root.clear()
-
-def get_element_count(osm_file):
-    """
-    Get the count of node, relation, and way. 
-    Args: 
-        osm_file
-    Returns:
-        the count of node, relation, and way in a dictionary 
-    """
-    elements = {'node': 0, 'relation': 0, 'way': 0}
-    for elem in get_element(osm_file):
-        if elem.tag == 'node':
-            elements['node'] += 1
-        elif elem.tag == 'relation':
-            elements['relation'] += 1
-        else:
-            elements['way'] +=1
-    return elements
-
-def get_file_size(file):
-    """
-    Get a file size in KB, rounded to 1 decimal place
-    Args:
-        file
-    Returns:
-        file size in KB
-    """
-    return round(float(os.path.getsize(file))/1000,1)
-            
-def get_map_bounds(osm_file):
-    """
-    Get osm map boundaries
-    Args:
-        osm_file
-    Returns:
-        minimum and maximum latitude and minimum and maximum longitude in a dictionary
-    """
-    boundaries = None
-    for event, elem in ET.iterparse(osm_file):
-        if elem.tag == "bounds":
-            boundaries= {'Latitude': [elem.attrib['minlat'], elem.attrib['maxlat']], 
-                         'Longitude': [elem.attrib['minlon'], elem.attrib['maxlon']]}            
-        break # we're done
-    return boundaries
-
-def is_street_name(elem):
-    """Check whether an element consist of street address"""
-    return (elem.attrib['k'] == "addr:street")
-
-def is_zipcode(elem):
-    """Check whether an element consist of a zip code"""
-    return (elem.attrib['k'] == "addr:postcode")
-
-def is_city_name(elem):
-    """Check whether an element consist of city name"""
-    return (elem.attrib['k'] == "addr:city")
\ No newline at end of file
+# -*- coding: utf-8 -*-
+"""
+This file contains helper functions to process the OSM files. 
+"""
+import xml.etree.cElementTree as ET
+import xml.parsers.expat as expat
+import mmap
+import json
+import os
+import re
+import sys
+import osm_variables as osmv
+import osm_index
+import osm_compressed
+import osm_pbf
+import osm_stats
+
+def is_plain_file(osm_file):
+    """
+    Check whether an osm file is an uncompressed file on disk, that can be 
+    indexed, memory mapped, and split into chunks
+    """
+    return not hasattr(osm_file, 'read') and osm_file != '-' \
+        and not osm_file.endswith(('.bz2', '.gz', '.pbf'))
+
+def is_pbf_file(osm_file):
+    """Check whether an osm file is a PBF file (.osm.pbf)"""
+    return not hasattr(osm_file, 'read') and osm_file.endswith('.pbf')
+
+def open_osm_file(osm_file):
+    """
+    Open an osm XML file for reading. A .bz2 or .gz file is decompressed in 
+    the background while it is read, and '-' reads the osm file from stdin.
+    PBF files are read by osm_pbf instead.
+    Args:
+        osm_file: osm file path, '-', or file object
+    Returns:
+        file object, or osm_file if it is already a file object
+    """
+    if hasattr(osm_file, 'read'):
+        return osm_file
+    if osm_file == '-':
+        return os.fdopen(os.dup(sys.stdin.fileno()), 'rb')
+    if osm_file.endswith('.bz2'):
+        return osm_compressed.open_bz2(osm_file, osmv.DECOMPRESS_PROCESSES)
+    if osm_file.endswith('.gz'):
+        return osm_compressed.open_gzip(osm_file)
+    return open(osm_file, 'rb')
+
+def get_element(osm_file, tags=('node', 'way', 'relation')):
+    """
+    Yield element if it is the right type of tag. The time it takes to parse
+    the elements is recorded in the get_element stage (see osm_stats).
+    """
+    return osm_stats.timed_iter('get_element', _get_element(osm_file, tags))
+
+def _get_element(osm_file, tags):
+    if is_pbf_file(osm_file):
+        for elem in osm_pbf.get_element(osm_file, tags, osmv.DECOMPRESS_PROCESSES):
+            yield elem
+        return
+    f = open_osm_file(osm_file)
+    try:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event == 'end' and elem.tag in tags:
+                yield elem
+                root.clear()
+    finally:
+        if f is not osm_file:
+            f.close()
+
+class FileRange(object):
+    """
+    Read-only file object over a byte range of an osm file. The range is
+    wrapped in an <osm> root element, so that it can be parsed as an osm file.
+    Args:
+        osm_file: osm file path
+        start: offset of the first byte of the range
+        end: offset after the last byte of the range
+    """
+    def __init__(self, osm_file, start, end):
+        self.file = open(osm_file, 'rb')
+        self.file.seek(start)
+        self.remaining = end - start
+        self.parts = ['<osm>', None, '</osm>']
+
+    def read(self, size=-1):
+        while self.parts:
+            part = self.parts[0]
+            if part is not None:
+                del self.parts[0]
+                return part
+            if size < 0 or size > self.remaining:
+                size = self.remaining
+            data = self.file.read(size)
+            self.remaining -= len(data)
+            if data:
+                return data
+            del self.parts[0]
+            self.file.close()
+        return ''
+
+    def close(self):
+        self.file.close()
+
+def get_chunks(osm_file, n):
+    """
+    Split the osm file into byte ranges that start at top level node, way, or
+    relation elements.
+    Args:
+        osm_file: osm file path
+        n: number of ranges to split the file into
+    Returns:
+        list of (start, end) byte offsets, in file order
+    """
+    # Use the element offsets if the file has a valid index
+    index = osm_index.load_index(osm_file)
+    if index:
+        return index.get_chunks(n)
+    with open(osm_file, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            end = data.rfind('</osm>')
+            offsets = []
+            for i in range(n):
+                p = osmv.element_start_re.search(data, len(data) * i // n, end)
+                if p and (not offsets or p.start() > offsets[-1]):
+                    offsets.append(p.start())
+        finally:
+            data.close()
+    return zip(offsets, offsets[1:] + [end])
+
+def get_elements(osm_file, ids):
+    """
+    Yield the elements with the ids, reading only the bytes of each element 
+    through mmap. The element index of the file is built the first time.
+    Args:
+        osm_file: osm file path
+        ids: iterable of (element type, element id)
+    Yields:
+        element, or None if the element is not in the file
+    """
+    index = osm_index.get_index(osm_file)
+    with open(osm_file, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for element_type, element_id in ids:
+                found = index.find(element_type, element_id)
+                if found:
+                    offset, length = found
+                    yield ET.fromstring(data[offset:offset + length])
+                else:
+                    yield None
+        finally:
+            data.close()
+
+def get_element_by_id(osm_file, element_type, element_id):
+    """
+    Get an element by its type and id, see get_elements.
+    Args:
+        osm_file: osm file path
+        element_type: node, way, or relation
+        element_id: element id
+    Returns:
+        element, or None if the element is not in the file
+    """
+    return next(get_elements(osm_file, [(element_type, element_id)]))
+
+def _decode(s):
+    """
+    Decode a utf-8 string to unicode only if it has non-ascii characters, the 
+    same way ElementTree returns attribute values
+    """
+    try:
+        s.decode('ascii')
+        return s
+    except UnicodeDecodeError:
+        return s.decode('utf-8')
+
+def get_tags(osm_file, is_key=None, tags=('node', 'way', 'relation'),
+             buffer_size=2**20):
+    """
+    Yield the tags of the elements in the osm file without building the 
+    elements. The file is scanned with the expat parser, so no tree and no
+    Element objects are created.
+    Args:
+        osm_file: osm file path or file object
+        is_key: function that checks whether a tag key should be yielded, 
+                every tag is yielded if None
+        tags: types of the elements whose tags are yielded
+        buffer_size: number of bytes fed to the parser at a time
+    Yields:
+        (element type, element id, tag key, tag value)
+    """
+    if is_pbf_file(osm_file):
+        for tag in osm_pbf.get_tags(osm_file, is_key, tags, osmv.DECOMPRESS_PROCESSES):
+            yield tag
+        return
+    found = []
+    parent = [None, None]
+    def start_element(name, attrs):
+        if name == 'tag':
+            if parent[0] is not None:
+                k = attrs['k']
+                if is_key is None or is_key(k):
+                    found.append((parent[0], parent[1], _decode(k), 
+                                  _decode(attrs['v'])))
+        elif name in tags:
+            parent[0] = name
+            parent[1] = attrs['id']
+        elif name in ('node', 'way', 'relation'):
+            parent[0] = None
+    parser = expat.ParserCreate()
+    parser.returns_unicode = False
+    parser.StartElementHandler = start_element
+    f = open_osm_file(osm_file)
+    try:
+        while True:
+            data = f.read(buffer_size)
+            if not data:
+                break
+            parser.Parse(data, False)
+            for tag in found:
+                yield tag
+            del found[:]
+        parser.Parse('', True)
+        for tag in found:
+            yield tag
+    finally:
+        if f is not osm_file:
+            f.close()
+
+def get_tag_values(osm_file, key):
+    """
+    Yield the value of each tag with the key in the osm file. Use the tag 
+    scanner if osmv.USE_TAG_SCANNER is set, else parse the elements.
+    Args:
+        osm_file: osm file path
+        key: tag key (e.g. addr:street)
+    """
+    if osmv.USE_TAG_SCANNER:
+        for _, _, _, v in get_tags(osm_file, key.__eq__):
+            yield v
+    else:
+        for elem in get_element(osm_file):
+            for tag in elem.iter("tag"):
+                if tag.attrib['k'] == key:
+                    yield tag.attrib['v']
+
+def get_element_count(osm_file):
+    """
+    Get the count of node, relation, and way. 
+    Args: 
+        osm_file
+    Returns:
+        the count of node, relation, and way in a dictionary 
+    """
+    elements = {'node': 0, 'relation': 0, 'way': 0}
+    for elem in get_element(osm_file):
+        if elem.tag == 'node':
+            elements['node'] += 1
+        elif elem.tag == 'relation':
+            elements['relation'] += 1
+        else:
+            elements['way'] +=1
+    return elements
+
+def count_elements(osm_file, buffer_size=2**24):
+    """
+    Count node, relation, and way by counting their start tags ('<node ',
+    '<relation ', '<way ') in the raw bytes of the file, without parsing it.
+    Args:
+        osm_file
+        buffer_size: number of bytes read at a time
+    Returns:
+        the count of node, relation, and way in a dictionary
+    """
+    elements = {'node': 0, 'relation': 0, 'way': 0}
+    # PBF files are counted from the decoded blocks
+    if is_pbf_file(osm_file):
+        for block in osm_pbf.get_blocks(osm_file, osmv.DECOMPRESS_PROCESSES):
+            for element in block:
+                elements[element[0]] += 1
+        return elements
+    patterns = dict((t, '<' + t + ' ') for t in elements)
+    tail = ''
+    f = open_osm_file(osm_file)
+    try:
+        while True:
+            data = f.read(buffer_size)
+            if not data:
+                break
+            for t, pattern in patterns.items():
+                # Keep the start tags that are split between two reads
+                elements[t] += (tail[-len(pattern) + 1:] + data).count(pattern)
+            tail = (tail + data)[-16:]
+    finally:
+        if f is not osm_file:
+            f.close()
+    return elements
+
+def _to_str(obj):
+    """Convert the unicode strings loaded from JSON back to str"""
+    if isinstance(obj, dict):
+        return dict((_to_str(k), _to_str(v)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return [_to_str(x) for x in obj]
+    if isinstance(obj, unicode):
+        return obj.encode('utf-8')
+    return obj
+
+def get_file_info(osm_file):
+    """
+    Get the size, the map boundaries, and the element counts of the osm file.
+    The information is cached in a file next to the osm file (.meta), and it
+    is read from the cache until the size or the modification time of the osm
+    file changes.
+    Args:
+        osm_file
+    Returns:
+        dictionary of file size in KB, map boundaries, and element counts
+    """
+    path = osm_file + '.meta'
+    size, mtime = osm_index.get_file_stat(osm_file)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            try:
+                info = _to_str(json.load(f))
+            except ValueError:
+                info = {}
+        if (info.get('bytes'), info.get('mtime')) == (size, mtime):
+            return info
+    info = {'bytes': size,
+            'mtime': mtime,
+            'size': get_file_size(osm_file),
+            'bounds': get_map_bounds(osm_file),
+            'counts': count_elements(osm_file)}
+    with open(path, 'wb') as f:
+        json.dump(info, f)
+    return info
+
+def get_csv_paths(compress=False):
+    """
+    Get the csv file paths, in the same order as osmv.csv_files
+    Args:
+        compress: get the paths of the compressed csvs (.csv.gz) if True
+    """
+    if compress:
+        return [path + '.gz' for path in osmv.csv_files]
+    return list(osmv.csv_files)
+
+def get_file_size(file):
+    """
+    Get a file size in KB, rounded to 1 decimal place
+    Args:
+        file
+    Returns:
+        file size in KB
+    """
+    return round(float(os.path.getsize(file))/1000,1)
+            
+def get_map_bounds(osm_file):
+    """
+    Get osm map boundaries
+    Args:
+        osm_file
+    Returns:
+        minimum and maximum latitude and minimum and maximum longitude in a dictionary
+    """
+    if is_pbf_file(osm_file):
+        return osm_pbf.get_map_bounds(osm_file)
+    boundaries = None
+    f = open_osm_file(osm_file)
+    try:
+        for event, elem in ET.iterparse(f):
+            if elem.tag == "bounds":
+                boundaries= {'Latitude': [elem.attrib['minlat'], elem.attrib['maxlat']], 
+                             'Longitude': [elem.attrib['minlon'], elem.attrib['maxlon']]}            
+            break # we're done
+    finally:
+        if f is not osm_file:
+            f.close()
+    return boundaries
+
+def is_street_name(elem):
+    """Check whether an element consist of street address"""
+    return (elem.attrib['k'] == "addr:street")
+
+def is_zipcode(elem):
+    """Check whether an element consist of a zip code"""
+    return (elem.attrib['k'] == "addr:postcode")
+
+def is_city_name(elem):
+    """Check whether an element consist of city name"""
+    return (elem.attrib['k'] == "addr:city")
+
+class KeyMatcher(object):
+    """
+    Find which keys of a mapping table, or values of a list, are substrings of
+    a string, with a regular expression compiled once from all the keys, so 
+    that the matching cost does not grow with the number of keys.
+    Args:
+        keys: iterable of keys
+        ignore_case: match the lowercase keys in the lowercase string
+    """
+    def __init__(self, keys, ignore_case=False):
+        self.ignore_case = ignore_case
+        self.keys = {}
+        for k in keys:
+            self.keys.setdefault(k.lower() if ignore_case else k, []).append(k)
+        # Longest keys first, so the longest key at a position is matched
+        alternation = '|'.join(re.escape(k) for k in
+                               sorted(self.keys, key=len, reverse=True))
+        self.regex = re.compile(alternation or '(?!)')
+        # A lookahead matches every position, including overlapping keys
+        self.all_regex = re.compile('(?=(' + (alternation or '(?!)') + '))')
+        # Shorter keys that are prefixes of a key, found at the same position
+        self.prefixes = dict((k, [k[:i] for i in range(1, len(k)) if k[:i] in self.keys])
+                             for k in self.keys)
+
+    def search(self, s):
+        """Check whether any key is in the string"""
+        if self.ignore_case:
+            s = s.lower()
+        return self.regex.search(s) is not None
+
+    def find(self, s):
+        """
+        Find the keys that are in the string.
+        Returns:
+            set of keys
+        """
+        if self.ignore_case:
+            s = s.lower()
+        found = set()
+        if not self.regex.search(s):
+            return found
+        for p in self.all_regex.finditer(s):
+            k = p.group(1)
+            if k not in found:
+                found.add(k)
+                found.update(self.prefixes[k])
+        return set(key for k in found for key in self.keys[k])
+
+    def sub(self, s, mapping):
+        """
+        Replace each key in the string by its value in the mapping, in a 
+        single pass, longest keys first. Case sensitive.
+        """
+        return self.regex.sub(lambda p: mapping[p.group()], s)
+
+# Matchers of the mapping keys and the expected values in a string
+city_matcher = KeyMatcher(osmv.CITY_MAPPING)
+city_matcher_ignore_case = KeyMatcher(osmv.CITY_MAPPING, ignore_case=True)
+street_type_matcher = KeyMatcher(osmv.EXPECTED_STREET_TYPES)
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+Byte offset index of the top level elements (node, way, and relation) of an
+osm file. The index is stored in a sidecar file next to the osm file
+(e.g. dallas_sample.osm.idx), and it is rebuilt when the size or the
+modification time of the osm file changes. The ids, offsets and lengths
+are written as little endian 64 bit integers, whatever the platform.
+"""
+import array
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import osm_variables as osmv
+
+ELEMENT_TYPES = ('node', 'way', 'relation')
+INDEX_VERSION = 2
+# Python 2 arrays have no 64 bit type code where 'l' is 32 bits (Windows),
+# the ids (e.g. 4792466424) and the offsets are kept in lists there
+NATIVE_INT64 = array.array('l').itemsize == 8
+# Number of integers packed at a time when the arrays are not native
+PACK_SIZE = 65536
+
+def new_array():
+    """Get an empty array of 64 bit integers"""
+    return array.array('l') if NATIVE_INT64 else []
+
+def write_int64s(f, values):
+    """
+    Write integers as little endian 64 bit integers.
+    Args:
+        f: file object opened in binary mode
+        values: array or list of integers
+    """
+    if NATIVE_INT64 and sys.byteorder == 'little':
+        values.tofile(f)
+        return
+    for i in xrange(0, len(values), PACK_SIZE):
+        block = values[i:i + PACK_SIZE]
+        f.write(struct.pack('<%dq' % len(block), *block))
+
+def read_int64s(f, n):
+    """
+    Read little endian 64 bit integers written by write_int64s.
+    Args:
+        f: file object opened in binary mode
+        n: number of integers
+    Returns:
+        array or list of integers, see new_array
+    """
+    values = new_array()
+    if NATIVE_INT64 and sys.byteorder == 'little':
+        values.fromfile(f, n)
+        return values
+    for i in xrange(0, n, PACK_SIZE):
+        size = min(PACK_SIZE, n - i)
+        values.extend(struct.unpack('<%dq' % size, f.read(8 * size)))
+    return values
+
+def index_path(osm_file):
+    """Get the path of the index file of an osm file"""
+    return osm_file + '.idx'
+
+def get_file_stat(osm_file):
+    """
+    Get the size and the modification time of a file, used to check whether
+    an index or a cache is still valid.
+    """
+    stat = os.stat(osm_file)
+    return stat.st_size, stat.st_mtime
+
+class OsmIndex(object):
+    """
+    Element ids, byte offsets and byte lengths of each element type, in file
+    order.
+    Args:
+        osm_file: osm file path
+        size: osm file size when the index was built
+        mtime: osm file modification time when the index was built
+        ids, offsets, lengths: dicts of arrays by element type
+        is_sorted: dict of whether the ids of each element type are in 
+                   ascending order
+    """
+    def __init__(self, osm_file, size, mtime, ids, offsets, lengths, is_sorted):
+        self.osm_file = osm_file
+        self.size = size
+        self.mtime = mtime
+        self.ids = ids
+        self.offsets = offsets
+        self.lengths = lengths
+        self.is_sorted = is_sorted
+        self.positions = {}
+
+    @classmethod
+    def build(cls, osm_file):
+        """
+        Build the index of an osm file by scanning the raw bytes of the file.
+        Args:
+            osm_file: osm file path
+        Returns:
+            OsmIndex object
+        """
+        size, mtime = get_file_stat(osm_file)
+        ids = dict((t, new_array()) for t in ELEMENT_TYPES)
+        offsets = dict((t, new_array()) for t in ELEMENT_TYPES)
+        lengths = dict((t, new_array()) for t in ELEMENT_TYPES)
+        is_sorted = dict((t, True) for t in ELEMENT_TYPES)
+        with open(osm_file, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                pos = 0
+                while True:
+                    p = osmv.element_re.search(data, pos)
+                    if not p:
+                        break
+                    element_type = p.group(1)
+                    end = p.end()
+                    # Element with children ends with a closing tag
+                    if data[end - 2:end] != '/>':
+                        end = data.find('</' + element_type + '>', end)
+                        if end == -1:
+                            raise ValueError("No closing tag of the {} at byte {} of {}"
+                                             .format(element_type, p.start(), osm_file))
+                        end += len(element_type) + 3
+                    i = osmv.element_id_re.search(data, p.start(), p.end())
+                    element_id = int(i.group(1))
+                    if ids[element_type] and ids[element_type][-1] > element_id:
+                        is_sorted[element_type] = False
+                    ids[element_type].append(element_id)
+                    offsets[element_type].append(p.start())
+                    lengths[element_type].append(end - p.start())
+                    pos = end
+            finally:
+                data.close()
+        return cls(osm_file, size, mtime, ids, offsets, lengths, is_sorted)
+
+    def save(self, path):
+        """
+        Save the index into a file. The first line is a JSON header, followed
+        by the arrays of each element type.
+        Args:
+            path: index file path
+        """
+        header = {'version': INDEX_VERSION,
+                  'size': self.size,
+                  'mtime': self.mtime,
+                  'counts': dict((t, len(self.ids[t])) for t in ELEMENT_TYPES),
+                  'sorted': self.is_sorted}
+        with open(path, 'wb') as f:
+            f.write(json.dumps(header) + '\n')
+            for t in ELEMENT_TYPES:
+                write_int64s(f, self.ids[t])
+                write_int64s(f, self.offsets[t])
+                write_int64s(f, self.lengths[t])
+
+    @classmethod
+    def load(cls, osm_file, path):
+        """
+        Load the index of an osm file from an index file.
+        Args:
+            osm_file: osm file path
+            path: index file path
+        Returns:
+            OsmIndex object, or None if the index file is not valid for the
+            osm file
+        """
+        with open(path, 'rb') as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                return None
+            if header.get('version') != INDEX_VERSION \
+            or (header.get('size'), header.get('mtime')) != get_file_stat(osm_file):
+                return None
+            ids, offsets, lengths = {}, {}, {}
+            for t in ELEMENT_TYPES:
+                n = header['counts'][t]
+                for arrays in (ids, offsets, lengths):
+                    arrays[t] = read_int64s(f, n)
+        return cls(osm_file, header['size'], header['mtime'], ids, offsets, 
+                   lengths, header['sorted'])
+
+    def is_valid(self):
+        """Check whether the osm file has not changed since it was indexed"""
+        return (self.size, self.mtime) == get_file_stat(self.osm_file)
+
+    def find(self, element_type, element_id):
+        """
+        Find the byte range of an element.
+        Args:
+            element_type: node, way, or relation
+            element_id: element id
+        Returns:
+            (offset, length) of the element, or None if it is not in the file
+        """
+        ids = self.ids[element_type]
+        element_id = int(element_id)
+        if self.is_sorted[element_type]:
+            i = bisect.bisect_left(ids, element_id)
+            if i == len(ids) or ids[i] != element_id:
+                return None
+        else:
+            if element_type not in self.positions:
+                self.positions[element_type] = dict((x, i) for i, x in enumerate(ids))
+            i = self.positions[element_type].get(element_id)
+            if i is None:
+                return None
+        return self.offsets[element_type][i], self.lengths[element_type][i]
+
+    def get_end(self, counts=None):
+        """
+        Get the byte offset after the last element of the file, or after the 
+        last of the first elements of each type.
+        Args:
+            counts: dict of the number of elements of each type, None for all
+                    the elements
+        Returns:
+            byte offset, 0 if there is no element
+        """
+        ends = [0]
+        for t in ELEMENT_TYPES:
+            n = len(self.offsets[t]) if counts is None else counts.get(t, 0)
+            if n:
+                ends.append(self.offsets[t][n - 1] + self.lengths[t][n - 1])
+        return max(ends)
+
+    def get_counts(self, offset):
+        """
+        Get the number of elements of each type before a byte offset.
+        Args:
+            offset: byte offset, e.g. the start of a chunk (see get_chunks)
+        Returns:
+            dict of the number of elements by element type
+        """
+        return dict((t, bisect.bisect_left(self.offsets[t], offset))
+                    for t in ELEMENT_TYPES)
+
+    def get_chunks(self, n):
+        """
+        Split the osm file into byte ranges that start at top level elements,
+        using the element offsets instead of searching the file.
+        Args:
+            n: number of ranges to split the file into
+        Returns:
+            list of (start, end) byte offsets, in file order
+        """
+        end = max([self.offsets[t][-1] + self.lengths[t][-1]
+                   for t in ELEMENT_TYPES if self.offsets[t]] or [0])
+        starts = []
+        for i in range(n):
+            target = self.size * i // n
+            candidates = []
+            for t in ELEMENT_TYPES:
+                j = bisect.bisect_left(self.offsets[t], target)
+                if j < len(self.offsets[t]):
+                    candidates.append(self.offsets[t][j])
+            if candidates and min(candidates) < end \
+            and (not starts or min(candidates) > starts[-1]):
+                starts.append(min(candidates))
+        return zip(starts, starts[1:] + [end])
+
+def get_index(osm_file, rebuild=False):
+    """
+    Get the index of an osm file. Load it from the index file if it is still
+    valid, else build the index and save it.
+    Args:
+        osm_file: osm file path
+        rebuild: build the index even if the index file is valid
+    Returns:
+        OsmIndex object
+    """
+    path = index_path(osm_file)
+    index = None
+    if not rebuild and os.path.exists(path):
+        index = OsmIndex.load(osm_file, path)
+    if index is None:
+        index = OsmIndex.build(osm_file)
+        index.save(path)
+    return index
+
+def load_index(osm_file):
+    """
+    Load the index of an osm file without building it.
+    Returns:
+        OsmIndex object, or None if there is no valid index file
+    """
+    path = index_path(osm_file)
+    if os.path.exists(path):
+        return OsmIndex.load(osm_file, path)
+    return None
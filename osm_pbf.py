@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+Read OpenStreetMap PBF files (.osm.pbf) without external libraries. The
+protocol buffer messages are decoded with a small varint reader, and the
+zlib compressed blobs are decoded in parallel in a pool of processes. The
+elements are yielded in the same form as osm_functions.get_element, as XML
+elements with tag, nd, and member children, so they can be shaped, cleaned,
+and audited in the same way.
+"""
+import collections
+import multiprocessing
+import struct
+import time
+import xml.etree.cElementTree as ET
+import zlib
+
+MEMBER_TYPES = ('node', 'way', 'relation')
+
+# ================================================== #
+#               Protocol Buffers                     #
+# ================================================== #
+def read_varint(data, pos):
+    """
+    Read a varint.
+    Args:
+        data: bytearray
+        pos: offset of the varint
+    Returns:
+        value and the offset after the varint
+    """
+    result = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+def to_signed(n):
+    """Convert a varint of an int32 or int64 field to a signed value"""
+    return n - (1 << 64) if n >= (1 << 63) else n
+
+def zigzag(n):
+    """Decode a varint of a sint32 or sint64 field"""
+    return (n >> 1) ^ -(n & 1)
+
+def iter_fields(data):
+    """
+    Yield the fields of a protocol buffer message.
+    Args:
+        data: message bytes
+    Yields:
+        (field number, value), value is an int for a varint field and a
+        bytearray for a length delimited field
+    """
+    if not isinstance(data, bytearray):
+        data = bytearray(data)
+    pos = 0
+    end = len(data)
+    while pos < end:
+        key, pos = read_varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = read_varint(data, pos)
+        elif wire_type == 2:
+            size, pos = read_varint(data, pos)
+            value = data[pos:pos + size]
+            pos += size
+        elif wire_type == 1:
+            value = struct.unpack('<q', str(data[pos:pos + 8]))[0]
+            pos += 8
+        elif wire_type == 5:
+            value = struct.unpack('<i', str(data[pos:pos + 4]))[0]
+            pos += 4
+        else:
+            raise ValueError('Unsupported protocol buffer wire type {}'.format(wire_type))
+        yield field, value
+
+def packed(value):
+    """
+    Decode a packed repeated varint field. A field that is not packed is a
+    single varint.
+    Args:
+        value: field value from iter_fields
+    Returns:
+        list of ints
+    """
+    if isinstance(value, (int, long)):
+        return [value]
+    values = []
+    pos = 0
+    end = len(value)
+    while pos < end:
+        n, pos = read_varint(value, pos)
+        values.append(n)
+    return values
+
+def delta(values):
+    """Decode a delta coded list of sint64 values"""
+    result = []
+    last = 0
+    for n in values:
+        last += zigzag(n)
+        result.append(last)
+    return result
+
+# ================================================== #
+#               OSM PBF Messages                     #
+# ================================================== #
+def decode_string(s):
+    """
+    Decode a utf-8 string to unicode only if it has non-ascii characters, the
+    same way ElementTree returns attribute values
+    """
+    s = str(s)
+    try:
+        s.decode('ascii')
+        return s
+    except UnicodeDecodeError:
+        return s.decode('utf-8')
+
+def format_coordinate(nano):
+    """Format a coordinate in nanodegrees the way it is written in osm XML"""
+    degrees, fraction = divmod(abs(nano), 10**9)
+    s = '{}.{:09d}'.format(degrees, fraction).rstrip('0').rstrip('.')
+    return '-' + s if nano < 0 else s
+
+def format_timestamp(seconds):
+    """Format a timestamp in seconds the way it is written in osm XML"""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seconds))
+
+def read_blobs(f):
+    """
+    Yield the blobs of a PBF file.
+    Args:
+        f: file object
+    Yields:
+        (blob type, blob bytes)
+    """
+    while True:
+        size = f.read(4)
+        if len(size) < 4:
+            return
+        blob_type = None
+        datasize = 0
+        for field, value in iter_fields(f.read(struct.unpack('>I', size)[0])):
+            if field == 1:
+                blob_type = str(value)
+            elif field == 3:
+                datasize = value
+        yield blob_type, f.read(datasize)
+
+def decode_blob(blob):
+    """
+    Get the uncompressed data of a blob.
+    Args:
+        blob: blob bytes
+    Returns:
+        uncompressed bytes
+    """
+    for field, value in iter_fields(blob):
+        if field == 1:
+            return str(value)
+        if field == 3:
+            return zlib.decompress(str(value))
+    raise ValueError('Unsupported PBF blob compression')
+
+def decode_header(data):
+    """
+    Decode the map boundaries of a HeaderBlock.
+    Returns:
+        minimum and maximum latitude and minimum and maximum longitude in a
+        dictionary, or None if the header has no bounding box
+    """
+    for field, value in iter_fields(data):
+        if field == 1:
+            box = dict((f, zigzag(v)) for f, v in iter_fields(value))
+            return {'Latitude': [format_coordinate(box.get(4, 0)),
+                                 format_coordinate(box.get(3, 0))],
+                    'Longitude': [format_coordinate(box.get(1, 0)),
+                                  format_coordinate(box.get(2, 0))]}
+    return None
+
+def decode_info(data, strings, date_granularity):
+    """Decode the Info message of a node, way, or relation into attributes"""
+    attrib = {}
+    for field, value in iter_fields(data):
+        if field == 1:
+            attrib['version'] = str(to_signed(value))
+        elif field == 2:
+            attrib['timestamp'] = format_timestamp(to_signed(value) * date_granularity // 1000)
+        elif field == 3:
+            attrib['changeset'] = str(to_signed(value))
+        elif field == 4:
+            attrib['uid'] = str(to_signed(value))
+        elif field == 5:
+            attrib['user'] = strings[value]
+    return attrib
+
+def decode_tags(keys, vals, strings):
+    """Get the tag children of an element from its key and value ids"""
+    return [('tag', {'k': strings[k], 'v': strings[v]}) for k, v in zip(keys, vals)]
+
+def decode_dense(data, strings, block):
+    """Decode a DenseNodes message into node elements"""
+    ids = lats = lons = keys_vals = []
+    info = {}
+    for field, value in iter_fields(data):
+        if field == 1:
+            ids = delta(packed(value))
+        elif field == 5:
+            info = dict(iter_fields(value))
+        elif field == 8:
+            lats = delta(packed(value))
+        elif field == 9:
+            lons = delta(packed(value))
+        elif field == 10:
+            keys_vals = packed(value)
+    versions = packed(info[1]) if 1 in info else None
+    timestamps = delta(packed(info[2])) if 2 in info else None
+    changesets = delta(packed(info[3])) if 3 in info else None
+    uids = delta(packed(info[4])) if 4 in info else None
+    user_sids = delta(packed(info[5])) if 5 in info else None
+    granularity, lat_offset, lon_offset, date_granularity = block
+    elements = []
+    k = 0
+    for i, node_id in enumerate(ids):
+        attrib = {'id': str(node_id),
+                  'lat': format_coordinate(lat_offset + granularity * lats[i]),
+                  'lon': format_coordinate(lon_offset + granularity * lons[i])}
+        if versions is not None:
+            attrib['version'] = str(to_signed(versions[i]))
+        if timestamps is not None:
+            attrib['timestamp'] = format_timestamp(timestamps[i] * date_granularity // 1000)
+        if changesets is not None:
+            attrib['changeset'] = str(changesets[i])
+        if uids is not None:
+            attrib['uid'] = str(uids[i])
+        if user_sids is not None:
+            attrib['user'] = strings[user_sids[i]]
+        children = []
+        # Keys and values of the node are terminated by 0
+        while k < len(keys_vals) and keys_vals[k] != 0:
+            children.append(('tag', {'k': strings[keys_vals[k]],
+                                     'v': strings[keys_vals[k + 1]]}))
+            k += 2
+        k += 1
+        elements.append(('node', attrib, children))
+    return elements
+
+def decode_node(data, strings, block):
+    """Decode a Node message into a node element"""
+    granularity, lat_offset, lon_offset, date_granularity = block
+    attrib = {}
+    keys = vals = []
+    for field, value in iter_fields(data):
+        if field == 1:
+            attrib['id'] = str(zigzag(value))
+        elif field == 2:
+            keys = packed(value)
+        elif field == 3:
+            vals = packed(value)
+        elif field == 4:
+            attrib.update(decode_info(value, strings, date_granularity))
+        elif field == 8:
+            attrib['lat'] = format_coordinate(lat_offset + granularity * zigzag(value))
+        elif field == 9:
+            attrib['lon'] = format_coordinate(lon_offset + granularity * zigzag(value))
+    return ('node', attrib, decode_tags(keys, vals, strings))
+
+def decode_way(data, strings, block):
+    """Decode a Way message into a way element"""
+    attrib = {}
+    keys = vals = refs = []
+    for field, value in iter_fields(data):
+        if field == 1:
+            attrib['id'] = str(to_signed(value))
+        elif field == 2:
+            keys = packed(value)
+        elif field == 3:
+            vals = packed(value)
+        elif field == 4:
+            attrib.update(decode_info(value, strings, block[3]))
+        elif field == 8:
+            refs = delta(packed(value))
+    children = [('nd', {'ref': str(ref)}) for ref in refs]
+    return ('way', attrib, children + decode_tags(keys, vals, strings))
+
+def decode_relation(data, strings, block):
+    """Decode a Relation message into a relation element"""
+    attrib = {}
+    keys = vals = roles = memids = types = []
+    for field, value in iter_fields(data):
+        if field == 1:
+            attrib['id'] = str(to_signed(value))
+        elif field == 2:
+            keys = packed(value)
+        elif field == 3:
+            vals = packed(value)
+        elif field == 4:
+            attrib.update(decode_info(value, strings, block[3]))
+        elif field == 8:
+            roles = packed(value)
+        elif field == 9:
+            memids = delta(packed(value))
+        elif field == 10:
+            types = packed(value)
+    children = [('member', {'type': MEMBER_TYPES[t], 'ref': str(ref),
+                            'role': strings[role]})
+                for t, ref, role in zip(types, memids, roles)]
+    return ('relation', attrib, children + decode_tags(keys, vals, strings))
+
+def decode_block(blob):
+    """
+    Decode the elements of a PrimitiveBlock blob. Used by the worker processes
+    of get_element.
+    Args:
+        blob: blob bytes
+    Returns:
+        list of (element type, attributes, children), children are
+        (child tag, attributes)
+    """
+    groups = []
+    strings = []
+    granularity, lat_offset, lon_offset, date_granularity = 100, 0, 0, 1000
+    for field, value in iter_fields(decode_blob(blob)):
+        if field == 1:
+            strings = [decode_string(s) for _, s in iter_fields(value)]
+        elif field == 2:
+            groups.append(value)
+        elif field == 17:
+            granularity = to_signed(value)
+        elif field == 18:
+            date_granularity = to_signed(value)
+        elif field == 19:
+            lat_offset = to_signed(value)
+        elif field == 20:
+            lon_offset = to_signed(value)
+    block = (granularity, lat_offset, lon_offset, date_granularity)
+    elements = []
+    for group in groups:
+        for field, value in iter_fields(group):
+            if field == 1:
+                elements.append(decode_node(value, strings, block))
+            elif field == 2:
+                elements.extend(decode_dense(value, strings, block))
+            elif field == 3:
+                elements.append(decode_way(value, strings, block))
+            elif field == 4:
+                elements.append(decode_relation(value, strings, block))
+    return elements
+
+# ================================================== #
+#               Readers                              #
+# ================================================== #
+def get_blocks(pbf_file, processes=1):
+    """
+    Yield the decoded elements of each data block of a PBF file, in file
+    order. If processes is more than 1, the blocks are decoded in a pool of
+    processes, at most two blocks per process ahead of the reader.
+    Args:
+        pbf_file: PBF file path
+        processes: number of processes
+    """
+    with open(pbf_file, 'rb') as f:
+        blobs = (blob for blob_type, blob in read_blobs(f) if blob_type == 'OSMData')
+        if processes <= 1:
+            for blob in blobs:
+                yield decode_block(blob)
+            return
+        pool = multiprocessing.Pool(processes)
+        try:
+            pending = collections.deque()
+            for blob in blobs:
+                pending.append(pool.apply_async(decode_block, (blob,)))
+                if len(pending) >= processes * 2:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            pool.terminate()
+            pool.join()
+
+def get_element(pbf_file, tags=('node', 'way', 'relation'), processes=1):
+    """
+    Yield element if it is the right type of tag, see osm_functions.get_element
+    Args:
+        pbf_file: PBF file path
+        tags: types of the elements to yield
+        processes: number of processes that decode the blocks
+    """
+    for elements in get_blocks(pbf_file, processes):
+        for tag, attrib, children in elements:
+            if tag in tags:
+                elem = ET.Element(tag, attrib)
+                for child_tag, child_attrib in children:
+                    ET.SubElement(elem, child_tag, child_attrib)
+                yield elem
+
+def get_tags(pbf_file, is_key=None, tags=('node', 'way', 'relation'), processes=1):
+    """
+    Yield the tags of the elements without building the elements, see
+    osm_functions.get_tags
+    """
+    for elements in get_blocks(pbf_file, processes):
+        for tag, attrib, children in elements:
+            if tag in tags:
+                for child_tag, child_attrib in children:
+                    if child_tag == 'tag' and (is_key is None or is_key(child_attrib['k'])):
+                        yield tag, attrib['id'], child_attrib['k'], child_attrib['v']
+
+def get_map_bounds(pbf_file):
+    """Get the map boundaries from the header block of a PBF file"""
+    with open(pbf_file, 'rb') as f:
+        for blob_type, blob in read_blobs(f):
+            if blob_type == 'OSMHeader':
+                return decode_header(decode_blob(blob))
+    return None
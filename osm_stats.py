@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Time and throughput of each stage of a run: parsing the elements
+(get_element), cleaning the tag values (the clean_* functions), shaping and
+validating the elements, writing the rows of each table, and importing the
+csv files. Each stage keeps its cumulative time, number of calls, and number
+of elements. A progress line is printed every osmv.PROGRESS_INTERVAL seconds,
+and the statistics of the stages are written to a JSON run report
+(osmv.REPORT_PATH) at the end of the run.
+"""
+import collections
+import datetime
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import time
+import osm_variables as osmv
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak RSS is not recorded
+    resource = None
+
+timer = time.time
+
+class Stage(object):
+    """
+    Cumulative time, number of calls, and number of elements of a stage.
+    Args:
+        name: stage name
+    """
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.elements = 0
+
+    def add(self, seconds, elements=1, calls=1):
+        self.seconds += seconds
+        self.calls += calls
+        self.elements += elements
+
+    def rate(self):
+        """Get the number of elements per second of the stage"""
+        return self.elements / self.seconds if self.seconds else 0.0
+
+    def to_dict(self):
+        return {'name': self.name, 'seconds': self.seconds, 'calls': self.calls,
+                'elements': self.elements, 'elements_per_second': self.rate()}
+
+stages = collections.OrderedDict()
+started = timer()
+last_progress = started
+
+def get_stage(name):
+    """Get the stage of a name, created if needed"""
+    try:
+        return stages[name]
+    except KeyError:
+        stages[name] = Stage(name)
+        return stages[name]
+
+# The main stages are displayed first, in the order of the processing
+for name in ('get_element', 'shape_element', 'validate_element', 'shape_rows', 'clean'):
+    get_stage(name)
+
+def add(name, seconds, elements=1, calls=1):
+    """Add the time and the elements of a call to a stage"""
+    get_stage(name).add(seconds, elements, calls)
+
+def timed(name, func):
+    """
+    Record the time of each call of a function in a stage.
+    Args:
+        name: stage name
+        func: function
+    Returns:
+        function with the same arguments and result
+    """
+    stage = get_stage(name)
+    @functools.wraps(func)
+    def timed_func(*args, **kwargs):
+        start = timer()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stage.add(timer() - start)
+    return timed_func
+
+def timed_iter(name, iterable):
+    """
+    Record the time it takes to get each item of an iterable in a stage,
+    without the time the items are used by the caller.
+    Args:
+        name: stage name
+        iterable: iterable, e.g. a generator of XML elements
+    Returns:
+        iterator of the items
+    """
+    stage = get_stage(name)
+    iterator = iter(iterable)
+    while True:
+        start = timer()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            stage.seconds += timer() - start
+            return
+        # Inline Stage.add, this is called for every element of the file
+        stage.seconds += timer() - start
+        stage.calls += 1
+        stage.elements += 1
+        yield item
+
+def counted(name, iterable, unit='elements'):
+    """
+    Count the items of an iterable in the elements of a stage, and print the
+    progress lines of the stage.
+    Args:
+        name: stage name
+        iterable: iterable, e.g. a csv reader
+        unit: name of the items in the progress lines
+    Returns:
+        iterator of the items
+    """
+    stage = get_stage(name)
+    for item in iterable:
+        stage.elements += 1
+        progress(stage.elements, unit)
+        yield item
+
+class TimedWriter(object):
+    """
+    Record the time each writerows call of a writer takes in a stage, and
+    the number of rows written.
+    Args:
+        name: stage name
+        writer: object with the writerows method of csv.writer
+    """
+    def __init__(self, name, writer):
+        self.stage = get_stage(name)
+        self.writer = writer
+
+    def writerows(self, rows):
+        start = timer()
+        self.writer.writerows(rows)
+        self.stage.add(timer() - start, len(rows))
+
+def timed_writers(writers, tables):
+    """
+    Get the writers of the tables, recording their time in the write_<table>
+    stage of each table.
+    Args:
+        writers: writers of the tables
+        tables: table names, in the same order as writers
+    Returns:
+        list of TimedWriter objects
+    """
+    return [TimedWriter('write_' + table, writer) for writer, table in zip(writers, tables)]
+
+def get_peak_rss():
+    """
+    Get the peak resident set size of this process, and of its terminated
+    child processes (e.g. the processes of a pool).
+    Returns:
+        (this process, children) in KB, 0 if it is not available
+    """
+    if resource is None:
+        return 0, 0
+    # ru_maxrss is in bytes on Mac OS X, and in KB on Linux
+    scale = 1024 if sys.platform == 'darwin' else 1
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale)
+
+def progress(count, unit='elements', interval=None):
+    """
+    Print a progress line if interval seconds passed since the last one. 
+    Worker processes print no progress line, the main process prints the
+    progress of their work when it merges their statistics.
+    Args:
+        count: number of elements processed since the start of the run
+        unit: name of the elements
+        interval: seconds between progress lines, osmv.PROGRESS_INTERVAL if
+                  None. No progress line is printed if the interval is 0.
+    """
+    global last_progress
+    interval = osmv.PROGRESS_INTERVAL if interval is None else interval
+    if not interval:
+        return
+    now = timer()
+    if now - last_progress < interval \
+    or multiprocessing.current_process().name != 'MainProcess':
+        return
+    last_progress = now
+    elapsed = now - started
+    print "[{:>8.1f} s] {} {} ({:.0f} {}/s), peak RSS {} MB".format(
+        elapsed, count, unit, count / elapsed if elapsed else 0, unit,
+        get_peak_rss()[0] // 1024)
+    sys.stdout.flush()
+
+def start():
+    """Reset the stages and the start time of a run"""
+    global started, last_progress
+    for stage in stages.values():
+        stage.reset()
+    started = last_progress = timer()
+
+def collect():
+    """
+    Get the statistics of the stages since the last call, and reset them.
+    Used to send the statistics of a worker process to the main process.
+    Returns:
+        list of (name, seconds, elements, calls)
+    """
+    collected = [(s.name, s.seconds, s.elements, s.calls) for s in stages.values()]
+    # The stages are kept, the timed functions and writers refer to them
+    for stage in stages.values():
+        stage.reset()
+    return collected
+
+def merge(collected):
+    """Add the statistics of the stages of another process, see collect"""
+    for name, seconds, elements, calls in collected:
+        add(name, seconds, elements, calls)
+
+def display():
+    """Display the time and the throughput of each stage"""
+    print '{:<27} {:>10} {:>12} {:>10} {:>12}'.format(
+        'Stage', 'Calls', 'Elements', 'Time (s)', 'Elements/s')
+    for stage in stages.values():
+        if not stage.calls:
+            continue
+        print '{:<27} {:>10} {:>12} {:>10.2f} {:>12.0f}'.format(
+            stage.name, stage.calls, stage.elements, stage.seconds, stage.rate())
+    rss, children_rss = get_peak_rss()
+    print 'Peak RSS: {} MB (worker processes: {} MB)'.format(
+        rss // 1024, children_rss // 1024)
+
+def save_report(script, path=None, **info):
+    """
+    Write the statistics of the stages of the run to a JSON file.
+    Args:
+        script: name of the script of the run
+        path: report file path, osmv.REPORT_PATH formatted with the script
+              name if None. No report is written if the path is empty.
+        info: other values of the run to write in the report
+    Returns:
+        report file path, or None
+    """
+    path = path or (osmv.REPORT_PATH and osmv.REPORT_PATH.format(script=script))
+    if not path:
+        return None
+    rss, children_rss = get_peak_rss()
+    report = {'script': script,
+              'started': datetime.datetime.fromtimestamp(started).isoformat(),
+              'elapsed': timer() - started,
+              'peak_rss_kb': rss,
+              'children_peak_rss_kb': children_rss,
+              'stages': [stage.to_dict() for stage in stages.values() if stage.calls]}
+    report.update(info)
+    # Write a temporary file then rename it, so the report is never partial
+    with open(path + '.tmp', 'wb') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    os.rename(path + '.tmp', path)
+    return path
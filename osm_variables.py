@@ -1,210 +1,287 @@
-# -*- coding: utf-8 -*-
-import re
-
-"""
-This file consists of file paths, regular expressions, mapping rules, and 
-expected values used in th Open Street Data Wrangling project
-"""
-
-#######################################
-#          Files Paths                #
-#######################################
-# The osm file
-OSM_PATH = 'dallas_sample.osm'
-# The database file
-DB_PATH = 'dallas_sample'
-# The csv files
-NODES_PATH = 'nodes.csv'
-NODE_TAGS_PATH = 'nodes_tags.csv'
-RELATIONS_PATH = 'relations.csv'
-RELATION_NODES_PATH = 'relations_nodes.csv'
-RELATION_RELATIONS_PATH = 'relations_relations.csv'
-RELATION_TAGS_PATH = 'relations_tags.csv'
-RELATION_WAYS_PATH = 'relations_ways.csv'
-WAYS_PATH = 'ways.csv'
-WAY_NODES_PATH = 'ways_nodes.csv'
-WAY_TAGS_PATH = 'ways_tags.csv'
-csv_files = [NODES_PATH, NODE_TAGS_PATH, RELATIONS_PATH, RELATION_NODES_PATH,
-             RELATION_RELATIONS_PATH, RELATION_TAGS_PATH,RELATION_WAYS_PATH,
-             WAYS_PATH, WAY_NODES_PATH, WAY_TAGS_PATH]
-
-# The fields order in the csvs base on the column order in the sql table schema
-NODE_FIELDS = ['id', 'lat', 'lon', 'user', 'uid', 'version', 'changeset', 'timestamp']
-NODE_TAGS_FIELDS = ['id', 'key', 'value', 'type']
-RELATION_FIELDS = ['id', 'user', 'uid', 'version', 'changeset', 'timestamp']
-RELATION_NODES_FIELDS = ['id', 'node_id', 'position', 'role']
-RELATION_RELATIONS_FIELDS = ['id', 'relation_id', 'position', 'role']
-RELATION_TAGS_FIELDS = ['id', 'key', 'value', 'type']
-RELATION_WAYS_FIELDS = ['id', 'way_id', 'position', 'role']
-WAY_FIELDS = ['id', 'user', 'uid', 'version', 'changeset', 'timestamp']
-WAY_NODES_FIELDS = ['id', 'node_id', 'position']
-WAY_TAGS_FIELDS = ['id', 'key', 'value', 'type']
-
-#######################################
-#           RegExps                   #
-#######################################
-audit_point = re.compile(r'(^|\s)([SWNE]|SE|SW|NW|NE)\.?(\s|$)', re.IGNORECASE)
-building_no_phrase_re = re.compile(r'\s(ste\s|suite\s|building\s|#\s?)\w+\-?\d*', re.IGNORECASE)
-building_no_type_re = re.compile(r'\s(ste\s|suite\s|building\s|#\s?|no\.)', re.IGNORECASE)
-##end_point_re = re.compile(r'\s([SWNE]|SE|SW|NW|NE)*\.?$', re.IGNORECASE)
-ending_word_re = re.compile(r'\b\S+\.?$', re.IGNORECASE)
-highway_re = re.compile(r'(\s|\-)\d+\w?(\s|$)', re.IGNORECASE)
-##LOWER_COLON = re.compile(r'^([a-z]|_)+:([a-z]|_)+')
-ordinal_number_re = re.compile(r'(^|\s)\d+(st|nd|rd|th)\.?(\s|$)', re.IGNORECASE)
-PROBLEMCHARS = re.compile(r'[=\+/&<>;\'"\?%#$@\,\. \t\r\n]')
-##start_point_re = re.compile(r'^([SWNE]|SE|SW|NW|NE)(\.|\s)', re.IGNORECASE)
-starting_word_re = re.compile(r'^\b\S+\.?', re.IGNORECASE)
-street_number_re = re.compile(r'^\d+\w?\s',re.IGNORECASE)
-zip_re = re.compile(r'7[5-6]\d{3}') # Regex to find Dallas Zipcodes
-
-#######################################
-#       Expected Values               #
-#######################################
-EXPECTED_BUILDING_NUMBER_TYPES = ['Suite', 'No', 'Building']
-EXPECTED_POINTS = ['North', 
-                   'Northwest',
-                   'West',
-                   'Southwest',
-                   'South',
-                   'Southeast',
-                   'East',
-                   'North']
-EXPECTED_STREET_TYPES = ['Alley', 
-                      'Avenue', 
-                      'Bay',
-                      'Boulevard',
-                      'Central',  
-                      'Circle',
-                      'Court', 
-                      'Cove',  
-                      'Crest', 
-                      'Crossing', 
-                      'Drive', 
-                      'Expressway', 
-                      'Extension',
-                      'Freeway', 
-                      'Glen',
-                      'Highway',
-                      'Inlet', 
-                      'Landing',
-                      'Lane', 
-                      'Loop', 
-                      'Mews', 
-                      'Park',  
-                      'Parkway', 
-                      'Pass', 
-                      'Path',
-                      'Place',
-                      'Plaza', 
-                      'Point',
-                      'Ridge',  
-                      'Road', 
-                      'Row', 
-                      'Run',    
-                      'Street',
-                      'Square',
-                      'Terrace',  
-                      'Tollway',
-                      'Trace', 
-                      'Trail',
-                      'Vista',
-                      'Way',  
-                      'Walk']
-
-#######################################
-#          Value Mappings             #
-#######################################
-CITY_MAPPING = {'De Soto': 'DeSoto',
-                'Dfw': 'Dallas Fort Worth',
-                'Ft': 'Fort',
-                'Mckinney': 'McKinney'}
-
-CR_road = 'County Road'
-FM_road = 'FM Road'
-Inter_road = 'Interstate Highway' 
-TX_road = 'TX Highway'
-US_road = 'US Highway'
-
-HIGHWAY_MAPPING = {'1043': CR_road,
-                   '1138': FM_road,
-                   '114': TX_road,
-                   '1187': FM_road,
-                   '12': TX_road + ' Loop',
-                   '121': TX_road,
-                   '1382': FM_road,
-                   '1565': FM_road,
-                   '157': FM_road,
-                   '1603': FM_road,
-                   '161': TX_road,
-                   '175': US_road,
-                   '183': TX_road,
-                   '1902': FM_road,
-                   '199': TX_road,                   
-                   '20': Inter_road,
-                   '206': CR_road,
-                   '2181': FM_road,
-                   '23': CR_road,
-                   '234': CR_road,
-                   '26': TX_road,
-                   '287': US_road,
-                   '288': TX_road + ' Loop',
-                   '30': Inter_road,
-                   '3040': FM_road,
-                   '34': TX_road,
-                   '342': TX_road,
-                   '35': Inter_road,
-                   '356': TX_road,
-                   '360': TX_road,
-                   '376': CR_road,
-                   '377': US_road,
-                   '380': US_road,
-                   '407': FM_road,
-                   '408': TX_road + ' Spur',
-                   '423': FM_road,
-                   '45': Inter_road,
-                   '526': CR_road,
-                   '549': CR_road,
-                   '544': FM_road,
-                   '615': CR_road,
-                   '664': FM_road,
-                   '66': TX_road,
-                   '67': US_road,
-                   '707': CR_road,
-                   '730': FM_road,
-                   '741': FM_road,
-                   '77': US_road,
-                   '78': TX_road,
-                   '80': US_road,
-                   '81': US_road,
-                   '820': TX_road + ' Loop',
-                   '983': FM_road}
-
-POINT_MAPPING = {'s': 'South',
-                 'se': 'Southeast',
-                 'e': 'East',
-                 'ne': 'Northeast',
-                 'n': 'North',
-                 'nw': 'Northwest',
-                 'w': 'West',
-                 'sw': 'Southwest'}
-
-TYPE_MAPPING = {'56th': '56th Street',
-                'av': 'Avenue',
-                'ave': 'Avenue',
-                'expy': 'Expressway',
-                'expessway': 'Expressway',
-                'exressway': 'Expressway',
-                'trl': 'Trail',
-                'blvd': 'Boulevard',
-                'bus': 'Business',
-                'cir': 'Cirle',
-                'ct': 'Court',
-                'dr': 'Drive',
-                'ln': 'Lane',
-                'frontage': 'Frontage Road',
-                'fwy': 'Freeway',
-                'hwy': 'Highway',
-                'pkwy': 'Parkway',
-                'rd': 'Road',
-                'st': 'Street',
-                'pkwy': 'Parkway'}
\ No newline at end of file
+# -*- coding: utf-8 -*-
+import multiprocessing
+import re
+
+"""
+This file consists of file paths, regular expressions, mapping rules, and 
+expected values used in th Open Street Data Wrangling project
+"""
+
+#######################################
+#          Files Paths                #
+#######################################
+# The osm file
+OSM_PATH = 'dallas_sample.osm'
+# The database file
+DB_PATH = 'dallas_sample'
+# The change file applied to the database by load_changes
+OSC_PATH = 'dallas_sample.osc'
+# The csv files
+NODES_PATH = 'nodes.csv'
+NODE_TAGS_PATH = 'nodes_tags.csv'
+RELATIONS_PATH = 'relations.csv'
+RELATION_NODES_PATH = 'relations_nodes.csv'
+RELATION_RELATIONS_PATH = 'relations_relations.csv'
+RELATION_TAGS_PATH = 'relations_tags.csv'
+RELATION_WAYS_PATH = 'relations_ways.csv'
+WAYS_PATH = 'ways.csv'
+WAY_NODES_PATH = 'ways_nodes.csv'
+WAY_TAGS_PATH = 'ways_tags.csv'
+csv_files = [NODES_PATH, NODE_TAGS_PATH, RELATIONS_PATH, RELATION_NODES_PATH,
+             RELATION_RELATIONS_PATH, RELATION_TAGS_PATH,RELATION_WAYS_PATH,
+             WAYS_PATH, WAY_NODES_PATH, WAY_TAGS_PATH]
+
+# Insert the rows into DB_PATH instead of writing the csv files, so load_db
+# does not need to run (see write_csvs.process_map)
+WRITE_DB = False
+# Store the user names and the tag keys and types once, in the users, tag_keys
+# and tag_types tables, behind views with the usual table names (see load_db)
+COMPACT_DB = False
+# Store the node ids of each way in one packed blob instead of one row of
+# ways_nodes per node, behind the ways_nodes view (see osm_packed)
+PACK_WAY_NODES = False
+# Also write the numeric columns of nodes and ways_nodes to .npy files in 
+# COLUMNS_PATH, to load them with numpy memory mapping (see osm_columns)
+WRITE_COLUMNS = False
+COLUMNS_PATH = 'columns'
+# Write the csv files compressed (.csv.gz), and the number of threads that
+# compress their blocks (see osm_compressed.GzipWriter)
+COMPRESS_CSVS = False
+COMPRESS_THREADS = multiprocessing.cpu_count()
+# Checkpoint file of write_csvs, to resume a run over a plain osm file in a
+# single process where it stopped, or None, and the number of seconds between
+# two checkpoints (see write_csvs.Checkpoint)
+CHECKPOINT_PATH = 'write_csvs.checkpoint'
+CHECKPOINT_INTERVAL = 60
+# Overlap parsing, shaping, and writing in threads when write_csvs runs in a
+# single process (see write_csvs.Pipeline), and the number of batches of 
+# elements or rows each queue of the pipeline holds
+PIPELINE = False
+PIPELINE_QUEUE_SIZE = 8
+# Seconds between the progress lines of a run (0 for no progress line), and
+# JSON report of the time of each stage of a run, formatted with the script 
+# name, or None for no report (see osm_stats)
+PROGRESS_INTERVAL = 10
+REPORT_PATH = '{script}.report.json'
+
+# Scan tags with the expat parser instead of building each element when 
+# auditing and cleaning (see osm_functions.get_tags)
+USE_TAG_SCANNER = True
+# Number of processes used by write_csvs.process_map and audit_engine.audit, 
+# set it to the number of cores to process chunks of the osm file in parallel
+PROCESSES = 1
+# Number of processes used to decompress a multi-stream .osm.bz2 file, and to
+# decode the blocks of a .osm.pbf file
+DECOMPRESS_PROCESSES = multiprocessing.cpu_count()
+# Number of distinct values kept in memory by each memoized cleaning function
+# (see clean_cache)
+CLEAN_CACHE_SIZE = 2**16
+# File that keeps the cleaned values between runs, e.g. 'clean_cache.json', 
+# or None to clean the values again in each run
+CLEAN_CACHE_PATH = None
+# Number of most frequent values kept by each category of the audit results,
+# and precision of the distinct count of each category (see audit_accumulator)
+AUDIT_TOP_K = 10
+AUDIT_HLL_PRECISION = 10
+# Elements validated by write_csvs (see schema_validator.ValidationPolicy), 
+# e.g. {'fraction': 0.05, 'seed': 0, 'max_failures': None} validates 5% of the
+# elements and reports every failure instead of stopping at the first one
+VALIDATION_POLICY = {'every': None, 'first': None, 'fraction': None, 'seed': 0,
+                     'max_failures': 1}
+
+# The fields order in the csvs base on the column order in the sql table schema
+NODE_FIELDS = ['id', 'lat', 'lon', 'user', 'uid', 'version', 'changeset', 'timestamp']
+NODE_TAGS_FIELDS = ['id', 'key', 'value', 'type']
+RELATION_FIELDS = ['id', 'user', 'uid', 'version', 'changeset', 'timestamp']
+RELATION_NODES_FIELDS = ['id', 'node_id', 'position', 'role']
+RELATION_RELATIONS_FIELDS = ['id', 'relation_id', 'position', 'role']
+RELATION_TAGS_FIELDS = ['id', 'key', 'value', 'type']
+RELATION_WAYS_FIELDS = ['id', 'way_id', 'position', 'role']
+WAY_FIELDS = ['id', 'user', 'uid', 'version', 'changeset', 'timestamp']
+WAY_NODES_FIELDS = ['id', 'node_id', 'position']
+WAY_TAGS_FIELDS = ['id', 'key', 'value', 'type']
+csv_fields = [NODE_FIELDS, NODE_TAGS_FIELDS, RELATION_FIELDS, RELATION_NODES_FIELDS,
+              RELATION_RELATIONS_FIELDS, RELATION_TAGS_FIELDS, RELATION_WAYS_FIELDS,
+              WAY_FIELDS, WAY_NODES_FIELDS, WAY_TAGS_FIELDS]
+
+#######################################
+#           RegExps                   #
+#######################################
+audit_point = re.compile(r'(^|\s)([SWNE]|SE|SW|NW|NE)\.?(\s|$)', re.IGNORECASE)
+building_no_phrase_re = re.compile(r'\s(ste\s|suite\s|building\s|#\s?)\w+\-?\d*', re.IGNORECASE)
+building_no_type_re = re.compile(r'\s(ste\s|suite\s|building\s|#\s?|no\.)', re.IGNORECASE)
+##end_point_re = re.compile(r'\s([SWNE]|SE|SW|NW|NE)*\.?$', re.IGNORECASE)
+ending_word_re = re.compile(r'\b\S+\.?$', re.IGNORECASE)
+element_start_re = re.compile(r'<(node|way|relation)[\s/>]')
+# Start tag of an element; each character is matched in one way only, so the
+# search does not backtrack exponentially when the closing > is missing
+element_re = re.compile(r'<(node|way|relation)\b[^"\'>]*(?:(?:"[^"]*"|\'[^\']*\')[^"\'>]*)*>')
+element_id_re = re.compile(r'\sid=["\'](-?\d+)["\']')
+highway_re = re.compile(r'(\s|\-)\d+\w?(\s|$)', re.IGNORECASE)
+##LOWER_COLON = re.compile(r'^([a-z]|_)+:([a-z]|_)+')
+ordinal_number_re = re.compile(r'(^|\s)\d+(st|nd|rd|th)\.?(\s|$)', re.IGNORECASE)
+PROBLEMCHARS = re.compile(r'[=\+/&<>;\'"\?%#$@\,\. \t\r\n]')
+##start_point_re = re.compile(r'^([SWNE]|SE|SW|NW|NE)(\.|\s)', re.IGNORECASE)
+starting_word_re = re.compile(r'^\b\S+\.?', re.IGNORECASE)
+street_number_re = re.compile(r'^\d+\w?\s',re.IGNORECASE)
+zip_re = re.compile(r'7[5-6]\d{3}') # Regex to find Dallas Zipcodes
+
+#######################################
+#       Expected Values               #
+#######################################
+EXPECTED_BUILDING_NUMBER_TYPES = ['Suite', 'No', 'Building']
+EXPECTED_POINTS = ['North', 
+                   'Northwest',
+                   'West',
+                   'Southwest',
+                   'South',
+                   'Southeast',
+                   'East',
+                   'North']
+EXPECTED_STREET_TYPES = ['Alley', 
+                      'Avenue', 
+                      'Bay',
+                      'Boulevard',
+                      'Central',  
+                      'Circle',
+                      'Court', 
+                      'Cove',  
+                      'Crest', 
+                      'Crossing', 
+                      'Drive', 
+                      'Expressway', 
+                      'Extension',
+                      'Freeway', 
+                      'Glen',
+                      'Highway',
+                      'Inlet', 
+                      'Landing',
+                      'Lane', 
+                      'Loop', 
+                      'Mews', 
+                      'Park',  
+                      'Parkway', 
+                      'Pass', 
+                      'Path',
+                      'Place',
+                      'Plaza', 
+                      'Point',
+                      'Ridge',  
+                      'Road', 
+                      'Row', 
+                      'Run',    
+                      'Street',
+                      'Square',
+                      'Terrace',  
+                      'Tollway',
+                      'Trace', 
+                      'Trail',
+                      'Vista',
+                      'Way',  
+                      'Walk']
+
+#######################################
+#          Value Mappings             #
+#######################################
+CITY_MAPPING = {'De Soto': 'DeSoto',
+                'Dfw': 'Dallas Fort Worth',
+                'Ft': 'Fort',
+                'Mckinney': 'McKinney'}
+
+CR_road = 'County Road'
+FM_road = 'FM Road'
+Inter_road = 'Interstate Highway' 
+TX_road = 'TX Highway'
+US_road = 'US Highway'
+
+HIGHWAY_MAPPING = {'1043': CR_road,
+                   '1138': FM_road,
+                   '114': TX_road,
+                   '1187': FM_road,
+                   '12': TX_road + ' Loop',
+                   '121': TX_road,
+                   '1382': FM_road,
+                   '1565': FM_road,
+                   '157': FM_road,
+                   '1603': FM_road,
+                   '161': TX_road,
+                   '175': US_road,
+                   '183': TX_road,
+                   '1902': FM_road,
+                   '199': TX_road,                   
+                   '20': Inter_road,
+                   '206': CR_road,
+                   '2181': FM_road,
+                   '23': CR_road,
+                   '234': CR_road,
+                   '26': TX_road,
+                   '287': US_road,
+                   '288': TX_road + ' Loop',
+                   '30': Inter_road,
+                   '3040': FM_road,
+                   '34': TX_road,
+                   '342': TX_road,
+                   '35': Inter_road,
+                   '356': TX_road,
+                   '360': TX_road,
+                   '376': CR_road,
+                   '377': US_road,
+                   '380': US_road,
+                   '407': FM_road,
+                   '408': TX_road + ' Spur',
+                   '423': FM_road,
+                   '45': Inter_road,
+                   '526': CR_road,
+                   '549': CR_road,
+                   '544': FM_road,
+                   '615': CR_road,
+                   '664': FM_road,
+                   '66': TX_road,
+                   '67': US_road,
+                   '707': CR_road,
+                   '730': FM_road,
+                   '741': FM_road,
+                   '77': US_road,
+                   '78': TX_road,
+                   '80': US_road,
+                   '81': US_road,
+                   '820': TX_road + ' Loop',
+                   '983': FM_road}
+
+POINT_MAPPING = {'s': 'South',
+                 'se': 'Southeast',
+                 'e': 'East',
+                 'ne': 'Northeast',
+                 'n': 'North',
+                 'nw': 'Northwest',
+                 'w': 'West',
+                 'sw': 'Southwest'}
+
+TYPE_MAPPING = {'56th': '56th Street',
+                'av': 'Avenue',
+                'ave': 'Avenue',
+                'expy': 'Expressway',
+                'expessway': 'Expressway',
+                'exressway': 'Expressway',
+                'trl': 'Trail',
+                'blvd': 'Boulevard',
+                'bus': 'Business',
+                'cir': 'Cirle',
+                'ct': 'Court',
+                'dr': 'Drive',
+                'ln': 'Lane',
+                'frontage': 'Frontage Road',
+                'fwy': 'Freeway',
+                'hwy': 'Highway',
+                'pkwy': 'Parkway',
+                'rd': 'Road',
+                'st': 'Street',
+                'pkwy': 'Parkway'}
+
+#######################################
+#       Compiled Rules                #
+#######################################
+# Sets of the expected values, for membership tests
+expected_building_number_types = frozenset(EXPECTED_BUILDING_NUMBER_TYPES)
+expected_points = frozenset(EXPECTED_POINTS)
+expected_street_types = frozenset(EXPECTED_STREET_TYPES)
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+Fast validation of the shaped elements against schema.schema. The schema is
+compiled once into Python functions specialized for each element type, which
+check the required and unknown fields, the coercions, and the types without
+interpreting the schema for each element. When an element is not valid, it is
+validated again by cerberus to get the same errors as before.
+A ValidationPolicy selects the elements to validate (e.g. every Nth element,
+or a random fraction), and a ValidationSummary counts the failures of each
+table and field.
+"""
+from collections import defaultdict, Mapping, Sequence
+import random
+import cerberus
+
+# Types of the values returned by coercion functions, the type check is not
+# generated when the coercion function always returns a value of the type
+COERCE_TYPES = {int: ('integer', 'float'), float: ('float',)}
+
+# Type checks of the cerberus types, value is the name of the checked value
+TYPE_CHECKS = {
+    'string': 'isinstance({0}, basestring)',
+    'integer': 'isinstance({0}, (int, long))',
+    'float': 'isinstance({0}, (float, int, long))',
+    'boolean': 'isinstance({0}, bool)',
+    'dict': '(type({0}) is dict or isinstance({0}, Mapping))',
+    'list': '(type({0}) is list or isinstance({0}, Sequence) '
+            'and not isinstance({0}, basestring))',
+}
+
+class CodeWriter(object):
+    """Lines of Python source code with indentation"""
+    def __init__(self):
+        self.lines = []
+        self.indent = 0
+
+    def line(self, code):
+        self.lines.append('    ' * self.indent + code)
+
+    def source(self):
+        return '\n'.join(self.lines) + '\n'
+
+def type_check(rules, value):
+    """
+    Get the expression that checks the type of a value.
+    Args:
+        rules: rules of the field in the schema
+        value: name of the checked value
+    Returns:
+        Python expression, or None if no check is needed
+    """
+    types = rules.get('type')
+    if types is None:
+        return None
+    if not isinstance(types, (list, tuple)):
+        types = [types]
+    if rules.get('coerce') in COERCE_TYPES \
+    and any(t in COERCE_TYPES[rules['coerce']] for t in types):
+        return None
+    return '(' + ' or '.join(TYPE_CHECKS[t].format(value) for t in types) + ')'
+
+def write_mapping(code, schema, value, namespace):
+    """
+    Write the checks of a dict against the schema of its fields.
+    Args:
+        code: CodeWriter
+        schema: schema of the fields of the dict
+        value: name of the dict
+        namespace: dict of the names used by the generated code
+    """
+    optional = []
+    for field, rules in sorted(schema.items()):
+        unknown_rules = set(rules) - set(['required', 'type', 'coerce', 'schema'])
+        if unknown_rules:
+            raise ValueError("Rules not supported: {}".format(sorted(unknown_rules)))
+        v = 'v_' + str(len(code.lines))
+        if rules.get('required'):
+            code.line('if {!r} not in {}:'.format(field, value))
+            code.line('    return False')
+        else:
+            optional.append(field)
+            code.line('if {!r} in {}:'.format(field, value))
+            code.indent += 1
+        code.line('{} = {}[{!r}]'.format(v, value, field))
+        code.line('if {} is None:'.format(v))
+        code.line('    return False')
+        if 'coerce' in rules:
+            coerce = 'coerce_{}'.format(len(namespace))
+            namespace[coerce] = rules['coerce']
+            code.line('try:')
+            code.line('    {0} = {1}({0})'.format(v, coerce))
+            code.line('except Exception:')
+            code.line('    return False')
+        check = type_check(rules, v)
+        if check:
+            code.line('if not {}:'.format(check))
+            code.line('    return False')
+        if 'schema' in rules:
+            write_container(code, rules, v, namespace)
+        if not rules.get('required'):
+            code.indent -= 1
+    # Check that there is no unknown field
+    required = sum(1 for rules in schema.values() if rules.get('required'))
+    count = ' + '.join([str(required)] +
+                       ['({!r} in {})'.format(f, value) for f in optional])
+    code.line('if len({}) != {}:'.format(value, count))
+    code.line('    return False')
+
+def write_container(code, rules, value, namespace):
+    """
+    Write the checks of the items of a list, or the fields of a dict.
+    Args:
+        code: CodeWriter
+        rules: rules of the list or the dict, with a schema rule
+        value: name of the list or the dict
+        namespace: dict of the names used by the generated code
+    """
+    if rules['type'] == 'dict':
+        write_mapping(code, rules['schema'], value, namespace)
+    elif rules['type'] == 'list':
+        item = 'item_' + str(len(code.lines))
+        code.line('for {} in {}:'.format(item, value))
+        code.indent += 1
+        code.line('if {} is None:'.format(item))
+        code.line('    return False')
+        check = type_check(rules['schema'], item)
+        if check:
+            code.line('if not {}:'.format(check))
+            code.line('    return False')
+        if 'schema' in rules['schema']:
+            write_container(code, rules['schema'], item, namespace)
+        code.indent -= 1
+    else:
+        raise ValueError("Schema rule not supported for type {}".format(rules['type']))
+
+def generate_validators(schema):
+    """
+    Generate a validation function for each top level field of the schema.
+    Args:
+        schema: cerberus schema of the shaped elements
+    Returns:
+        dict of validation functions by field, each takes the value of the
+        field and returns True if it is valid, and the generated source code
+    """
+    namespace = {'Mapping': Mapping, 'Sequence': Sequence}
+    code = CodeWriter()
+    names = {}
+    for field, rules in sorted(schema.items()):
+        names[field] = 'validate_' + field
+        code.line('def {}(value):'.format(names[field]))
+        code.indent += 1
+        code.line('if value is None:')
+        code.line('    return False')
+        check = type_check(rules, 'value')
+        if check:
+            code.line('if not {}:'.format(check))
+            code.line('    return False')
+        if 'schema' in rules:
+            write_container(code, rules, 'value', namespace)
+        code.line('return True')
+        code.indent -= 1
+        code.line('')
+    source = code.source()
+    exec compile(source, '<schema_validator>', 'exec') in namespace
+    return dict((field, namespace[name]) for field, name in names.items()), source
+
+class FastValidator(object):
+    """
+    Validator with the validate method and the errors of cerberus.Validator,
+    that validates documents with functions generated from the schema.
+    Args:
+        schema: cerberus schema of the shaped elements
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.validators, self.source = generate_validators(schema)
+        self.errors = {}
+        self.cerberus = None
+
+    def validate(self, document, schema=None):
+        """
+        Validate a document against the schema. If the document is not
+        valid, the errors are the errors of cerberus.
+        Args:
+            document: shaped element
+            schema: must be the schema of the validator, or None
+        Returns:
+            True if the document is valid, else False
+        """
+        if schema is not None and schema is not self.schema:
+            raise ValueError("FastValidator can only validate its own schema")
+        validators = self.validators
+        if isinstance(document, dict):
+            for field, value in document.iteritems():
+                if field not in validators or not validators[field](value):
+                    break
+            else:
+                self.errors = {}
+                return True
+        # Let cerberus find the errors
+        if self.cerberus is None:
+            self.cerberus = cerberus.Validator(self.schema)
+        result = self.cerberus.validate(document)
+        self.errors = self.cerberus.errors
+        return result
+
+class ValidationPolicy(object):
+    """
+    Which shaped elements are validated, and when a run stops. The element is
+    validated if it passes every option that is set, all the elements are
+    validated if no option is set.
+    Args:
+        every: validate every Nth element
+        first: validate the first N elements of each element type
+        fraction: validate a random fraction of the elements, each chunk of
+                  a file processed in a pool of processes has its own sample
+        seed: seed of the random fraction
+        max_failures: stop at the Kth failure by raising its error, None to
+                      never stop. The default stops at the first failure.
+    """
+    def __init__(self, every=None, first=None, fraction=None, seed=0, 
+                 max_failures=1):
+        self.every = every
+        self.first = first
+        self.fraction = fraction
+        self.seed = seed
+        self.max_failures = max_failures
+        # False in the worker processes of a pool, which validate their whole
+        # chunk: the main process raises the error of the Kth failure of the
+        # merged summaries (see write_csvs.process_map)
+        self.raise_errors = True
+        self.start()
+
+    def start(self, chunk=0, counts=None, random_state=None):
+        """
+        Reset the element counts, and seed the random fraction for a chunk 
+        of the file, so each chunk validates a different sample.
+        Args:
+            chunk: chunk index
+            counts: dict of the number of elements of each type before the
+                    chunk, so every and first apply to the whole file
+            random_state: state of the random fraction to continue from 
+                          (see random.Random.getstate), e.g. of a checkpoint
+        """
+        self.counts = defaultdict(int, counts or {})
+        self.count = sum(self.counts.values())
+        self.random = random.Random('{}-{}'.format(self.seed, chunk))
+        if random_state is not None:
+            self.random.setstate(random_state)
+
+    def should_validate(self, element_type):
+        """Check whether the next element of the type should be validated"""
+        self.count += 1
+        self.counts[element_type] += 1
+        if self.every and (self.count - 1) % self.every:
+            return False
+        if self.first is not None and self.counts[element_type] > self.first:
+            return False
+        if self.fraction is not None and self.random.random() >= self.fraction:
+            return False
+        return True
+
+class ValidationSummary(object):
+    """
+    Number of validated elements of each element type, and number of failures
+    of each table and field. The errors of the first failures are kept, so
+    the main process of a pool can raise the error of the Kth failure.
+    Args:
+        keep_errors: number of failures whose errors are kept
+    """
+    def __init__(self, keep_errors=0):
+        self.validated = defaultdict(int)
+        self.failed = 0
+        self.failures = defaultdict(int)
+        self.keep_errors = keep_errors
+        self.errors = []
+
+    def add_errors(self, errors):
+        """
+        Count the failures of a document.
+        Args:
+            errors: errors of the validator, by table
+        """
+        self.failed += 1
+        if len(self.errors) < self.keep_errors:
+            self.errors.append(errors)
+        for table, table_errors in errors.items():
+            for fields in get_error_fields(table_errors):
+                self.failures[table, fields] += 1
+
+    def merge(self, other):
+        """Add the counts of another summary"""
+        for element_type, count in other.validated.items():
+            self.validated[element_type] += count
+        self.failed += other.failed
+        for key, count in other.failures.items():
+            self.failures[key] += count
+        self.errors.extend(other.errors[:max(0, self.keep_errors - len(self.errors))])
+
+    def to_dict(self):
+        """Convert the counts to a dict of lists, strings and numbers"""
+        return {'validated': dict(self.validated),
+                'failed': self.failed,
+                'failures': [[table, field, count] for (table, field), count 
+                             in self.failures.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a summary from the counts converted by to_dict"""
+        summary = cls()
+        for element_type, count in data['validated'].items():
+            summary.validated[str(element_type)] = count
+        summary.failed = data['failed']
+        for table, field, count in data['failures']:
+            summary.failures[str(table), str(field)] = count
+        return summary
+
+    def display(self):
+        print "Validated elements:"
+        for element_type, count in sorted(self.validated.items()):
+            print '{:<25} {:>10}'.format(element_type, count)
+        print "Failed elements: " + str(self.failed)
+        if self.failures:
+            print '{:<25} {:<15} {:>10}'.format('Table', 'Field', 'Failures')
+        for (table, field), count in sorted(self.failures.items()):
+            print '{:<25} {:<15} {:>10}'.format(table, field, count)
+
+def get_error_fields(errors):
+    """
+    Get the fields with errors from the cerberus errors of a table. The 
+    errors of the items of a list are counted once per field.
+    Args:
+        errors: list of error messages and dicts of errors by field or index
+    Returns:
+        set of field names, '*' for errors of the table itself
+    """
+    fields = set()
+    for error in errors:
+        if not isinstance(error, dict):
+            fields.add('*')
+            continue
+        for key, value in error.items():
+            if isinstance(key, (int, long)):
+                fields.update(get_error_fields(value))
+            else:
+                fields.add(key)
+    return fields
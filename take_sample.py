@@ -1,19 +1,223 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-import xml.etree.ElementTree as ET  # Use cElementTree or lxml if too slow
-import osm_functions as osmf
-import osm_variables as osmv
-
-SAMPLE_FILE = "dallas_sample.osm"
-
-k = 150 # Parameter: take every k-th top level element
-
-with open(SAMPLE_FILE, 'wb') as output:
-    output.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-    output.write('<osm>\n  ')
-    # Write every kth top level element
-    for i, element in enumerate(osmf.get_element(osmv.OSM_PATH)):
-        if i % k == 0:
-            output.write(ET.tostring(element, encoding='utf-8'))
-    output.write('</osm>')
\ No newline at end of file
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Take a random sample of the osm file in two passes. The first pass selects
+elements at random (elements with addr:* tags are oversampled so that the
+sample exercises the cleaners), and records the nodes referenced by the
+selected ways and relations. The second pass writes the selected elements and
+every node they reference, so the sample has no dangling node references.
+With a bounding box, a pass before them finds the elements in the box, so the
+probabilities are based on their number.
+TARGET_SIZE is the expected number of elements selected at random without
+oversampling: the elements with addr:* tags selected by ADDR_FACTOR, and the
+nodes referenced by the selected ways and relations, are added to it.
+"""
+
+import array
+import bisect
+import random
+import xml.etree.ElementTree as ET  # Use cElementTree or lxml if too slow
+import osm_functions as osmf
+import osm_variables as osmv
+
+SAMPLE_FILE = "dallas_sample.osm"
+
+SEED = 150 # Parameter: seed of the random sample
+TARGET_SIZE = 45000 # Parameter: number of elements selected at random
+BBOX = None # Parameter: (min lat, min lon, max lat, max lon) of the sample
+QUOTAS = None # Parameter: number of elements by type, e.g. {'way': 5000}
+ADDR_FACTOR = 10 # Parameter: oversampling factor of elements with addr:* tags
+
+class IdBitmap(object):
+    """
+    Set of element ids stored in pages of 2**16 ids, allocated only when an
+    id in the page is added. A page is a sorted array of the ids added while
+    it has at most ARRAY_SIZE ids, and a bitmap once it is dense, so sparse
+    ids take 2 bytes each and dense ids 1 bit each.
+    """
+    PAGE_BITS = 16
+    # Number of ids of an array page that take as much memory as a bitmap
+    ARRAY_SIZE = 1 << (PAGE_BITS - 4)
+
+    def __init__(self):
+        self.pages = {}
+        self.count = 0
+
+    def add(self, element_id):
+        element_id = int(element_id)
+        key = element_id >> self.PAGE_BITS
+        i = element_id & ((1 << self.PAGE_BITS) - 1)
+        page = self.pages.get(key)
+        if page is None:
+            self.pages[key] = array.array('H', [i])
+            self.count += 1
+        elif isinstance(page, array.array):
+            j = bisect.bisect_left(page, i)
+            if j < len(page) and page[j] == i:
+                return
+            page.insert(j, i)
+            self.count += 1
+            if len(page) > self.ARRAY_SIZE:
+                self.pages[key] = self.to_bitmap(page)
+        elif not page[i >> 3] & (1 << (i & 7)):
+            page[i >> 3] |= 1 << (i & 7)
+            self.count += 1
+
+    def to_bitmap(self, page):
+        """Convert an array page into a bitmap page"""
+        bitmap = bytearray(1 << (self.PAGE_BITS - 3))
+        for i in page:
+            bitmap[i >> 3] |= 1 << (i & 7)
+        return bitmap
+
+    def __contains__(self, element_id):
+        element_id = int(element_id)
+        page = self.pages.get(element_id >> self.PAGE_BITS)
+        if page is None:
+            return False
+        i = element_id & ((1 << self.PAGE_BITS) - 1)
+        if isinstance(page, array.array):
+            j = bisect.bisect_left(page, i)
+            return j < len(page) and page[j] == i
+        return bool(page[i >> 3] & (1 << (i & 7)))
+
+    def __len__(self):
+        return self.count
+
+def get_probabilities(osm_file, target_size, quotas=None, counts=None):
+    """
+    Get the probability to select an element of each type.
+    Args:
+        osm_file: osm file path
+        target_size: number of elements to select
+        quotas: dict of the number of elements to select by element type,
+                replaces target_size for the types in it
+        counts: dict of the number of candidate elements by element type,
+                all the elements of the file if None
+    Returns:
+        dict of probabilities by element type
+    """
+    if counts is None:
+        counts = osmf.get_file_info(osm_file)['counts']
+    total = float(sum(counts.values()))
+    probabilities = {}
+    for t, count in counts.items():
+        if quotas and t in quotas:
+            probabilities[t] = min(1.0, quotas[t] / float(count or 1))
+        else:
+            probabilities[t] = min(1.0, target_size / (total or 1))
+    return probabilities
+
+def in_bbox(element, bbox):
+    """Check whether a node is in the bounding box"""
+    lat, lon = float(element.attrib['lat']), float(element.attrib['lon'])
+    return bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]
+
+def has_address(element):
+    """Check whether an element has an addr:* tag"""
+    return any(tag.attrib['k'].startswith('addr:') for tag in element.iter('tag'))
+
+def get_inside(osm_file, bbox):
+    """
+    Find the nodes in the bounding box, and the ways and relations that 
+    reference an element in the box.
+    Args:
+        osm_file: osm file path
+        bbox: (min lat, min lon, max lat, max lon)
+    Returns:
+        dict of IdBitmap of the ids in the box by element type
+    """
+    inside = dict((t, IdBitmap()) for t in ('node', 'way', 'relation'))
+    for element in osmf.get_element(osm_file):
+        t = element.tag
+        if t == 'node':
+            is_inside = in_bbox(element, bbox)
+        elif t == 'way':
+            is_inside = any(nd.attrib['ref'] in inside['node'] for nd in element.iter('nd'))
+        else:
+            is_inside = any(m.attrib['ref'] in inside[m.attrib['type']]
+                            for m in element.iter('member'))
+        if is_inside:
+            inside[t].add(element.attrib['id'])
+    return inside
+
+def select_elements(osm_file, seed=SEED, target_size=TARGET_SIZE, bbox=BBOX,
+                    quotas=QUOTAS, addr_factor=ADDR_FACTOR):
+    """
+    Select elements at random, and record the nodes referenced by the
+    selected ways and relations. With a bounding box, only nodes in the box,
+    and ways and relations that reference an element in the box, are 
+    selected, with the probabilities of their number (see get_inside).
+    Args:
+        osm_file: osm file path
+        seed: seed of the random sample
+        target_size: expected number of elements to select, without the
+                     oversampled elements with addr:* tags
+        bbox: (min lat, min lon, max lat, max lon), or None
+        quotas: dict of the number of elements to select by element type
+        addr_factor: oversampling factor of elements with addr:* tags
+    Returns:
+        dict of IdBitmap of selected ids by element type, and IdBitmap of
+        referenced node ids
+    """
+    rng = random.Random(seed)
+    inside = None
+    counts = None
+    if bbox is not None:
+        inside = get_inside(osm_file, bbox)
+        counts = dict((t, len(ids)) for t, ids in inside.items())
+    probabilities = get_probabilities(osm_file, target_size, quotas, counts)
+    selected = dict((t, IdBitmap()) for t in probabilities)
+    referenced = IdBitmap()
+    selected_count = dict((t, 0) for t in probabilities)
+    for element in osmf.get_element(osm_file):
+        t = element.tag
+        element_id = element.attrib['id']
+        if inside is not None and element_id not in inside[t]:
+            continue
+        if t == 'node':
+            refs = []
+        elif t == 'way':
+            refs = [nd.attrib['ref'] for nd in element.iter('nd')]
+        else:
+            refs = [m.attrib['ref'] for m in element.iter('member') 
+                    if m.attrib['type'] == 'node']
+        if quotas and t in quotas and selected_count[t] >= quotas[t]:
+            continue
+        p = probabilities[t]
+        if has_address(element):
+            p = min(1.0, p * addr_factor)
+        if rng.random() < p:
+            selected[t].add(element_id)
+            selected_count[t] += 1
+            for ref in refs:
+                referenced.add(ref)
+    return selected, referenced
+
+def take_sample(osm_file, sample_file, **kwargs):
+    """
+    Write a sample of the osm file that includes every node referenced by the
+    sampled ways and relations. See select_elements for the parameters.
+    Args:
+        osm_file: osm file path
+        sample_file: sample file path
+    Returns:
+        dict of the number of elements written by element type
+    """
+    selected, referenced = select_elements(osm_file, **kwargs)
+    written = dict((t, 0) for t in selected)
+    with open(sample_file, 'wb') as output:
+        output.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        output.write('<osm>\n  ')
+        # Write the selected elements and the referenced nodes
+        for element in osmf.get_element(osm_file):
+            element_id = element.attrib['id']
+            if element_id in selected[element.tag] \
+            or (element.tag == 'node' and element_id in referenced):
+                output.write(ET.tostring(element, encoding='utf-8'))
+                written[element.tag] += 1
+        output.write('</osm>')
+    return written
+
+if __name__ == '__main__':
+    print take_sample(osmv.OSM_PATH, SAMPLE_FILE)
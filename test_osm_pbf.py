@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the PrimitiveBlock decoding of osm_pbf, with blocks encoded by the
+minimal protocol buffer writer below.
+Run with: python -m unittest test_osm_pbf
+"""
+import unittest
+import osm_pbf
+
+def varint(n):
+    """Encode an unsigned varint"""
+    out = bytearray()
+    while n >= 0x80:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+    return str(out)
+
+def sint(n):
+    """Zigzag encode a sint64 value"""
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+def int64(n):
+    """Encode an int64 value as the varint of its two's complement"""
+    return n + (1 << 64) if n < 0 else n
+
+def field(number, value):
+    """Encode a varint field (int) or a length delimited field (str)"""
+    if isinstance(value, (int, long)):
+        return varint(number << 3) + varint(value)
+    return varint(number << 3 | 2) + varint(len(value)) + value
+
+def node_block(**block_fields):
+    """
+    Encode a blob of a PrimitiveBlock with one node at 32.9901295,
+    -96.7999988 with a timestamp of 1500000000 seconds.
+    Args:
+        block_fields: granularity, date_granularity, lat_offset, lon_offset;
+                      the fields are not written if they are not set
+    """
+    granularity = block_fields.get('granularity', 100)
+    date_granularity = block_fields.get('date_granularity', 1000)
+    lat_offset = block_fields.get('lat_offset', 0)
+    lon_offset = block_fields.get('lon_offset', 0)
+    strings = field(1, '') + field(1, 'name') + field(1, 'Dallas') + field(1, 'alice')
+    info = (field(1, 3) + field(2, int64(1500000000 * 1000 // date_granularity)) +
+            field(3, 42) + field(4, 7) + field(5, 3))
+    node = (field(1, sint(4792466424)) + field(2, varint(1)) + field(3, varint(2)) +
+            field(4, info) +
+            field(8, sint((32990129500 - lat_offset) // granularity)) +
+            field(9, sint((-96799998800 - lon_offset) // granularity)))
+    block = field(1, strings) + field(2, field(1, node))
+    for number, name in ((17, 'granularity'), (18, 'date_granularity'),
+                         (19, 'lat_offset'), (20, 'lon_offset')):
+        if name in block_fields:
+            block += field(number, int64(block_fields[name]))
+    return field(1, block)
+
+class DecodeBlockTest(unittest.TestCase):
+    expected = ('node', {'id': '4792466424', 'lat': '32.9901295', 'lon': '-96.7999988',
+                         'version': '3', 'timestamp': '2017-07-14T02:40:00Z',
+                         'changeset': '42', 'uid': '7', 'user': 'alice'},
+                [('tag', {'k': 'name', 'v': 'Dallas'})])
+
+    def test_default_block_fields(self):
+        self.assertEqual(osm_pbf.decode_block(node_block()), [self.expected])
+
+    def test_block_fields(self):
+        blob = node_block(granularity=100, date_granularity=500,
+                          lat_offset=500, lon_offset=-1200)
+        self.assertEqual(osm_pbf.decode_block(blob), [self.expected])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the validation of the rows written by write_csvs.write_rows.
+Run with: python -m unittest test_write_csvs
+"""
+import os
+import unittest
+import xml.etree.cElementTree as ET
+import osm_functions as osmf
+import schema_validator
+import write_csvs
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dallas_sample.osm')
+
+def encode(value):
+    """Encode the unicode strings of a shaped element to utf-8, like the rows"""
+    if isinstance(value, dict):
+        return dict((k, encode(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return [encode(v) for v in value]
+    return value.encode('utf-8') if isinstance(value, unicode) else value
+
+class ListWriter(object):
+    """Writer that keeps the rows written"""
+    def __init__(self):
+        self.rows = []
+
+    def writerows(self, rows):
+        self.rows.extend(rows)
+
+class ShapedElementsTest(unittest.TestCase):
+    def test_same_as_shape_element(self):
+        # The rows are cleaned by the batch cleaners, shape_element by the
+        # cleaner of each value
+        batch = write_csvs.RowBatch()
+        expected = []
+        for element in osmf.get_element(SAMPLE_PATH):
+            expected.append((element.tag, encode(write_csvs.shape_element(element))))
+            batch.add(element, validate=True)
+        batch.clean()
+        self.assertEqual(list(batch.shaped_elements()), expected)
+
+    def test_removed_tags(self):
+        element = ET.fromstring(
+            '<way id="1" user="a" uid="2" version="1" changeset="3" '
+            'timestamp="2017-01-01T00:00:00Z"><nd ref="4"/><nd ref="5"/>'
+            '<tag k="addr:postcode" v="none"/><tag k="name" v="Main"/></way>')
+        batch = write_csvs.RowBatch()
+        batch.add(element, validate=True)
+        batch.clean()
+        self.assertEqual(list(batch.shaped_elements()),
+                         [('way', encode(write_csvs.shape_element(element)))])
+
+class WriteRowsTest(unittest.TestCase):
+    node = ('<node id="1" lat="32.7" lon="{}" user="a" uid="2" version="1" '
+            'changeset="3" timestamp="2017-01-01T00:00:00Z"/>')
+
+    def test_invalid_row(self):
+        elements = [ET.fromstring(self.node.format(-96.8)),
+                    ET.fromstring(self.node.format('west'))]
+        writers = [ListWriter() for _ in write_csvs.osmv.csv_files]
+        policy = schema_validator.ValidationPolicy(max_failures=None)
+        summary = write_csvs.write_rows(elements, writers, validate=policy)
+        self.assertEqual(summary.failed, 1)
+        self.assertEqual(len(writers[write_csvs.NODES].rows), 2)
+
+    def test_max_failures(self):
+        elements = [ET.fromstring(self.node.format('west'))]
+        writers = [ListWriter() for _ in write_csvs.osmv.csv_files]
+        self.assertRaises(Exception, write_csvs.write_rows, elements, writers, True)
+        self.assertEqual(writers[write_csvs.NODES].rows, [])
+
+if __name__ == '__main__':
+    unittest.main()
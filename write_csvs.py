@@ -1,232 +1,1103 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-"""
-The main function of these codes is to process the osm file. First, it will clean
-the data (street names, city names, zipcodes, and tag's key) and shape each element
-into several data structures base on the schema in schema.py. Then, it will write
-each data structure to the appropriate .csv files.
-"""
-
-import csv
-import codecs
-import pprint
-import cerberus
-import schema
-import clean_postcode as postcode
-import clean_street_name as street
-import clean_city_name as city
-import time
-import osm_functions as osmf
-import osm_variables as osmv
-import os
-
-SCHEMA = schema.schema
-
-def shape_element(element, 
-                  node_attr_fields=osmv.NODE_FIELDS, 
-                  relation_attr_fields=osmv.RELATION_FIELDS,
-                  way_attr_fields=osmv.WAY_FIELDS,
-                  problem_chars=osmv.PROBLEMCHARS, 
-                  default_tag_type='regular'):
-    """Clean and shape node or way XML element to Python dict"""
-    node_attribs = {}
-    relation_attribs = {}
-    relation_nodes = []
-    relation_relations = []
-    relation_ways = []
-    way_attribs = {}
-    way_nodes = []
-    tags = []  # Handle secondary tags the same way fornode, relation and way elements
-
-    for att in element.attrib:
-        if element.tag == 'node' and att in node_attr_fields:
-            node_attribs[att] = element.attrib[att]
-        elif element.tag == 'relation' and att in relation_attr_fields:
-            relation_attribs[att] = element.attrib[att]
-        elif element.tag == 'way' and att in way_attr_fields:
-            way_attribs[att] = element.attrib[att]
-
-    node_index = 0
-    relation_nodes_index = 0
-    relation_relations_index = 0
-    relation_ways_index = 0
-    for el in element:
-        if el.tag == 'tag' and not problem_chars.search(el.attrib['k']):
-            tag = {}
-            tag['id'] = element.attrib['id']
-            value = el.attrib['v']
-            # Clean street name
-            if osmf.is_street_name(el):
-                value = street.clean_street_name(value)
-            # Clean zipcodes
-            if osmf.is_zipcode(el):
-                value = postcode.clean_zipcode(value)
-            # Clean city names:
-            if osmf.is_city_name(el):
-                value = city.clean_city_name(value)
-            if value:
-                tag['value'] = value 
-                if ":" in el.attrib['k']:
-                    ind = el.attrib['k'].index(":")
-                    tag['type'] = str(el.attrib['k'])[:ind]
-                    tag['key'] = str(el.attrib['k'])[ind+1:]
-                else:
-                    tag['key'] = el.attrib['k']
-                    tag['type'] = default_tag_type
-                tags.append(tag)
-        
-        if element.tag == 'way' and el.tag == 'nd':
-            way_node = {}
-            way_node['id'] = element.attrib['id']
-            way_node['node_id'] = el.attrib['ref']
-            way_node['position'] = node_index
-            node_index = node_index + 1
-            way_nodes.append(way_node)
-            
-        if element.tag == 'relation' and el.tag == 'member':
-            relation_member = {}
-            relation_member['id'] = element.attrib['id']
-            relation_member['role'] = el.attrib['role']
-            if el.attrib['type'] == 'node':
-                relation_member['node_id'] = el.attrib['ref']    
-                relation_member['position'] = relation_nodes_index
-                relation_nodes_index += 1
-                relation_nodes.append(relation_member)
-            elif el.attrib['type'] == 'relation':
-                relation_member['relation_id'] = el.attrib['ref']
-                relation_member['position'] = relation_relations_index
-                relation_relations_index += 1
-                relation_relations.append(relation_member)
-            elif el.attrib['type'] == 'way':
-                relation_member['way_id'] = el.attrib['ref']
-                relation_member['position'] = relation_ways_index
-                relation_ways_index += 1
-                relation_ways.append(relation_member)
-
-    if element.tag == 'node':
-        return {'node': node_attribs, 'node_tags': tags}
-    elif element.tag == 'relation':
-        return {'relation': relation_attribs, 
-                'relation_nodes': relation_nodes,
-                'relation_relations': relation_relations,
-                'relation_tags': tags,
-                'relation_ways': relation_ways}
-    elif element.tag == 'way':
-        return {'way': way_attribs, 
-                'way_nodes': way_nodes, 
-                'way_tags': tags}
-
-# ================================================== #
-#               Helper Functions                     #
-# ================================================== #
-def validate_element(element, validator, schema=SCHEMA):
-    """Raise ValidationError if element does not match schema"""
-    if validator.validate(element, schema) is not True:
-        field, errors = next(validator.errors.iteritems())
-        message_string = "\nElement of type '{0}' has the following errors:\n{1}"
-        error_string = pprint.pformat(errors)
-        
-        raise Exception(message_string.format(field, error_string))
-        
-class UnicodeDictWriter(csv.DictWriter, object):
-    """Extend csv.DictWriter to handle Unicode input"""
-
-    def writerow(self, row):
-        super(UnicodeDictWriter, self).writerow({
-            k: (v.encode('utf-8') if isinstance(v, unicode) else v) for k, v in row.iteritems()
-        })
-
-    def writerows(self, rows):
-        for row in rows:
-            self.writerow(row)
-
-# ================================================== #
-#               Main Function                        #
-# ================================================== #
-def process_map(file_in, validate):
-    """Iteratively process each XML element and write to csv(s)"""
-
-    with codecs.open(osmv.NODES_PATH, 'w') as nodes_file, \
-         codecs.open(osmv.NODE_TAGS_PATH, 'w') as nodes_tags_file, \
-         codecs.open(osmv.RELATIONS_PATH, 'w') as relations_file, \
-         codecs.open(osmv.RELATION_NODES_PATH, 'w') as relation_nodes_file, \
-         codecs.open(osmv.RELATION_RELATIONS_PATH, 'w') as relation_relations_file, \
-         codecs.open(osmv.RELATION_TAGS_PATH, 'w') as relation_tags_file, \
-         codecs.open(osmv.RELATION_WAYS_PATH, 'w') as relation_ways_file, \
-         codecs.open(osmv.WAYS_PATH, 'w') as ways_file, \
-         codecs.open(osmv.WAY_NODES_PATH, 'w') as way_nodes_file, \
-         codecs.open(osmv.WAY_TAGS_PATH, 'w') as way_tags_file:
-
-        nodes_writer = UnicodeDictWriter(nodes_file, osmv.NODE_FIELDS)
-        node_tags_writer = UnicodeDictWriter(nodes_tags_file, osmv.NODE_TAGS_FIELDS)
-        relations_writer = UnicodeDictWriter(relations_file, osmv.RELATION_FIELDS)
-        relation_nodes_writer = UnicodeDictWriter(relation_nodes_file, osmv.RELATION_NODES_FIELDS)
-        relation_relations_writer = UnicodeDictWriter(relation_relations_file, osmv.RELATION_RELATIONS_FIELDS)
-        relation_tags_writer = UnicodeDictWriter(relation_tags_file, osmv.RELATION_TAGS_FIELDS)
-        relation_ways_writer = UnicodeDictWriter(relation_ways_file, osmv.RELATION_WAYS_FIELDS)
-        ways_writer = UnicodeDictWriter(ways_file, osmv.WAY_FIELDS)
-        way_nodes_writer = UnicodeDictWriter(way_nodes_file, osmv.WAY_NODES_FIELDS)
-        way_tags_writer = UnicodeDictWriter(way_tags_file, osmv.WAY_TAGS_FIELDS)
-
-        nodes_writer.writeheader()
-        node_tags_writer.writeheader()
-        relations_writer.writeheader()
-        relation_nodes_writer.writeheader()
-        relation_relations_writer.writeheader()
-        relation_tags_writer.writeheader()
-        relation_ways_writer.writeheader()
-        ways_writer.writeheader()
-        way_nodes_writer.writeheader()
-        way_tags_writer.writeheader()
-
-        validator = cerberus.Validator()
-        
-        for element in osmf.get_element(file_in, tags=('node', 'relation', 'way')):
-            el = shape_element(element)
-            if el:
-                if validate is True:
-                    validate_element(el, validator)
-
-                if element.tag == 'node':
-                    nodes_writer.writerow(el['node'])
-                    node_tags_writer.writerows(el['node_tags'])
-                elif element.tag == 'relation':
-                    relations_writer.writerow(el['relation'])
-                    relation_nodes_writer.writerows(el['relation_nodes'])
-                    relation_relations_writer.writerows(el['relation_relations'])
-                    relation_tags_writer.writerows(el['relation_tags'])
-                    relation_ways_writer.writerows(el['relation_ways'])
-                elif element.tag == 'way':
-                    ways_writer.writerow(el['way'])
-                    way_nodes_writer.writerows(el['way_nodes'])
-                    way_tags_writer.writerows(el['way_tags'])
-
-def display_osm_file_information():
-    print 'OSM file: {}'.format(osmv.OSM_PATH)
-    print 'OSM file size: {} KB'.format(osmf.get_file_size(osmv.OSM_PATH))
-    print "Map boundaries:"
-    print osmf.get_map_bounds(osmv.OSM_PATH)
-    print "Element Counts:"
-    print osmf.get_element_count(osmv.OSM_PATH)
-
-def display_csv_files_information():
-    try:
-        print ''
-        print '{:<25} {:>10}'.format('File Name', 'Size')
-        for f in osmv.csv_files:
-            print '{:<25} {:>10} KB'.format(f, osmf.get_file_size(f))
-    except os.error:
-        print '{:<25} {:>10}'.format(f, 'not found')
-                    
-if __name__ == '__main__':
-    # Note: Validation is ~ 10X slower. For the project consider using a small
-    # sample of the map when validating.
-    display_osm_file_information()
-    print ''
-    print "Processing..."
-    start = time.time()
-    process_map(osmv.OSM_PATH, validate=True)
-    end = time.time()
-    print "Time elapsed: " + str(end - start) + " seconds"
-    print ''
-    display_csv_files_information()
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The main function of these codes is to process the osm file. First, it will clean
+the data (street names, city names, zipcodes, and tag's key) and shape each element
+into several data structures base on the schema in schema.py. Then, it will write
+each data structure to the appropriate .csv files.
+"""
+
+import csv
+import pprint
+import schema
+import schema_validator
+import clean_postcode as postcode
+import clean_street_name as street
+import clean_city_name as city
+import clean_cache
+import load_db
+import osm_columns
+import osm_compressed
+import time
+import osm_functions as osmf
+import osm_index
+import osm_stats
+import osm_variables as osmv
+import os
+import json
+import multiprocessing
+import Queue
+import shutil
+import StringIO
+import threading
+from collections import defaultdict
+from operator import itemgetter
+
+SCHEMA = schema.schema
+
+# Number of shaped elements whose tag values are cleaned in one batch
+CLEAN_BATCH_SIZE = 1000
+# Batch cleaning function of each (tag type, tag key)
+BATCH_CLEANERS = {('addr', 'street'): street.clean_street_names,
+                  ('addr', 'postcode'): postcode.clean_zipcodes,
+                  ('addr', 'city'): city.clean_city_names}
+# Size of the buffer of each csv file
+CSV_BUFFER_SIZE = 2**20
+
+# Index of each table in osmv.csv_files
+(NODES, NODE_TAGS, RELATIONS, RELATION_NODES, RELATION_RELATIONS, RELATION_TAGS,
+ RELATION_WAYS, WAYS, WAY_NODES, WAY_TAGS) = range(len(osmv.csv_files))
+# Order of the columns of the rows of the child tables built by the row 
+# shapers, the rows are reordered if osmv.*_FIELDS has another order
+ROW_COLUMNS = {NODE_TAGS: ['id', 'key', 'value', 'type'],
+               RELATION_NODES: ['id', 'node_id', 'position', 'role'],
+               RELATION_RELATIONS: ['id', 'relation_id', 'position', 'role'],
+               RELATION_TAGS: ['id', 'key', 'value', 'type'],
+               RELATION_WAYS: ['id', 'way_id', 'position', 'role'],
+               WAY_NODES: ['id', 'node_id', 'position'],
+               WAY_TAGS: ['id', 'key', 'value', 'type']}
+# Table of the relation members of each member type
+MEMBER_TABLES = {'node': RELATION_NODES, 'relation': RELATION_RELATIONS,
+                 'way': RELATION_WAYS}
+# Fields of the shaped elements of each element type (see shape_element), 
+# and their tables
+ELEMENT_TABLES = {'node': [('node', NODES), ('node_tags', NODE_TAGS)],
+                  'relation': [('relation', RELATIONS),
+                               ('relation_nodes', RELATION_NODES),
+                               ('relation_relations', RELATION_RELATIONS),
+                               ('relation_tags', RELATION_TAGS),
+                               ('relation_ways', RELATION_WAYS)],
+                  'way': [('way', WAYS), ('way_nodes', WAY_NODES),
+                          ('way_tags', WAY_TAGS)]}
+
+def shape_element(element, 
+                  node_attr_fields=osmv.NODE_FIELDS, 
+                  relation_attr_fields=osmv.RELATION_FIELDS,
+                  way_attr_fields=osmv.WAY_FIELDS,
+                  problem_chars=osmv.PROBLEMCHARS, 
+                  default_tag_type='regular'):
+    """
+    Clean and shape node or way XML element to Python dict.
+    """
+    node_attribs = {}
+    relation_attribs = {}
+    relation_nodes = []
+    relation_relations = []
+    relation_ways = []
+    way_attribs = {}
+    way_nodes = []
+    tags = []  # Handle secondary tags the same way fornode, relation and way elements
+
+    for att in element.attrib:
+        if element.tag == 'node' and att in node_attr_fields:
+            node_attribs[att] = element.attrib[att]
+        elif element.tag == 'relation' and att in relation_attr_fields:
+            relation_attribs[att] = element.attrib[att]
+        elif element.tag == 'way' and att in way_attr_fields:
+            way_attribs[att] = element.attrib[att]
+
+    node_index = 0
+    relation_nodes_index = 0
+    relation_relations_index = 0
+    relation_ways_index = 0
+    for el in element:
+        if el.tag == 'tag' and not problem_chars.search(el.attrib['k']):
+            tag = {}
+            tag['id'] = element.attrib['id']
+            value = el.attrib['v']
+            # Clean street name
+            if osmf.is_street_name(el):
+                value = street.clean_street_name(value)
+            # Clean zipcodes
+            if osmf.is_zipcode(el):
+                value = postcode.clean_zipcode(value)
+            # Clean city names:
+            if osmf.is_city_name(el):
+                value = city.clean_city_name(value)
+            if value:
+                tag['value'] = value 
+                if ":" in el.attrib['k']:
+                    ind = el.attrib['k'].index(":")
+                    tag['type'] = str(el.attrib['k'])[:ind]
+                    tag['key'] = str(el.attrib['k'])[ind+1:]
+                else:
+                    tag['key'] = el.attrib['k']
+                    tag['type'] = default_tag_type
+                tags.append(tag)
+        
+        if element.tag == 'way' and el.tag == 'nd':
+            way_node = {}
+            way_node['id'] = element.attrib['id']
+            way_node['node_id'] = el.attrib['ref']
+            way_node['position'] = node_index
+            node_index = node_index + 1
+            way_nodes.append(way_node)
+            
+        if element.tag == 'relation' and el.tag == 'member':
+            relation_member = {}
+            relation_member['id'] = element.attrib['id']
+            relation_member['role'] = el.attrib['role']
+            if el.attrib['type'] == 'node':
+                relation_member['node_id'] = el.attrib['ref']    
+                relation_member['position'] = relation_nodes_index
+                relation_nodes_index += 1
+                relation_nodes.append(relation_member)
+            elif el.attrib['type'] == 'relation':
+                relation_member['relation_id'] = el.attrib['ref']
+                relation_member['position'] = relation_relations_index
+                relation_relations_index += 1
+                relation_relations.append(relation_member)
+            elif el.attrib['type'] == 'way':
+                relation_member['way_id'] = el.attrib['ref']
+                relation_member['position'] = relation_ways_index
+                relation_ways_index += 1
+                relation_ways.append(relation_member)
+
+    if element.tag == 'node':
+        return {'node': node_attribs, 'node_tags': tags}
+    elif element.tag == 'relation':
+        return {'relation': relation_attribs, 
+                'relation_nodes': relation_nodes,
+                'relation_relations': relation_relations,
+                'relation_tags': tags,
+                'relation_ways': relation_ways}
+    elif element.tag == 'way':
+        return {'way': way_attribs, 
+                'way_nodes': way_nodes, 
+                'way_tags': tags}
+
+# ================================================== #
+#               Row Shapers                          #
+# ================================================== #
+def get_row_reorders():
+    """
+    Get the functions that reorder the rows of the child tables whose 
+    osmv.*_FIELDS are not in the order of ROW_COLUMNS.
+    Returns:
+        dict of functions by table index
+    """
+    reorders = {}
+    for table, columns in ROW_COLUMNS.items():
+        fields = osmv.csv_fields[table]
+        if fields != columns:
+            reorders[table] = itemgetter(*[columns.index(f) for f in fields])
+    return reorders
+
+def encode_row(row):
+    """Encode the unicode values of a row to utf-8"""
+    return tuple([v.encode('utf-8') if type(v) is unicode else v for v in row])
+
+class RowBatch(object):
+    """
+    Rows of each table of a batch of elements, as tuples in the order of the
+    csv columns. The tag values to clean are kept aside and cleaned for the 
+    whole batch by clean. The rows of the elements to validate are shaped
+    into the dicts of shape_element by shaped_elements, so the validated
+    values are the values written.
+    Args:
+        problem_chars: regex of the tag keys that are not written
+        default_tag_type: tag type of the keys without colon
+    """
+    def __init__(self, problem_chars=osmv.PROBLEMCHARS, 
+                 default_tag_type='regular'):
+        self.problem_chars = problem_chars
+        self.default_tag_type = default_tag_type
+        self.rows = [[] for _ in osmv.csv_files]
+        self.dirty = []
+        self.validated = []
+        self.removed = False
+        self.size = 0
+
+    def add(self, element, validate=False):
+        """
+        Shape an XML element into rows.
+        Args:
+            element: XML element
+            validate: whether the element is validated, see shaped_elements
+        """
+        self.size += 1
+        element_type = element.tag
+        attrib = element.attrib
+        if validate:
+            tables = ELEMENT_TABLES.get(element_type, ())
+            starts = [len(self.rows[table]) for _, table in tables]
+        if element_type == 'node':
+            self._add_attributes(NODES, attrib)
+            self._add_children(element, attrib['id'], NODE_TAGS)
+        elif element_type == 'way':
+            self._add_attributes(WAYS, attrib)
+            self._add_children(element, attrib['id'], WAY_TAGS)
+        elif element_type == 'relation':
+            self._add_attributes(RELATIONS, attrib)
+            self._add_children(element, attrib['id'], RELATION_TAGS)
+        if validate:
+            self.validated.append(
+                (element_type, starts, [len(self.rows[table]) for _, table in tables]))
+
+    def _add_attributes(self, table, attrib):
+        get = attrib.get
+        # Missing attributes are None, written as empty values
+        row = tuple([get(f) for f in osmv.csv_fields[table]])
+        for v in row:
+            if type(v) is unicode:
+                row = encode_row(row)
+                break
+        self.rows[table].append(row)
+
+    def _add_children(self, element, element_id, tags_table):
+        tags = self.rows[tags_table]
+        is_way = element.tag == 'way'
+        is_relation = element.tag == 'relation'
+        search = self.problem_chars.search
+        node_index = 0
+        positions = {'node': 0, 'relation': 0, 'way': 0}
+        for child in element:
+            t = child.tag
+            if t == 'tag':
+                k = child.attrib['k']
+                value = child.attrib['v']
+                if search(k) or not value:
+                    continue
+                if ":" in k:
+                    ind = k.index(":")
+                    tag_type = str(k)[:ind]
+                    key = str(k)[ind+1:]
+                else:
+                    key = k
+                    tag_type = self.default_tag_type
+                if (tag_type, key) in BATCH_CLEANERS:
+                    # Replaced by the cleaned value in clean
+                    self.dirty.append((tags, len(tags), value))
+                tags.append(encode_row((element_id, key, value, tag_type)))
+            elif t == 'nd' and is_way:
+                self.rows[WAY_NODES].append((element_id, child.attrib['ref'], node_index))
+                node_index += 1
+            elif t == 'member' and is_relation:
+                member_type = child.attrib['type']
+                if member_type in MEMBER_TABLES:
+                    role = child.attrib['role']
+                    if type(role) is unicode:
+                        role = role.encode('utf-8')
+                    self.rows[MEMBER_TABLES[member_type]].append(
+                        (element_id, child.attrib['ref'], positions[member_type], role))
+                    positions[member_type] += 1
+
+    def clean(self):
+        """
+        Clean the tag values of the batch with one batch call of each 
+        cleaner. The rows of the tags whose cleaned value is empty are 
+        replaced by None, and removed by write.
+        """
+        start = osm_stats.timer()
+        cleaned = len(self.dirty)
+        values_by_key = defaultdict(list)
+        for tags, i, value in self.dirty:
+            row = tags[i]
+            values_by_key[row[3], row[1]].append((tags, i, value))
+        for key, dirty in values_by_key.items():
+            values = BATCH_CLEANERS[key]([value for _, _, value in dirty])
+            for (tags, i, _), value in zip(dirty, values):
+                if value:
+                    row = tags[i]
+                    if type(value) is unicode:
+                        value = value.encode('utf-8')
+                    tags[i] = (row[0], row[1], value, row[3])
+                else:
+                    tags[i] = None
+                    self.removed = True
+        self.dirty = []
+        osm_stats.add('clean', osm_stats.timer() - start, cleaned)
+
+    def shaped_elements(self):
+        """
+        Shape the rows of each element added with validate into a dict with
+        the fields of shape_element, after the batch is cleaned.
+        Yields:
+            (element type, shaped element)
+        """
+        for element_type, starts, ends in self.validated:
+            el = {}
+            for (field, table), start, end in zip(ELEMENT_TABLES[element_type], starts, ends):
+                columns = ROW_COLUMNS.get(table, osmv.csv_fields[table])
+                # Missing attributes are None in the rows, and not in the dicts
+                rows = [dict((f, v) for f, v in zip(columns, row) if v is not None)
+                        for row in self.rows[table][start:end] if row is not None]
+                el[field] = rows if table in ROW_COLUMNS else rows[0]
+            yield element_type, el
+
+    def write(self, writers, reorders):
+        """
+        Clean the batch if it was not cleaned, write the rows to the csv 
+        writers, and empty the batch.
+        Args:
+            writers: csv writers, in the same order as osmv.csv_files
+            reorders: functions that reorder the rows (see get_row_reorders)
+        """
+        if self.dirty:
+            self.clean()
+        if self.removed:
+            for table in (NODE_TAGS, RELATION_TAGS, WAY_TAGS):
+                self.rows[table] = [row for row in self.rows[table] if row is not None]
+        for table, rows in enumerate(self.rows):
+            if rows:
+                if table in reorders:
+                    rows = map(reorders[table], rows)
+                writers[table].writerows(rows)
+        self.rows = [[] for _ in osmv.csv_files]
+        self.validated = []
+        self.removed = False
+        self.size = 0
+
+# ================================================== #
+#               Helper Functions                     #
+# ================================================== #
+def get_validation_error(errors):
+    """Get the exception of the validator errors of an element"""
+    field, errors = next(errors.iteritems())
+    message_string = "\nElement of type '{0}' has the following errors:\n{1}"
+    error_string = pprint.pformat(errors)
+    
+    return Exception(message_string.format(field, error_string))
+
+def validate_batch(batch, validator, policy, summary):
+    """
+    Clean a batch, and validate the rows of its elements selected by the 
+    validation policy, as they will be written. The validation error of the
+    element that reaches policy.max_failures is raised, unless 
+    policy.raise_errors is False.
+    Args:
+        batch: RowBatch object
+        validator: FastValidator object of the schema
+        policy: ValidationPolicy object
+        summary: ValidationSummary object the results are added to
+    """
+    batch.clean()
+    # The stages are timed inline, see write_rows
+    timer = osm_stats.timer
+    shaping = osm_stats.get_stage('shape_element')
+    validating = osm_stats.get_stage('validate_element')
+    start = timer()
+    for element_type, el in batch.shaped_elements():
+        shaped = timer()
+        shaping.add(shaped - start)
+        summary.validated[element_type] += 1
+        valid = validator.validate(el, SCHEMA)
+        start = timer()
+        validating.add(start - shaped)
+        if valid is not True:
+            summary.add_errors(validator.errors)
+            if policy.max_failures and policy.raise_errors \
+            and summary.failed >= policy.max_failures:
+                raise get_validation_error(validator.errors)
+
+def get_validation_policy(validate):
+    """
+    Get the validation policy of the validate argument of process_map.
+    Args:
+        validate: True to validate every element and stop at the first 
+                  failure, False or None to validate no element, or
+                  ValidationPolicy object
+    Returns:
+        ValidationPolicy object, or None
+    """
+    if validate is True:
+        return schema_validator.ValidationPolicy()
+    return validate or None
+
+# ================================================== #
+#               Main Function                        #
+# ================================================== #
+def write_rows(elements, writers, validate=False, columns_dir=None, 
+               checkpoint=None):
+    """
+    Shape each XML element into rows and write them with the writers, in 
+    batches of CLEAN_BATCH_SIZE elements (see RowBatch). The rows of the
+    elements to validate are validated once the batch is cleaned, before
+    they are written (see validate_batch). The time of shaping and 
+    validating the elements is recorded in the stages of osm_stats, and a
+    progress line is printed between batches.
+    Args:
+        elements: iterable of XML elements
+        writers: objects with the writerows method of csv.writer, in the 
+                 same order as osmv.csv_files
+        validate: validate the rows of each element against the schema if 
+                  True, or of the elements selected by a ValidationPolicy
+        columns_dir: if set, also write the numeric columns of nodes and 
+                     ways_nodes to .npy files in this directory (see 
+                     osm_columns)
+        checkpoint: Checkpoint object saved after the batches are written, 
+                    or None
+    Returns:
+        ValidationSummary object, or None if the elements are not validated
+    """
+    column_writers = []
+    if columns_dir:
+        writers, column_writers = osm_columns.add_column_writers(
+            writers, columns_dir, checkpoint.positions if checkpoint else None)
+        if checkpoint:
+            for column_writer in column_writers:
+                checkpoint.files.extend((w.path, w) for w in column_writer.writers)
+    validator = schema_validator.FastValidator(SCHEMA)
+    policy = get_validation_policy(validate)
+    summary = schema_validator.ValidationSummary(policy.max_failures or 0) if policy else None
+    if summary and checkpoint and checkpoint.summary:
+        summary.merge(schema_validator.ValidationSummary.from_dict(checkpoint.summary))
+        # Continue the element counts and the random sample of the policy, so
+        # every, first, and fraction select the same elements as a run that 
+        # did not stop
+        policy.start(counts=checkpoint.counts, random_state=checkpoint.random_state)
+    reorders = get_row_reorders()
+    batch = RowBatch()
+    # The stages are timed inline, a timed function per call would slow down
+    # the loop
+    timer = osm_stats.timer
+    adding = osm_stats.get_stage('shape_rows')
+    count = 0
+
+    for element in elements:
+        start = timer()
+        batch.add(element, policy is not None and policy.should_validate(element.tag))
+        adding.add(timer() - start)
+        if checkpoint:
+            checkpoint.add(element)
+        if batch.size >= CLEAN_BATCH_SIZE:
+            count += batch.size
+            if policy:
+                validate_batch(batch, validator, policy, summary)
+            batch.write(writers, reorders)
+            osm_stats.progress(count)
+            if checkpoint and checkpoint.is_due():
+                checkpoint.save(summary, policy)
+    if policy:
+        validate_batch(batch, validator, policy, summary)
+    batch.write(writers, reorders)
+    for column_writer in column_writers:
+        column_writer.close()
+    return summary
+
+def open_csv(path, position=None):
+    """
+    Open a csv file for writing, a .gz file is compressed in blocks in a pool
+    of threads (see osm_compressed.GzipWriter). If position is set, the rows
+    are appended after truncating the file to position.
+    """
+    if path.endswith('.gz'):
+        return osm_compressed.GzipWriter(path, position=position)
+    return osm_compressed.open_at(path, position, CSV_BUFFER_SIZE)
+
+def get_shard_path(path, chunk):
+    """Get the path of the shard of a csv file written by a chunk"""
+    if path.endswith('.gz'):
+        return '{}.{}.part.gz'.format(path[:-3], chunk)
+    return '{}.{}.part'.format(path, chunk)
+
+def write_elements(elements, csv_paths=osmv.csv_files, validate=False, 
+                   header=True, columns_dir=None, checkpoint=None):
+    """
+    Shape each XML element and write it to csv(s)
+    Args:
+        elements: iterable of XML elements
+        csv_paths: csv file paths, in the same order as osmv.csv_files
+        validate, columns_dir, checkpoint: see write_rows
+        header: write the csv headers if True
+    Returns:
+        ValidationSummary object, or None if the elements are not validated
+    """
+    positions = checkpoint.positions if checkpoint else {}
+    files = [open_csv(path, positions.get(path)) for path in csv_paths]
+    if checkpoint:
+        checkpoint.files = zip(csv_paths, files)
+    try:
+        writers = [csv.writer(f) for f in files]
+        if header:
+            for writer, fields in zip(writers, osmv.csv_fields):
+                writer.writerow(fields)
+        writers = osm_stats.timed_writers(writers, load_db.tables)
+        return write_rows(elements, writers, validate, columns_dir, checkpoint)
+    finally:
+        for f in files:
+            f.close()
+
+def write_db(elements, db_path=osmv.DB_PATH, validate=False, columns_dir=None):
+    """
+    Shape each XML element and insert it into a new database with the tables
+    of load_db, in a single transaction, then create the indexes.
+    Args:
+        elements: iterable of XML elements
+        db_path: database file path, the file is replaced if it exists
+        validate, columns_dir: see write_rows
+    Returns:
+        ValidationSummary object, or None if the elements are not validated
+    """
+    con = load_db.connect(db_path)
+    try:
+        cur = con.cursor()
+        writers = osm_stats.timed_writers(load_db.get_table_writers(cur), load_db.tables)
+        summary = write_rows(elements, writers, validate, columns_dir)
+        con.commit()
+    finally:
+        con.close()
+    load_db.create_indexes(db_path)
+    return summary
+
+# ================================================== #
+#               Checkpoints                          #
+# ================================================== #
+class Checkpoint(object):
+    """
+    Progress of write_elements over a plain osm file, saved periodically into
+    a checkpoint file so that a run that stopped can resume where it was last
+    saved. A checkpoint has the number of elements of each type written, the 
+    last element written, the byte offset of the osm file after it, the 
+    position of each output file, the validation counts, and the state of the
+    random fraction of the validation policy. The checkpoint file is only 
+    used again for the same osm file, outputs, and cleaning rules. The byte
+    offsets come from the element index of the osm file, which is built at
+    the first save (a scan of the file, and 24 bytes per element).
+    Args:
+        path: checkpoint file path
+        osm_file: osm file path
+        csv_paths: csv file paths
+        columns_dir: directory of the .npy files, or None
+        interval: number of seconds between two checkpoints
+    """
+    version = 1
+
+    def __init__(self, path, osm_file, csv_paths, columns_dir=None,
+                 interval=osmv.CHECKPOINT_INTERVAL):
+        self.path = path
+        self.osm_file = osm_file
+        self.interval = interval
+        # Built at the first save, a run shorter than interval does not
+        # index the file
+        self.index = None
+        size, mtime = osm_index.get_file_stat(osm_file)
+        self.key = {'version': self.version,
+                    'osm_file': os.path.abspath(osm_file),
+                    'size': size,
+                    'mtime': mtime,
+                    'csv_paths': list(csv_paths),
+                    'columns_dir': columns_dir,
+                    'rules': clean_cache.get_rules_hash()}
+        self.counts = defaultdict(int)
+        self.last = None
+        self.offset = 0
+        self.positions = {}
+        self.summary = None
+        self.random_state = None
+        self.files = []
+        self.saved = time.time()
+
+    def load(self):
+        """
+        Load the checkpoint file, if it is a checkpoint of the same run.
+        Returns:
+            True if the run can resume from the checkpoint
+        """
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'rb') as f:
+            try:
+                data = json.load(f)
+            except ValueError:
+                return False
+        if data.get('key') != json.loads(json.dumps(self.key)):
+            return False
+        counts = dict((str(t), n) for t, n in data['counts'].items())
+        # The last element must be the same element of the osm file
+        element_type, element_id = data['last']
+        n = counts[element_type]
+        index = self.get_index()
+        if n > len(index.ids[element_type]) \
+        or str(index.ids[element_type][n - 1]) != element_id:
+            return False
+        if any(not os.path.exists(p) or os.path.getsize(p) < position
+               for p, position in data['positions'].items()):
+            return False
+        self.counts.update(counts)
+        self.last = (str(element_type), str(element_id))
+        self.offset = data['offset']
+        self.positions = dict((str(p), position) for p, position in data['positions'].items())
+        self.summary = data['summary']
+        random_state = data.get('random_state')
+        if random_state is not None:
+            # JSON has lists where random.Random.getstate has tuples
+            version, internal_state, gauss_next = random_state
+            self.random_state = (version, tuple(internal_state), gauss_next)
+        return True
+
+    def get_index(self):
+        """
+        Get the element index of the osm file, built or loaded the first time
+        it is needed (see osm_index.get_index).
+        """
+        if self.index is None:
+            self.index = osm_index.get_index(self.osm_file)
+        return self.index
+
+    def get_elements(self):
+        """Get the XML elements of the osm file after the checkpoint"""
+        tags = ('node', 'relation', 'way')
+        if not self.offset:
+            return osmf.get_element(self.osm_file, tags=tags)
+        return osmf.get_element(
+            osmf.FileRange(self.osm_file, self.offset, self.get_index().get_end()), 
+            tags=tags)
+
+    def add(self, element):
+        """Count an element shaped after the last checkpoint"""
+        self.counts[element.tag] += 1
+        self.last = (element.tag, element.attrib['id'])
+
+    def is_due(self):
+        return time.time() - self.saved >= self.interval
+
+    def save(self, summary=None, policy=None):
+        """
+        Save a checkpoint, after the rows of every counted element are sent
+        to the output files.
+        Args:
+            summary: ValidationSummary object, or None
+            policy: ValidationPolicy object, or None
+        """
+        for path, f in self.files:
+            f.flush()
+            os.fsync(f.fileno())
+            self.positions[path] = f.tell()
+        self.offset = self.get_index().get_end(self.counts)
+        data = {'key': self.key,
+                'counts': self.counts,
+                'last': self.last,
+                'offset': self.offset,
+                'positions': self.positions,
+                'summary': summary.to_dict() if summary else None,
+                'random_state': policy.random.getstate() if policy else None}
+        # Write a temporary file then rename it, so the checkpoint is never partial
+        with open(self.path + '.tmp', 'wb') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(self.path + '.tmp', self.path)
+        self.saved = time.time()
+
+    def clear(self):
+        """Remove the checkpoint file, when the run is complete"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+# ================================================== #
+#               Pipeline                             #
+# ================================================== #
+class StageQueue(Queue.Queue):
+    """
+    Bounded queue between two stages of the pipeline, that keeps the queue 
+    depth at each put, and the time the producer waits for space (the queue
+    is full) and the consumer waits for items (the queue is empty).
+    Args:
+        name: stage name, used in the statistics
+        maxsize: number of items the producer can be ahead of the consumer
+    """
+    def __init__(self, name, maxsize):
+        Queue.Queue.__init__(self, maxsize)
+        self.name = name
+        self.puts = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self.put_wait = 0.0
+        self.get_wait = 0.0
+
+    def put_item(self, item, stopped):
+        """
+        Put an item, waiting while the queue is full unless stopped is set.
+        Returns:
+            True if the item was put, False if the pipeline was stopped
+        """
+        depth = self.qsize()
+        self.puts += 1
+        self.depth_total += depth
+        self.max_depth = max(self.max_depth, depth)
+        start = time.time()
+        try:
+            while not stopped.is_set():
+                try:
+                    self.put(item, timeout=0.1)
+                    return True
+                except Queue.Full:
+                    pass
+            return False
+        finally:
+            self.put_wait += time.time() - start
+
+    def get_item(self):
+        start = time.time()
+        item = self.get()
+        self.get_wait += time.time() - start
+        return item
+
+class QueueWriter(object):
+    """Send rows to the writer thread of a table, with the writerows method
+    of csv.writer. Raises the error of a writer thread once the pipeline is
+    stopped, so the shaping thread does not go on shaping rows that are not
+    written."""
+    def __init__(self, queue, stopped, errors):
+        self.queue = queue
+        self.stopped = stopped
+        self.errors = errors
+
+    def writerows(self, rows):
+        if self.stopped.is_set() or not self.queue.put_item(rows, self.stopped):
+            if self.errors:
+                raise self.errors[0]
+            raise RuntimeError("The pipeline was stopped")
+
+class Pipeline(object):
+    """
+    Write the csvs with the stages of write_elements overlapped in threads: a
+    reader thread parses the osm file into batches of elements, the calling 
+    thread shapes, cleans and validates the batches, and a writer thread for
+    each csv file writes its rows. The stages are connected by StageQueues,
+    so a stage that is ahead waits for the next one. Shaping stays in one 
+    thread, since the cleaning caches are not shared between threads and 
+    Python threads do not run Python code in parallel.
+    Args:
+        queue_size: number of batches each queue holds
+        batch_size: number of elements in a batch
+    """
+    def __init__(self, queue_size=osmv.PIPELINE_QUEUE_SIZE, 
+                 batch_size=CLEAN_BATCH_SIZE):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.queues = []
+        self.elements = 0
+        self.rows = {}
+        self.write_time = {}
+        self.elapsed = 0.0
+
+    def run(self, elements, csv_paths=osmv.csv_files, validate=False, 
+            header=True, columns_dir=None):
+        """
+        Shape each XML element and write it to csv(s), see write_elements.
+        Returns:
+            ValidationSummary object, or None if the elements are not validated
+        """
+        start = time.time()
+        self.elements = 0
+        self.rows = {}
+        self.write_time = {}
+        stopped = threading.Event()
+        errors = []
+        parsed = StageQueue('parse', self.queue_size)
+        self.queues = [parsed]
+        files = [open_csv(path) for path in csv_paths]
+        threads = []
+        column_writers = []
+        try:
+            writers = [csv.writer(f) for f in files]
+            if header:
+                for writer, fields in zip(writers, osmv.csv_fields):
+                    writer.writerow(fields)
+            writers = osm_stats.timed_writers(writers, load_db.tables)
+            if columns_dir:
+                writers, column_writers = osm_columns.add_column_writers(writers, columns_dir)
+            queue_writers = []
+            for path, writer in zip(osmv.csv_files, writers):
+                queue = StageQueue(path, self.queue_size)
+                self.queues.append(queue)
+                queue_writers.append(QueueWriter(queue, stopped, errors))
+                threads.append(threading.Thread(target=self._write, 
+                                                args=(queue, writer, errors, stopped)))
+            threads.append(threading.Thread(target=self._read, 
+                                            args=(elements, parsed, stopped)))
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            summary = write_rows(self._batches(parsed), queue_writers, validate)
+        except:
+            stopped.set()
+            raise
+        finally:
+            # The writer threads take every item until the end of their queue
+            for queue in self.queues[1:]:
+                queue.put(None)
+            for thread in threads:
+                thread.join()
+            for column_writer in column_writers:
+                column_writer.close()
+            for f in files:
+                f.close()
+            self.elapsed = time.time() - start
+        if errors:
+            raise errors[0]
+        return summary
+
+    def _read(self, elements, parsed, stopped):
+        """Parse the elements into batches, in the reader thread"""
+        try:
+            batch = []
+            for element in elements:
+                batch.append(element)
+                if len(batch) >= self.batch_size:
+                    if not parsed.put_item(batch, stopped):
+                        return
+                    batch = []
+            if batch and not parsed.put_item(batch, stopped):
+                return
+            parsed.put_item(None, stopped)
+        except Exception as e:
+            parsed.put_item(e, stopped)
+
+    def _batches(self, parsed):
+        """Yield the parsed elements, in the shaping thread"""
+        while True:
+            batch = parsed.get_item()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            self.elements += len(batch)
+            for element in batch:
+                yield element
+
+    def _write(self, queue, writer, errors, stopped):
+        """
+        Write the rows of a table, in its writer thread. An error stops the
+        pipeline: the reader thread stops parsing, and the shaping thread 
+        raises the error at its next write.
+        """
+        rows_count = 0
+        busy = 0.0
+        while True:
+            rows = queue.get_item()
+            if rows is None:
+                break
+            # After an error, the rows are still taken from the queue, so
+            # the shaping thread is not blocked
+            if errors:
+                continue
+            start = time.time()
+            try:
+                writer.writerows(rows)
+            except Exception as e:
+                errors.append(e)
+                stopped.set()
+            busy += time.time() - start
+            rows_count += len(rows)
+        self.rows[queue.name] = rows_count
+        self.write_time[queue.name] = busy
+
+    def display(self):
+        """Display the throughput and the queue statistics"""
+        print "Pipeline: {} elements in {:.2f} seconds ({:.0f} elements/s)".format(
+            self.elements, self.elapsed, self.elements / self.elapsed if self.elapsed else 0)
+        print '{:<25} {:>8} {:>10} {:>10} {:>9} {:>9} {:>10} {:>9}'.format(
+            'Queue', 'Batches', 'Avg depth', 'Max depth', 'Full (s)', 
+            'Empty (s)', 'Rows', 'Write (s)')
+        for queue in self.queues:
+            rows = self.rows.get(queue.name, '')
+            write_time = self.write_time.get(queue.name)
+            print '{:<25} {:>8} {:>10.1f} {:>10} {:>9.2f} {:>9.2f} {:>10} {:>9}'.format(
+                queue.name, queue.puts, 
+                float(queue.depth_total) / queue.puts if queue.puts else 0,
+                queue.max_depth, queue.put_wait, queue.get_wait, rows,
+                '{:.2f}'.format(write_time) if write_time is not None else '')
+
+def process_chunk(args):
+    """
+    Process a byte range of the osm file and write it to csv shards, without
+    headers. Used by the worker processes of process_map.
+    Args:
+        args: (osm file path, start offset, end offset, csv shard paths, 
+               validate, chunk index, number of elements of each type 
+               before the chunk, column shard directory or None)
+    Returns:
+        csv shard paths, the statistics and the values of the cleaning cache
+        (see clean_cache.collect), the ValidationSummary or None, and the
+        statistics of the stages (see osm_stats.collect)
+    """
+    file_in, start, end, shard_paths, validate, chunk, counts, columns_dir = args
+    policy = get_validation_policy(validate)
+    if policy:
+        policy.start(chunk, counts)
+        # The main process stops the pool at the max_failures-th failure
+        policy.raise_errors = False
+    elements = osmf.get_element(osmf.FileRange(file_in, start, end),
+                                tags=('node', 'relation', 'way'))
+    summary = write_elements(elements, shard_paths, policy, header=False,
+                             columns_dir=columns_dir)
+    return shard_paths, clean_cache.collect(), summary, osm_stats.collect()
+
+def merge_csvs(shards, csv_paths=osmv.csv_files):
+    """
+    Write the csv headers then append the csv shards in order, and remove the
+    shards. The header of a .gz file is compressed into its own gzip member, 
+    followed by the gzip members of the shards.
+    Args:
+        shards: list of csv shard paths of each chunk, in file order
+        csv_paths: csv file paths, in the same order as osmv.csv_files
+    """
+    for i, (path, fields) in enumerate(zip(csv_paths, osmv.csv_fields)):
+        header = StringIO.StringIO()
+        csv.writer(header).writerow(fields)
+        header = header.getvalue()
+        with open(path, 'wb') as csv_file:
+            if path.endswith('.gz'):
+                header = osm_compressed.gzip_block(header)
+            csv_file.write(header)
+            for shard_paths in shards:
+                with open(shard_paths[i], 'rb') as shard:
+                    shutil.copyfileobj(shard, csv_file, 2**20)
+                os.remove(shard_paths[i])
+
+def process_map(file_in, validate, processes=1, db_path=None, columns_dir=None,
+                pipeline=None, compress=False, checkpoint_path=None):
+    """
+    Iteratively process each XML element and write to csv(s). If processes is 
+    more than 1, split the file into chunks at top level elements, process the 
+    chunks in a pool of processes, and merge the csv shards in file order, so 
+    the csvs are the same as in a single process.
+    Validation is done by the policy of the validate argument (see 
+    get_validation_policy). In a pool of processes, every and first apply to
+    the whole file, with the element counts of the index before each chunk,
+    and the pool is stopped at the max_failures-th failure of the file, by
+    raising its error. The random fraction has its own sample in each chunk.
+    If db_path is set, the rows are inserted into a new database instead of
+    the csvs (see write_db), by a single process. If columns_dir is set, the
+    numeric columns of nodes and ways_nodes are also written to .npy files 
+    (see osm_columns). In a single process, the csvs are written by the 
+    pipeline if it is set, a Pipeline object that keeps the statistics of 
+    the run. If compress is True, the csvs are written as .csv.gz files.
+    If checkpoint_path is set, a run in a single process without pipeline 
+    over a plain osm file saves checkpoints, and resumes from the checkpoint
+    file if it has one of the same run (see Checkpoint).
+    Returns:
+        ValidationSummary object, or None if the elements are not validated
+    """
+    osm_stats.start()
+    policy = get_validation_policy(validate)
+    if policy:
+        # A policy used by an earlier run starts from the first element again
+        policy.start()
+    if db_path:
+        elements = osmf.get_element(file_in, tags=('node', 'relation', 'way'))
+        summary = write_db(elements, db_path, policy, columns_dir)
+        clean_cache.save()
+        return summary
+    csv_paths = osmf.get_csv_paths(compress)
+    if checkpoint_path and processes <= 1 and not pipeline \
+    and osmf.is_plain_file(file_in):
+        checkpoint = Checkpoint(checkpoint_path, file_in, csv_paths, columns_dir)
+        resume = checkpoint.load()
+        summary = write_elements(checkpoint.get_elements(), csv_paths, policy, 
+                                 header=not resume, columns_dir=columns_dir,
+                                 checkpoint=checkpoint)
+        checkpoint.clear()
+        clean_cache.save()
+        return summary
+    # Compressed files and stdin can only be read from the start
+    if processes <= 1 or not osmf.is_plain_file(file_in):
+        elements = osmf.get_element(file_in, tags=('node', 'relation', 'way'))
+        if pipeline:
+            summary = pipeline.run(elements, csv_paths, policy, 
+                                   columns_dir=columns_dir)
+        else:
+            summary = write_elements(elements, csv_paths, policy, 
+                                     columns_dir=columns_dir)
+        clean_cache.save()
+        return summary
+    index = osm_index.get_index(file_in)
+    chunks = index.get_chunks(processes * 4)
+    tasks = [(file_in, start, end,
+              [get_shard_path(path, i) for path in csv_paths],
+              policy, i, index.get_counts(start),
+              '{}.{}.part'.format(os.path.normpath(columns_dir), i) if columns_dir else None)
+             for i, (start, end) in enumerate(chunks)]
+    summary = schema_validator.ValidationSummary(policy.max_failures or 0) if policy else None
+    pool = multiprocessing.Pool(processes)
+    results = []
+    try:
+        # The results are merged in file order, so the failures are counted 
+        # in the same order as in a single process
+        for result in pool.imap(process_chunk, tasks):
+            results.append(result)
+            osm_stats.merge(result[3])
+            osm_stats.progress(osm_stats.get_stage('get_element').elements)
+            if summary:
+                summary.merge(result[2])
+                if policy.max_failures and summary.failed >= policy.max_failures:
+                    raise get_validation_error(summary.errors[policy.max_failures - 1])
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    for _, collected, _, _ in results:
+        clean_cache.merge(collected)
+    clean_cache.save()
+    merge_csvs([result[0] for result in results], csv_paths)
+    if columns_dir:
+        osm_columns.merge_columns([task[-1] for task in tasks], columns_dir)
+    return summary
+
+def display_osm_file_information():
+    print 'OSM file: {}'.format(osmv.OSM_PATH)
+    # stdin can only be read once, by process_map
+    if osmv.OSM_PATH == '-':
+        return
+    info = osmf.get_file_info(osmv.OSM_PATH)
+    print 'OSM file size: {} KB'.format(info['size'])
+    print "Map boundaries:"
+    print info['bounds']
+    print "Element Counts:"
+    print info['counts']
+
+def display_csv_files_information():
+    try:
+        print ''
+        print '{:<25} {:>10}'.format('File Name', 'Size')
+        for f in osmf.get_csv_paths(osmv.COMPRESS_CSVS):
+            print '{:<25} {:>10} KB'.format(f, osmf.get_file_size(f))
+    except os.error:
+        print '{:<25} {:>10}'.format(f, 'not found')
+
+def display_db_information():
+    print ''
+    print 'Database: {} ({} KB)'.format(osmv.DB_PATH, osmf.get_file_size(osmv.DB_PATH))
+                    
+if __name__ == '__main__':
+    # Note: Validation uses functions generated from the schema (see 
+    # schema_validator), cerberus is only used to report the errors.
+    display_osm_file_information()
+    print ''
+    print "Processing..."
+    start = time.time()
+    pipeline = Pipeline() if osmv.PIPELINE else None
+    summary = process_map(osmv.OSM_PATH, 
+                          validate=schema_validator.ValidationPolicy(**osmv.VALIDATION_POLICY),
+                          processes=osmv.PROCESSES,
+                          db_path=osmv.DB_PATH if osmv.WRITE_DB else None,
+                          columns_dir=osmv.COLUMNS_PATH if osmv.WRITE_COLUMNS else None,
+                          pipeline=pipeline,
+                          compress=osmv.COMPRESS_CSVS,
+                          checkpoint_path=osmv.CHECKPOINT_PATH)
+    end = time.time()
+    print "Time elapsed: " + str(end - start) + " seconds"
+    print ''
+    summary.display()
+    print ''
+    if pipeline:
+        pipeline.display()
+        print ''
+    clean_cache.display_stats()
+    print ''
+    osm_stats.display()
+    print ''
+    if osmv.WRITE_DB:
+        display_db_information()
+    else:
+        display_csv_files_information()
+    report = osm_stats.save_report('write_csvs', osm_file=osmv.OSM_PATH,
+                                   processes=osmv.PROCESSES, validation=summary.to_dict())
+    if report:
+        print ''
+        print 'Run report: ' + report